@@ -1,10 +1,12 @@
-from sentence_transformers import SentenceTransformer
-from qdrant_client.models import VectorParams, Distance, PointStruct
+from qdrant_client.models import VectorParams, Distance
 from qdrant_client import QdrantClient
 
+from rag.embedding import load_embedding_model
+
 client = QdrantClient(url="http://localhost:6333")
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Embedding推理后端：torch / onnx / onnx-int8 / fastembed
+model = load_embedding_model('all-MiniLM-L6-v2', backend="torch")
 
 # 1. 加载Embedding模型（生成向量）
 # model = SentenceTransformer('BAAI/bge-small-zh-v1.5')
@@ -30,15 +32,11 @@ collection_name = "chinese_embedding_demo"
 # )
 
 # 5. 向量存入Qdrant（可附带原始文本作为元数据）
-points = [
-    PointStruct(
-        id=i,  # 唯一ID
-        vector=embeddings[i].tolist(),  # 向量数据（需转列表）
-        payload={"text": texts[i]}  # 附带原始文本，方便检索后展示
-    )
-    for i in range(len(texts))
-]
-
-# 批量插入向量
-client.upsert(collection_name=collection_name, points=points)
+# 直接传入numpy矩阵按批次上传，不需要为每个向量调用tolist()构造PointStruct
+client.upload_collection(
+    collection_name=collection_name,
+    vectors=embeddings,
+    payload=[{"text": text} for text in texts],  # 附带原始文本，方便检索后展示
+    ids=list(range(len(texts))),  # 唯一ID
+)
 print("向量已成功存入Qdrant！")
@@ -1,5 +1,3 @@
-import sys
-import os
 import gradio as gr
 import asyncio
 import threading
@@ -9,63 +7,14 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_core.tools import FunctionTool
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.models import ModelInfo
-
-try:
-    # Add the parent directory to the path so we can import conf
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from conf import settings
-except ImportError:
-    print(
-        "Failed to import settings from conf. Make sure conf is in the parent directory."
-    )
-    raise
-
-deepseek_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="deepseek",
-    structured_output=True,
-)
 
-aliyun_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="qwen3",
-    structured_output=True,
-)
+from llm import get_model_client, registry
 
-volce_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,
-    json_output=True,
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_model_client = get_model_client("deepseek", "deepseek-chat")
 
-deepseek_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
+aliyun_model_client = get_model_client("aliyun", "qwen3-max")
 
-aliyun_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen3-max",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
-
-doubao_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-thinking-250715",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+doubao_model_client = get_model_client("volces", "doubao-seed-1-6-thinking-250715")
 
 
 # 工具定义示例
@@ -137,12 +86,14 @@ async def run_team_task(task: str):
     async for message in team.run_stream(task=task):
         await handle_message(message)
 
+# 所有任务共用一个后台事件循环：模型客户端共享的HTTP连接池绑定在该循环上，不能跨循环使用
+team_loop = asyncio.new_event_loop()
+threading.Thread(target=team_loop.run_forever, name="team-loop", daemon=True).start()
+
 # 包装为同步函数用于线程执行
 def run_with_loop(task: str):
-    # 创建新的事件循环以在线程中运行异步函数
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_team_task(task))
+    # 把任务提交到后台事件循环，并等待其完成
+    asyncio.run_coroutine_threadsafe(run_team_task(task), team_loop).result()
 
 # 定期检查消息的函数
 def update_chat_history(chat_history):
@@ -211,4 +162,8 @@ with gr.Blocks(title="AutoGen Agents Chat") as demo:
     clear.click(clear_conversation, None, [chatbot, timer], queue=False)
 
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", server_port=7861)
\ No newline at end of file
+    try:
+        demo.launch(server_name="0.0.0.0", server_port=7861)
+    finally:
+        # 关闭共享的HTTP连接池
+        asyncio.run_coroutine_threadsafe(registry.aclose(), team_loop).result()
\ No newline at end of file
@@ -3,14 +3,10 @@ app
 
 """
 
-import sys
-import os
 import asyncio
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.ui import Console
-from autogen_core.models import ModelInfo
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.conditions import TextMentionTermination
 from pathlib import Path
 
@@ -24,15 +20,7 @@ work_dir.mkdir(exist_ok=True)
 local_executor = LocalCommandLineCodeExecutor(work_dir=work_dir)
 
 
-try:
-    # Add the parent directory to the path so we can import conf
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from conf import settings
-except ImportError:
-    print(
-        "Failed to import settings from conf. Make sure conf is in the parent directory."
-    )
-    raise
+from llm import Route, RoutingTable, create_model_context, get_model_client, registry
 
 async def run_cmd(cmd: str):
     local_executor = LocalCommandLineCodeExecutor(work_dir=work_dir)
@@ -51,80 +39,22 @@ async def create_file(file_name: str, content: str):
         fp.write(content)
 
 
-# 根据DeepSeek模型的实际能力调整ModelInfo参数
-deepseek_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_chat_model_client = get_model_client("deepseek", "deepseek-chat")
 
-aliyun_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="qwen3",
-    structured_output=True,
-)
+deepseek_code_model_client = get_model_client("deepseek", "deepseek-chat", temperature=0.0, cache=True)
 
-volce_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,
-    json_output=True,
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_reasoner_model_client = get_model_client("deepseek", "deepseek-reasoner")
 
-deepseek_chat_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
-
-deepseek_code_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-    temperature=0.0,
-)
-
-deepseek_reasoner_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-reasoner",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
+aliyun_model_client = get_model_client("aliyun", "qwen3-max")
 
-aliyun_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen3-max",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
+doubao_model_client = get_model_client("volces", "doubao-seed-1-6-251015")
 
-doubao_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-251015",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+doubao_thinking_model_client = get_model_client("volces", "doubao-seed-1-6-thinking-250715")
 
-doubao_thinking_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-thinking-250715",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+doubao_code_model_client = get_model_client("volces", "doubao-seed-code-preview-251028")
 
-doubao_code_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-code-preview-251028",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+# 发言人选择：相同的对话历史得到相同的选择，重复运行同一任务时使用响应缓存（见settings.toml的[llm.cache]）
+selector_model_client = get_model_client("volces", "doubao-seed-1-6-251015", cache=True)
 
 user = UserProxyAgent(
     name="user",
@@ -173,6 +103,7 @@ senior_develop_export = AssistantAgent(
     name="SeniorDevelopExport",
     description="生成TODO列表",
     model_client=doubao_model_client,
+    model_context=create_model_context("develop_team", doubao_model_client),
     system_message=senior_develop_export_prompt,
     reflect_on_tool_use=False,
     model_client_stream=True,
@@ -186,6 +117,7 @@ tool_export = AssistantAgent(
     name="ToolExport",
     description="生成命令或接收命令，执行命令，获取输出结果",
     model_client=doubao_model_client,
+    model_context=create_model_context("develop_team", doubao_model_client),
     system_message=tool_export_prompt,
     reflect_on_tool_use=False,
     model_client_stream=True,
@@ -252,6 +184,7 @@ web_developer = AssistantAgent(
     name="WebDeveloper",
     description="Web开发专家，负责基于用户需求，生成符合要求的前端原型代码。",
     model_client=doubao_code_model_client,
+    model_context=create_model_context("develop_team", doubao_code_model_client),
     system_message=web_developer_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -296,20 +229,41 @@ selector_prompt = """
 WebDeveloper 或 UserProxyAgent
 """
 
+# 流程标识符直接决定下一个发言人，未命中时才调用模型选择
+develop_team_routing = RoutingTable(
+    "develop_team",
+    routes=[
+        Route("生成TODO列表", "SeniorDevelopExport"),
+        Route("编码开发", "WebDeveloper"),
+        Route("执行工具", "ToolExport"),
+    ],
+    participants=[user, tool_export, web_developer, senior_develop_export],
+    fallback="user",
+    allow_repeated_speaker=False,
+)
+
 # 创建团队
 develop_team = SelectorGroupChat(
     participants=[user, tool_export, web_developer, senior_develop_export],
-    model_client=doubao_model_client,
+    model_client=selector_model_client,
+    model_context=create_model_context("develop_team", selector_model_client),
     termination_condition=TextMentionTermination("good job"),
     selector_prompt=selector_prompt,
     max_turns=50,
     allow_repeated_speaker=False,
-    max_selector_attempts=2
+    max_selector_attempts=2,
+    selector_func=develop_team_routing.select,
+    candidate_func=develop_team_routing.candidates,
 )
 
 
 async def main() -> None:
-    await Console(develop_team.run_stream(task="创建登陆页面"))
+    try:
+        await Console(develop_team.run_stream(task="创建登陆页面"))
+    finally:
+        develop_team_routing.log_stats()
+        # 关闭共享的HTTP连接池
+        await registry.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+"""
+llm package initializer.
+
+Shared model clients, model contexts and speaker routing for the agent team scripts.
+"""
+
+from .context import SummarizingChatCompletionContext, create_model_context
+from .registry import ModelClientRegistry, get_model_client, registry
+from .routing import Route, RoutingTable
+
+__all__ = [
+    "ModelClientRegistry",
+    "Route",
+    "RoutingTable",
+    "SummarizingChatCompletionContext",
+    "create_model_context",
+    "get_model_client",
+    "registry",
+]
@@ -0,0 +1,203 @@
+"""
+持久化的模型响应缓存
+
+SqliteCacheStore实现autogen的CacheStore接口，配合ChatCompletionCache使用：
+ChatCompletionCache按消息、工具、json_output和extra_create_args计算缓存键，
+但不区分模型和采样参数，因此每个模型客户端使用独立的命名空间（服务商 + 模型 + 采样参数），
+不同模型或不同temperature的响应不会混用。
+
+响应以JSON保存在同一个SQLite文件中，支持过期时间（TTL）和按最近最少使用淘汰的条目数上限，
+并统计命中率。适合重复运行同一任务时的确定性调用（发言人选择、temperature=0的智能体）。
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Mapping, Optional
+
+from autogen_core import CacheStore, Component
+from autogen_core.models import CreateResult
+from autogen_ext.models.cache import CHAT_CACHE_VALUE_TYPE
+from pydantic import BaseModel
+from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+# 同一个缓存文件的连接在所有命名空间之间共享
+_connections: Dict[str, sqlite3.Connection] = {}
+_connections_lock = threading.Lock()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    打开（或复用）缓存文件的SQLite连接并建表
+    """
+    path = os.path.abspath(path)
+    with _connections_lock:
+        db = _connections.get(path)
+        if db is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (namespace, key))'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)')
+            db.commit()
+            _connections[path] = db
+        return db
+
+
+def cache_namespace(provider: str, model: str, create_args: Mapping[str, Any]) -> str:
+    """
+    按服务商、模型和采样参数计算缓存命名空间
+
+    Args:
+        provider: 服务商名称
+        model: 模型名称
+        create_args: 创建客户端时的其他参数（temperature、top_p、extra_body等）
+
+    Returns:
+        命名空间字符串，形如 deepseek/deepseek-chat/3f2a...
+    """
+    args = {key: value for key, value in create_args.items() if key != 'model_info'}
+    digest = hashlib.sha256(json.dumps(args, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    return f"{provider}/{model}/{digest}"
+
+
+def _dump_value(value: CHAT_CACHE_VALUE_TYPE) -> str:
+    """
+    把CreateResult或流式结果列表序列化为JSON
+    """
+    if isinstance(value, CreateResult):
+        return json.dumps(value.model_dump(mode='json'), ensure_ascii=False)
+    items: List[Any] = [item.model_dump(mode='json') if isinstance(item, CreateResult) else item for item in value]
+    return json.dumps(items, ensure_ascii=False)
+
+
+class SqliteCacheStoreConfig(BaseModel):
+    """SqliteCacheStore的配置"""
+
+    path: str
+    namespace: str = ''
+    ttl: Optional[float] = None
+    max_entries: Optional[int] = None
+
+
+class SqliteCacheStore(CacheStore[CHAT_CACHE_VALUE_TYPE], Component[SqliteCacheStoreConfig]):
+    """
+    基于SQLite的模型响应缓存
+
+    get返回JSON字符串，由ChatCompletionCache还原为CreateResult
+    """
+
+    component_config_schema = SqliteCacheStoreConfig
+    component_provider_override = "llm.cache.SqliteCacheStore"
+
+    def __init__(self, path: str, namespace: str = '', ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        打开缓存文件中的一个命名空间
+
+        Args:
+            path: SQLite文件路径
+            namespace: 命名空间，通常由cache_namespace计算
+            ttl: 条目的有效期（秒），None或0表示不过期
+            max_entries: 整个缓存文件的最大条目数，超过后淘汰最久未使用的条目，None或0表示不限
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl = float(ttl) if ttl else None
+        self.max_entries = int(max_entries) if max_entries else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = _connect(path)
+
+    def get(self, key: str, default: Optional[CHAT_CACHE_VALUE_TYPE] = None) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT value, created_at FROM responses WHERE namespace = ? AND key = ?',
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute('DELETE FROM responses WHERE namespace = ? AND key = ?', (self.namespace, key))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._db.execute(
+                'UPDATE responses SET last_used = ? WHERE namespace = ? AND key = ?',
+                (now, self.namespace, key),
+            )
+            self._db.commit()
+            return row[0]
+
+    def set(self, key: str, value: CHAT_CACHE_VALUE_TYPE) -> None:
+        now = time.time()
+        try:
+            data = _dump_value(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"模型响应无法序列化，跳过缓存: {e}")
+            return
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, data, now, now),
+            )
+            if self.max_entries is not None:
+                # 按最近使用时间保留max_entries条，其余淘汰
+                self._db.execute(
+                    'DELETE FROM responses WHERE rowid IN '
+                    '(SELECT rowid FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,),
+                )
+            self._db.commit()
+
+    def hit_rate(self) -> float:
+        """
+        本次运行中的缓存命中率
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        命中统计和当前命名空间的条目数
+        """
+        with self._lock:
+            entries = self._db.execute(
+                'SELECT COUNT(*) FROM responses WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0]
+        return {
+            'namespace': self.namespace,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'entries': entries,
+        }
+
+    def clear(self):
+        """
+        删除当前命名空间的所有条目
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM responses WHERE namespace = ?', (self.namespace,))
+            self._db.commit()
+
+    def _to_config(self) -> SqliteCacheStoreConfig:
+        return SqliteCacheStoreConfig(
+            path=self.path, namespace=self.namespace, ttl=self.ttl, max_entries=self.max_entries
+        )
+
+    @classmethod
+    def _from_config(cls, config: SqliteCacheStoreConfig) -> Self:
+        return cls(config.path, namespace=config.namespace, ttl=config.ttl, max_entries=config.max_entries)
@@ -0,0 +1,489 @@
+"""
+按token预算压缩的模型上下文
+
+团队对话最多50轮，每次调用都把完整的、不断增长的历史发给模型，提示词token数和延迟
+随轮数平方增长。SummarizingChatCompletionContext在历史超过token预算时：
+
+- 最近的若干条消息原样保留；
+- 更早的消息由一个便宜的模型增量地压缩为摘要（每条消息只被摘要一次）；
+- 命中固定规则的关键产物（PRD、TODO列表、Spec确认）原样保留，同一规则只保留最新的一条。
+
+token数按模型family统计：优先使用该family在Hugging Face Hub上的分词器，
+无法加载（离线、未安装tokenizers）时按字符数估算。
+
+各团队的预算和摘要模型读取[llm.context]配置段（默认关闭），[llm.context.teams.<团队名>]覆盖其中的项。
+
+用法:
+    from llm import create_model_context
+
+    agent = AssistantAgent(
+        ...,
+        model_client=deepseek_model_client,
+        model_context=create_model_context("develop_team", deepseek_model_client),
+    )
+"""
+
+import re
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from autogen_core import ComponentModel, Component, Image
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+from pydantic import BaseModel
+from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+# 各模型family使用的分词器（Hugging Face Hub仓库名）
+FAMILY_TOKENIZERS: Dict[str, str] = {
+    "deepseek": "deepseek-ai/DeepSeek-V3",
+    "qwen3": "Qwen/Qwen3-8B",
+}
+
+# 无法加载分词器时的估算比例：(每个中日韩字符的token数, 每个其他字符的token数)
+FAMILY_TOKEN_RATIOS: Dict[str, Tuple[float, float]] = {
+    "deepseek": (0.6, 0.3),
+    "qwen3": (0.6, 0.3),
+}
+DEFAULT_TOKEN_RATIO: Tuple[float, float] = (1.0, 0.3)
+
+# 估算时按中日韩字符计数的范围：CJK部首至统一汉字、韩文音节、全角字符
+_CJK_RANGES = (('\u2e80', '\u9fff'), ('\uac00', '\ud7af'), ('\uff00', '\uffef'))
+
+# 每条消息的格式开销（角色标记、分隔符）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 默认原样保留的关键产物：规则名 -> 正则
+DEFAULT_PIN_PATTERNS: Dict[str, str] = {
+    "prd": r"(?m)^#{1,2}\s*(产品需求文档|PRD)",
+    "todo": r"(?m)^\s*[-*] \[[ xX]\] ",
+    "spec": r"###Spec确认###",
+}
+
+# [llm.context]配置段的默认值
+DEFAULT_CONTEXT_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "max_tokens": 16000,
+    "keep_recent": 6,
+    "summary_provider": "deepseek",
+    "summary_model": "deepseek-chat",
+    "summary_max_tokens": 1024,
+    "summary_input_tokens": 24000,
+    "pin_patterns": DEFAULT_PIN_PATTERNS,
+}
+
+SUMMARY_PROMPT = """你负责压缩多智能体团队的对话历史。根据已有摘要和新增的对话，输出更新后的完整摘要：
+- 保留已确认的需求、决策和结论，待办事项及其完成状态，文件路径、命令、接口和错误信息；
+- 注明每条信息来自哪个角色；
+- 删除寒暄、重复内容和已被推翻的方案；
+- 只输出摘要正文，不超过{max_tokens}个token。"""
+
+SUMMARY_SOURCE = "对话摘要"
+
+
+class TokenCounter:
+    """
+    按模型family统计文本的token数，缓存已统计过的文本
+    """
+
+    _CACHE_SIZE = 50_000
+
+    def __init__(self, family: str):
+        """
+        Args:
+            family: 模型family，对应ModelInfo中的family
+        """
+        self.family = family
+        self._tokenizer: Any = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def _load(self) -> Any:
+        """
+        加载family对应的分词器，失败时返回None并改用估算
+
+        首次加载可能需要从Hugging Face Hub下载，异步代码中应通过aload调用
+        """
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                name = FAMILY_TOKENIZERS.get(self.family)
+                if name:
+                    try:
+                        from tokenizers import Tokenizer
+
+                        self._tokenizer = Tokenizer.from_pretrained(name)
+                        logger.debug(f"已加载分词器: {name}")
+                    except Exception as e:
+                        logger.warning(f"加载分词器 {name} 失败，按字符数估算token数: {e}")
+            return self._tokenizer
+
+    async def aload(self) -> Any:
+        """
+        在线程池中加载分词器，避免下载时阻塞事件循环
+        """
+        if self._loaded:
+            return self._tokenizer
+        return await asyncio.to_thread(self._load)
+
+    def _estimate(self, text: str) -> int:
+        cjk_ratio, other_ratio = FAMILY_TOKEN_RATIOS.get(self.family, DEFAULT_TOKEN_RATIO)
+        cjk = sum(1 for ch in text if any(low <= ch <= high for low, high in _CJK_RANGES))
+        return int(cjk * cjk_ratio + (len(text) - cjk) * other_ratio) + 1
+
+    def count(self, text: str) -> int:
+        """
+        统计文本的token数
+
+        Args:
+            text: 文本
+
+        Returns:
+            token数
+        """
+        if not text:
+            return 0
+        key = hashlib.md5(text.encode('utf-8')).hexdigest()
+        cached = self._counts.get(key)
+        if cached is not None:
+            return cached
+        tokenizer = self._load()
+        if tokenizer is not None:
+            count = len(tokenizer.encode(text, add_special_tokens=False).ids)
+        else:
+            count = self._estimate(text)
+        if len(self._counts) > self._CACHE_SIZE:
+            self._counts.clear()
+        self._counts[key] = count
+        return count
+
+
+# 每个family共用一个TokenCounter
+_counters: Dict[str, TokenCounter] = {}
+
+
+def token_counter(family: str) -> TokenCounter:
+    """
+    返回family对应的共享TokenCounter
+    """
+    counter = _counters.get(family)
+    if counter is None:
+        counter = _counters.setdefault(family, TokenCounter(family))
+    return counter
+
+
+def message_text(message: LLMMessage) -> str:
+    """
+    把上下文中的消息转换为纯文本，用于统计token数、匹配关键产物和生成摘要
+    """
+    if isinstance(message, FunctionExecutionResultMessage):
+        return "\n".join(f"工具结果({result.name}): {result.content}" for result in message.content)
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts: List[str] = []
+    for item in content:
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, Image):
+            parts.append("[图片]")
+        else:
+            # AssistantMessage中的FunctionCall
+            parts.append(f"调用工具 {item.name}({item.arguments})")
+    return "\n".join(parts)
+
+
+def _pinnable(message: LLMMessage) -> bool:
+    """
+    只有用户消息和纯文本的智能体消息可以单独保留：工具调用和工具结果必须成对出现，
+    单独保留其中一条会被接口拒绝
+    """
+    if isinstance(message, UserMessage):
+        return True
+    return isinstance(message, AssistantMessage) and isinstance(message.content, str)
+
+
+def _message_source(message: LLMMessage) -> str:
+    if isinstance(message, (UserMessage, AssistantMessage)):
+        return message.source
+    if isinstance(message, FunctionExecutionResultMessage):
+        return "tool"
+    return "system"
+
+
+class SummarizingChatCompletionContextConfig(BaseModel):
+    """SummarizingChatCompletionContext的配置"""
+
+    summary_client: ComponentModel
+    family: str = ''
+    max_tokens: int = 16000
+    keep_recent: int = 6
+    summary_max_tokens: int = 1024
+    summary_input_tokens: int = 24000
+    pin_patterns: Dict[str, str] = {}
+    initial_messages: Optional[List[LLMMessage]] = None
+
+
+class SummarizingChatCompletionContext(ChatCompletionContext, Component[SummarizingChatCompletionContextConfig]):
+    """
+    超过token预算时把较早的消息压缩为摘要的模型上下文
+    """
+
+    component_config_schema = SummarizingChatCompletionContextConfig
+    component_provider_override = "llm.context.SummarizingChatCompletionContext"
+
+    def __init__(
+        self,
+        summary_client: ChatCompletionClient,
+        family: str = '',
+        max_tokens: int = 16000,
+        keep_recent: int = 6,
+        summary_max_tokens: int = 1024,
+        summary_input_tokens: int = 24000,
+        pin_patterns: Optional[Mapping[str, str]] = None,
+        initial_messages: Optional[List[LLMMessage]] = None,
+    ):
+        """
+        创建上下文
+
+        Args:
+            summary_client: 生成摘要的模型客户端，应使用便宜、快速的模型
+            family: 统计token数使用的模型family，通常取智能体模型客户端的model_info["family"]
+            max_tokens: 对话历史的token预算（不含智能体的系统提示词）
+            keep_recent: 原样保留的最近消息数，超出预算时会减少到1条
+            summary_max_tokens: 摘要的最大token数，同时作为摘要在预算中的预留
+            summary_input_tokens: 每次摘要调用输入的最大token数，新增消息过多时分批摘要
+            pin_patterns: 原样保留的关键产物（规则名 -> 正则），同一规则只保留最新的一条
+            initial_messages: 初始消息
+        """
+        super().__init__(initial_messages)
+        if max_tokens <= 0 or keep_recent <= 0:
+            logger.error(f"上下文的max_tokens和keep_recent必须大于0: {max_tokens}, {keep_recent}")
+            raise RuntimeError("max_tokens和keep_recent必须大于0")
+        self._summary_client = summary_client
+        self._family = family
+        self._counter = token_counter(family)
+        self._max_tokens = max_tokens
+        self._keep_recent = keep_recent
+        self._summary_max_tokens = summary_max_tokens
+        self._summary_input_tokens = summary_input_tokens
+        self._pin_patterns = dict(pin_patterns or {})
+        self._pin_regexes = {name: re.compile(pattern) for name, pattern in self._pin_patterns.items()}
+        self._summary = ''
+        # self._messages[:self._summarized]中未被保留的消息已并入摘要
+        self._summarized = 0
+        self._lock = asyncio.Lock()
+
+    def count_tokens(self, message: LLMMessage) -> int:
+        """
+        统计一条消息的token数
+        """
+        return self._counter.count(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+    def _pinned(self, messages: Sequence[LLMMessage]) -> Dict[int, str]:
+        """
+        各保留规则最新命中的消息（只匹配用户消息和纯文本的智能体消息），系统消息总是保留
+
+        Returns:
+            消息下标 -> 规则名
+        """
+        pinned: Dict[int, str] = {}
+        for name, regex in self._pin_regexes.items():
+            for index in range(len(messages) - 1, -1, -1):
+                if _pinnable(messages[index]) and regex.search(message_text(messages[index])):
+                    pinned.setdefault(index, name)
+                    break
+        for index, message in enumerate(messages):
+            if isinstance(message, SystemMessage):
+                pinned.setdefault(index, "system")
+        return pinned
+
+    def _recent_start(self, messages: Sequence[LLMMessage], start: int) -> int:
+        """
+        调整最近消息窗口的起点，不能从工具结果开始（否则与对应的工具调用分离）
+        """
+        start = max(start, self._summarized, 0)
+        while start < len(messages) - 1 and isinstance(messages[start], FunctionExecutionResultMessage):
+            start += 1
+        return start
+
+    async def get_messages(self) -> List[LLMMessage]:
+        """
+        未超过预算时返回全部消息；超过时返回摘要、保留的关键产物和最近的消息
+        """
+        async with self._lock:
+            await self._counter.aload()
+            messages = list(self._messages)
+            counts = [self.count_tokens(message) for message in messages]
+            if sum(counts) <= self._max_tokens:
+                return messages
+
+            all_pinned = self._pinned(messages)
+            start = self._recent_start(messages, len(messages) - self._keep_recent)
+            while True:
+                pinned = {index: name for index, name in all_pinned.items() if index < start}
+                total = self._summary_max_tokens + sum(counts[i] for i in pinned) + sum(counts[start:])
+                if total <= self._max_tokens or start >= len(messages) - 1:
+                    break
+                start = self._recent_start(messages, start + 1)
+
+            await self._summarize(messages, start, pinned)
+
+            # 摘要失败时self._summarized停在失败的批次之前，这些消息原样保留，下次调用时重试
+            kept = min(start, self._summarized)
+            pinned = {index: name for index, name in pinned.items() if index < kept}
+            view: List[LLMMessage] = []
+            if self._summary:
+                view.append(UserMessage(content=f"【之前对话的摘要】\n{self._summary}", source=SUMMARY_SOURCE))
+            view.extend(messages[index] for index in sorted(pinned))
+            view.extend(messages[kept:])
+            logger.debug(
+                f"上下文压缩: {len(messages)} 条消息 {sum(counts)} tokens -> "
+                f"摘要 + {len(pinned)} 条保留 + {len(messages) - kept} 条最近消息"
+            )
+            return view
+
+    async def _summarize(self, messages: Sequence[LLMMessage], start: int, pinned: Mapping[int, str]):
+        """
+        把[self._summarized, start)中未保留的消息增量并入摘要，新增消息过多时分批调用
+
+        每个批次成功后才把self._summarized推进到批次末尾；某个批次失败时停止，
+        该批次及之后的消息留在上下文中。批次不会在工具调用和工具结果之间切开
+        """
+        batch: List[str] = []
+        batch_tokens = 0
+        for index in range(self._summarized, start):
+            message = messages[index]
+            if index in pinned:
+                continue
+            text = f"{_message_source(message)}: {message_text(message)}"
+            tokens = self._counter.count(text)
+            if tokens > self._summary_input_tokens:
+                # 单条消息过长时按比例截断
+                text = text[: max(1, len(text) * self._summary_input_tokens // tokens)]
+                tokens = self._summary_input_tokens
+            if (
+                batch
+                and batch_tokens + tokens > self._summary_input_tokens
+                and not isinstance(message, FunctionExecutionResultMessage)
+            ):
+                if not await self._update_summary(batch):
+                    return
+                self._summarized = index
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch and not await self._update_summary(batch):
+            return
+        self._summarized = max(self._summarized, start)
+
+    async def _update_summary(self, batch: Sequence[str]) -> bool:
+        """
+        调用摘要模型，把一批新增对话并入已有摘要
+
+        Returns:
+            是否成功；失败时保留原摘要
+        """
+        prompt = f"已有摘要:\n{self._summary or '（无）'}\n\n新增对话:\n" + "\n\n".join(batch)
+        try:
+            result = await self._summary_client.create(
+                [
+                    SystemMessage(content=SUMMARY_PROMPT.format(max_tokens=self._summary_max_tokens)),
+                    UserMessage(content=prompt, source="user"),
+                ],
+                extra_create_args={"max_tokens": self._summary_max_tokens},
+            )
+        except Exception as e:
+            logger.warning(f"生成对话摘要失败，{len(batch)} 条消息暂时原样保留，下次调用时重试: {e}")
+            return False
+        if not isinstance(result.content, str) or not result.content.strip():
+            logger.warning(f"摘要模型返回了空摘要，{len(batch)} 条消息暂时原样保留，下次调用时重试")
+            return False
+        self._summary = result.content.strip()
+        return True
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._summary = ''
+        self._summarized = 0
+
+    async def save_state(self) -> Mapping[str, Any]:
+        state = dict(await super().save_state())
+        state["summary"] = self._summary
+        state["summarized"] = self._summarized
+        return state
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        state = dict(state)
+        self._summary = state.pop("summary", '')
+        self._summarized = state.pop("summarized", 0)
+        await super().load_state(state)
+
+    def _to_config(self) -> SummarizingChatCompletionContextConfig:
+        return SummarizingChatCompletionContextConfig(
+            summary_client=self._summary_client.dump_component(),
+            family=self._family,
+            max_tokens=self._max_tokens,
+            keep_recent=self._keep_recent,
+            summary_max_tokens=self._summary_max_tokens,
+            summary_input_tokens=self._summary_input_tokens,
+            pin_patterns=self._pin_patterns,
+            initial_messages=self._initial_messages,
+        )
+
+    @classmethod
+    def _from_config(cls, config: SummarizingChatCompletionContextConfig) -> Self:
+        return cls(
+            ChatCompletionClient.load_component(config.summary_client),
+            family=config.family,
+            max_tokens=config.max_tokens,
+            keep_recent=config.keep_recent,
+            summary_max_tokens=config.summary_max_tokens,
+            summary_input_tokens=config.summary_input_tokens,
+            pin_patterns=config.pin_patterns,
+            initial_messages=config.initial_messages,
+        )
+
+
+def create_model_context(
+    team: str, model_client: ChatCompletionClient, **overrides: Any
+) -> Optional[SummarizingChatCompletionContext]:
+    """
+    按团队配置为一个智能体（或发言人选择器）创建上下文，每个智能体需要各自的实例
+
+    Args:
+        team: 团队名称，对应[llm.context.teams.<团队名>]配置段
+        model_client: 智能体使用的模型客户端，用于确定统计token数的模型family
+        **overrides: 覆盖配置中的项，如keep_recent
+
+    Returns:
+        SummarizingChatCompletionContext；[llm.context]未启用时返回None，智能体使用默认的完整历史
+    """
+    from .registry import registry
+
+    options = registry.context_settings(team)
+    options.update(overrides)
+    if not options["enabled"]:
+        return None
+    summary_client = registry.model_client(options["summary_provider"], options["summary_model"], cache=True)
+    return SummarizingChatCompletionContext(
+        summary_client,
+        family=str(model_client.model_info.get("family", '')),
+        max_tokens=int(options["max_tokens"]),
+        keep_recent=int(options["keep_recent"]),
+        summary_max_tokens=int(options["summary_max_tokens"]),
+        summary_input_tokens=int(options["summary_input_tokens"]),
+        pin_patterns=options["pin_patterns"],
+    )
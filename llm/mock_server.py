@@ -0,0 +1,516 @@
+"""
+本地的OpenAI兼容模拟模型服务
+
+离线回放Console输出的团队运行记录（如java_export.log、prompt_auditor1.log），用于在没有
+DeepSeek、阿里云百炼、火山方舟服务的情况下对ba_team、develop_team、prompt_engneer_team
+做基准测试和回归测试。支持流式和非流式的chat/completions、工具调用和推理内容（reasoning_content），
+并可注入首token延迟和输出速度。
+
+回放规则：
+- 记录按顺序分为若干回合（用户输入、智能体回复），第一条用户消息是任务本身，不参与回放；
+- 发言人选择请求（只有一条消息）回复下一个回合的发言人；选中用户时该回合随之结束；
+- 智能体请求按顺序取下一个智能体回合，回复其内容、推理内容和工具调用；
+- 上下文摘要请求（llm/context.py）回复新增对话的末尾部分；
+- 记录回放完之后回复default_reply（默认“good job”，即各团队的终止条件）。
+
+让注册表指向模拟服务：在settings.toml的[llm]配置段中设置base_url（或设置环境变量
+DYNACONF_LLM__BASE_URL），所有服务商的模型客户端都会改用该地址。
+
+用法:
+    python -m llm.mock_server --transcript java_export.log --latency 0.5 --tokens-per-second 40
+    DYNACONF_LLM__BASE_URL=http://127.0.0.1:8766/v1 python prompt_engneer_team.py
+
+用户回合由UserProxyAgent的输入完成，可以用记录中的用户输入代替手工输入:
+    UserProxyAgent("user", input_func=TranscriptReplay(load_transcript("java_export.log")).input_func())
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Console输出的消息标题，如 ---------- TextMessage (user) ----------
+_HEADER = re.compile(r'-{10} (\w+) \(([^()\n]*)\) -{10}\n?')
+
+# ToolCallRequestEvent的内容：[FunctionCall(id='...', arguments='...', name='...')]
+_FUNCTION_CALL = re.compile(r"FunctionCall\(id='(.*?)', arguments='(.*?)', name='(.*?)'\)", re.S)
+
+# UserProxyAgent的输入提示，会和下一条消息的标题打印在同一行
+_INPUT_PROMPT = 'Enter your response: '
+
+# 不是模型输出的消息（由智能体或团队自己生成），回放时跳过
+_SKIPPED_TYPES = {
+    'ToolCallExecutionEvent',
+    'ToolCallSummaryMessage',
+    'SelectSpeakerEvent',
+    'SelectorEvent',
+    'MemoryQueryEvent',
+    'CodeExecutionEvent',
+    'UserInputRequestedEvent',
+}
+
+# [llm.mock]配置段的默认值
+DEFAULT_MOCK_SETTINGS: Dict[str, Any] = {
+    "host": "127.0.0.1",
+    "port": 8766,
+    "latency": 0.0,
+    "tokens_per_second": 0.0,
+    "chars_per_token": 1.5,
+    "chunk_tokens": 4,
+    "default_reply": "good job",
+}
+
+
+@dataclass
+class Turn:
+    """
+    运行记录中的一个回合
+    """
+    source: str
+    content: str = ''
+    thought: Optional[str] = None
+    tool_calls: List[Tuple[str, str, str]] = field(default_factory=list)
+
+    @property
+    def is_user(self) -> bool:
+        return self.source == 'user'
+
+
+def split_thought(text: str) -> Tuple[Optional[str], str]:
+    """
+    拆分流式输出中的<think>推理内容和正文
+
+    Returns:
+        (推理内容, 正文)，没有推理内容时推理内容为None
+    """
+    match = re.match(r'\s*<think>(.*?)</think>', text, re.S)
+    if match is None:
+        return None, text
+    return match.group(1).strip(), text[match.end():]
+
+
+def parse_transcript(text: str) -> List[Turn]:
+    """
+    解析Console输出的运行记录
+
+    流式输出的ModelClientStreamingChunkEvent和随后同一发言人的TextMessage合并为一个回合，
+    正文以TextMessage为准，推理内容取自流式输出中的<think>部分
+
+    Args:
+        text: 运行记录文本
+
+    Returns:
+        回合列表，不含第一条用户消息（任务本身）
+    """
+    sections: List[Tuple[str, str, str]] = []
+    matches = list(_HEADER.finditer(text))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        body = text[match.end():end]
+        if body.endswith(_INPUT_PROMPT):
+            body = body[: -len(_INPUT_PROMPT)]
+        sections.append((match.group(1), match.group(2), body.strip('\n')))
+
+    turns: List[Turn] = []
+    # 正在流式输出、还没有出现对应TextMessage的回合
+    streaming: Optional[Turn] = None
+    for kind, source, body in sections:
+        if kind in _SKIPPED_TYPES:
+            continue
+        if kind == 'ModelClientStreamingChunkEvent':
+            thought, content = split_thought(body)
+            streaming = Turn(source, content.strip(), thought)
+            turns.append(streaming)
+        elif kind == 'ThoughtEvent':
+            streaming = Turn(source, thought=body.strip())
+            turns.append(streaming)
+        elif kind == 'ToolCallRequestEvent':
+            calls = _FUNCTION_CALL.findall(body)
+            if streaming is not None and streaming.source == source and not streaming.tool_calls:
+                streaming.tool_calls = calls
+            else:
+                turns.append(Turn(source, tool_calls=calls))
+            streaming = None
+        elif streaming is not None and streaming.source == source:
+            # 流式输出结束后打印的完整消息
+            streaming.content = body.strip()
+            streaming = None
+        else:
+            turns.append(Turn(source, body.strip()))
+            streaming = None
+
+    if turns and turns[0].is_user:
+        turns = turns[1:]
+    return turns
+
+
+def load_transcript(path: str) -> List[Turn]:
+    """
+    读取并解析运行记录文件
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as fp:
+            turns = parse_transcript(fp.read())
+    except OSError as e:
+        logger.error(f"读取运行记录 {path} 失败: {e}")
+        raise RuntimeError(f"读取运行记录 {path} 失败") from e
+    logger.info(
+        f"已加载运行记录 {path}: {len(turns)} 个回合"
+        f"（智能体 {sum(1 for turn in turns if not turn.is_user)} 个，用户 {sum(1 for turn in turns if turn.is_user)} 个）"
+    )
+    return turns
+
+
+class TranscriptReplay:
+    """
+    按顺序回放运行记录，多个请求线程共用
+    """
+
+    def __init__(self, turns: List[Turn], default_reply: str = 'good job'):
+        """
+        Args:
+            turns: 回合列表
+            default_reply: 记录回放完之后和非回放请求的回复
+        """
+        self.turns = turns
+        self.default_reply = default_reply
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def select_speaker(self, prompt: str) -> str:
+        """
+        回复发言人选择请求：下一个回合的发言人，记录回放完之后选择用户（或第一个参与者）
+        """
+        with self._lock:
+            if self.position < len(self.turns):
+                turn = self.turns[self.position]
+                if turn.is_user:
+                    # 用户回合由UserProxyAgent的输入完成，选中即结束
+                    self.position += 1
+                return turn.source
+        participants = re.findall(r"'([^']+)'", (re.findall(r"\[(?:'[^']+'(?:, )?)+\]", prompt) or [''])[-1])
+        if participants and 'user' not in participants:
+            return participants[0]
+        return 'user'
+
+    def next_turn(self) -> Optional[Turn]:
+        """
+        取下一个智能体回合，跳过其前面的用户回合；回放完时返回None
+        """
+        with self._lock:
+            while self.position < len(self.turns) and self.turns[self.position].is_user:
+                self.position += 1
+            if self.position >= len(self.turns):
+                return None
+            turn = self.turns[self.position]
+            self.position += 1
+            return turn
+
+    def user_inputs(self) -> Iterator[str]:
+        """
+        按顺序返回记录中的用户输入，用于UserProxyAgent的input_func
+        """
+        for turn in self.turns:
+            if turn.is_user:
+                yield turn.content
+
+    def input_func(self):
+        """
+        返回UserProxyAgent可用的input_func，按顺序回答记录中的用户输入，用完后回复default_reply
+        """
+        inputs = self.user_inputs()
+
+        def _input(prompt: str) -> str:
+            return next(inputs, self.default_reply)
+
+        return _input
+
+
+def _is_summary_request(messages: List[Dict[str, Any]]) -> bool:
+    from .context import SUMMARY_PROMPT
+
+    first_line = SUMMARY_PROMPT.split('\n', 1)[0]
+    return bool(messages) and messages[0].get('role') == 'system' and str(messages[0].get('content', '')).startswith(first_line)
+
+
+def _message_content(message: Dict[str, Any]) -> str:
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        return '\n'.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class MockModelServer:
+    """
+    OpenAI兼容的模拟模型服务
+    """
+
+    def __init__(
+        self,
+        replay: TranscriptReplay,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        chars_per_token: float = 1.5,
+        chunk_tokens: int = 4,
+    ):
+        """
+        Args:
+            replay: 运行记录回放
+            latency: 首token延迟（秒）
+            tokens_per_second: 输出速度，0表示不限速
+            chars_per_token: 估算token数时每个token的字符数
+            chunk_tokens: 流式输出时每个分片的token数
+        """
+        self.replay = replay
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_token = chars_per_token
+        self.chunk_tokens = max(1, int(chunk_tokens))
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1 if text else 0
+
+    def reply(self, request: Dict[str, Any]) -> Turn:
+        """
+        按请求类型生成回复回合
+        """
+        messages = request.get('messages') or []
+        with self._lock:
+            self.requests += 1
+        if len(messages) == 1:
+            return Turn('selector', self.replay.select_speaker(_message_content(messages[0])))
+        if _is_summary_request(messages):
+            text = _message_content(messages[-1])
+            return Turn('summary', text[-2000:])
+        turn = self.replay.next_turn()
+        if turn is None:
+            return Turn('mock', self.replay.default_reply)
+        if turn.tool_calls and not request.get('tools'):
+            # 请求没有提供工具时不能回复工具调用
+            return Turn(turn.source, turn.content or self.replay.default_reply, turn.thought)
+        return turn
+
+    def usage(self, request: Dict[str, Any], turn: Turn) -> Dict[str, int]:
+        """
+        按字符数估算的token用量
+        """
+        prompt_tokens = sum(self._tokens(_message_content(message)) for message in request.get('messages') or [])
+        completion_tokens = self._tokens(turn.content) + self._tokens(turn.thought or '')
+        completion_tokens += sum(self._tokens(arguments) for _, arguments, _ in turn.tool_calls)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+    def _wait(self, tokens: int):
+        if self.tokens_per_second > 0 and tokens > 0:
+            time.sleep(tokens / self.tokens_per_second)
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        非流式回复，等待首token延迟和全部输出时间后返回
+        """
+        turn = self.reply(request)
+        usage = self.usage(request, turn)
+        time.sleep(self.latency)
+        self._wait(usage['completion_tokens'])
+        message: Dict[str, Any] = {'role': 'assistant', 'content': turn.content or None}
+        if turn.thought:
+            message['reasoning_content'] = turn.thought
+        if turn.tool_calls:
+            message['tool_calls'] = [
+                {'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': arguments}}
+                for call_id, arguments, name in turn.tool_calls
+            ]
+        return {
+            'id': f'chatcmpl-mock-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': message,
+                'finish_reason': 'tool_calls' if turn.tool_calls else 'stop',
+            }],
+            'usage': usage,
+        }
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        流式回复：推理内容、正文、工具调用依次按分片输出，分片之间按输出速度等待
+        """
+        turn = self.reply(request)
+        usage = self.usage(request, turn)
+        base = {
+            'id': f'chatcmpl-mock-{self.requests}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+        }
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': finish_reason}])
+
+        time.sleep(self.latency)
+        yield chunk({'role': 'assistant', 'content': ''})
+        size = max(1, int(self.chunk_tokens * self.chars_per_token))
+        for key, text in (('reasoning_content', turn.thought or ''), ('content', turn.content)):
+            for start in range(0, len(text), size):
+                piece = text[start:start + size]
+                self._wait(self._tokens(piece))
+                yield chunk({key: piece})
+        for index, (call_id, arguments, name) in enumerate(turn.tool_calls):
+            self._wait(self._tokens(arguments))
+            yield chunk({'tool_calls': [{
+                'index': index,
+                'id': call_id,
+                'type': 'function',
+                'function': {'name': name, 'arguments': arguments},
+            }]})
+        yield chunk({}, 'tool_calls' if turn.tool_calls else 'stop')
+        if (request.get('stream_options') or {}).get('include_usage'):
+            yield dict(base, choices=[], usage=usage)
+
+
+def serve(server: MockModelServer, host: str, port: int):
+    """
+    启动模拟模型服务（每个请求一个线程）
+
+    POST /v1/chat/completions  OpenAI兼容的请求，stream为true时以SSE输出
+    GET  /v1/models
+    GET  /health
+
+    Args:
+        server: 模拟模型服务
+        host: 监听地址
+        port: 监听端口
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status: int, body: Any):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, chunks: Iterator[Dict[str, Any]]):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            for item in chunks:
+                self.wfile.write(f"data: {json.dumps(item, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/health':
+                replay = server.replay
+                self._send_json(200, {
+                    'status': 'ok',
+                    'requests': server.requests,
+                    'position': replay.position,
+                    'turns': len(replay.turns),
+                })
+            elif path in ('/v1/models', '/models'):
+                self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'owned_by': 'mock'}]})
+            else:
+                self._send_json(404, {'error': {'message': '未知的路径'}})
+
+        def do_POST(self):
+            if urlparse(self.path).path not in ('/v1/chat/completions', '/chat/completions'):
+                self._send_json(404, {'error': {'message': '未知的路径'}})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError as e:
+                self._send_json(400, {'error': {'message': f'无效的JSON: {e}'}})
+                return
+            try:
+                if request.get('stream'):
+                    self._send_stream(server.stream(request))
+                else:
+                    self._send_json(200, server.completion(request))
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("客户端已断开连接")
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    http_server = ThreadingHTTPServer((host, port), Handler)
+    logger.info(f"模拟模型服务已启动: http://{host}:{port}/v1")
+    try:
+        http_server.serve_forever()
+    finally:
+        http_server.server_close()
+
+
+def mock_settings() -> Dict[str, Any]:
+    """
+    [llm.mock]配置段，未配置的项使用默认值
+    """
+    from .registry import registry
+
+    configured = (registry.settings.get("llm") or {}).get("mock") or {}
+    return {key: configured.get(key, default) for key, default in DEFAULT_MOCK_SETTINGS.items()}
+
+
+def main():
+    """
+    命令行入口
+    """
+    import argparse
+
+    options = mock_settings()
+    parser = argparse.ArgumentParser(description='OpenAI兼容的模拟模型服务')
+    parser.add_argument('-t', '--transcript', default=None, help='回放的运行记录（Console输出），不指定时所有请求回复固定文本')
+    parser.add_argument('--host', default=options['host'], help='监听地址')
+    parser.add_argument('--port', type=int, default=options['port'], help='监听端口')
+    parser.add_argument('--latency', type=float, default=options['latency'], help='首token延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=options['tokens_per_second'], help='输出速度，0表示不限速')
+    parser.add_argument('--chars-per-token', type=float, default=options['chars_per_token'], help='估算token数时每个token的字符数')
+    parser.add_argument('--chunk-tokens', type=int, default=options['chunk_tokens'], help='流式输出时每个分片的token数')
+    parser.add_argument('--default-reply', default=options['default_reply'], help='记录回放完之后的回复')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        turns = load_transcript(args.transcript) if args.transcript else []
+    except RuntimeError:
+        return 1
+    server = MockModelServer(
+        TranscriptReplay(turns, default_reply=args.default_reply),
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        chars_per_token=args.chars_per_token,
+        chunk_tokens=args.chunk_tokens,
+    )
+    try:
+        serve(server, args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
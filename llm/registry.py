@@ -0,0 +1,307 @@
+"""
+模型客户端注册表
+
+各团队脚本不再各自构造OpenAIChatCompletionClient：同一个服务地址（DeepSeek、阿里云百炼、
+火山方舟等）只创建一个带连接池、keep-alive的httpx.AsyncClient，所有该服务商的模型客户端
+共用它，避免每个客户端各自建立连接和TLS握手。
+
+服务商的api_key和base_url读取conf.settings中同名的配置段（如[deepseek]），
+连接池参数读取[llm]配置段。以cache=True请求的客户端在[llm.cache]启用时包装为
+ChatCompletionCache，响应保存在本地SQLite文件中（见llm/cache.py）。各团队的上下文压缩
+读取[llm.context]配置段（见llm/context.py）。[llm]配置段的base_url覆盖所有服务商的地址，
+用于离线回放（见llm/mock_server.py）。
+
+注意：共享的HTTP连接池绑定在首次使用它的事件循环上，同一进程中的所有团队应运行在同一个
+事件循环中；退出前调用 await registry.aclose() 关闭连接池，不要单独关闭模型客户端。
+
+用法:
+    from llm import get_model_client, registry
+
+    deepseek_model_client = get_model_client("deepseek", "deepseek-chat")
+    selector_model_client = get_model_client("deepseek", "deepseek-chat", temperature=0.0, cache=True)
+    ...
+    await registry.aclose()
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+from autogen_core.models import ChatCompletionClient, ModelInfo
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+logger = logging.getLogger(__name__)
+
+# 各服务商模型的能力声明（火山方舟上的豆包模型沿用deepseek的family）
+PROVIDER_MODEL_INFO: Dict[str, ModelInfo] = {
+    "deepseek": ModelInfo(
+        vision=False,
+        function_calling=True,
+        json_output=True,
+        family="deepseek",
+        structured_output=True,
+    ),
+    "aliyun": ModelInfo(
+        vision=False,
+        function_calling=True,
+        json_output=True,
+        family="qwen3",
+        structured_output=True,
+    ),
+    "volces": ModelInfo(
+        vision=False,
+        function_calling=True,
+        json_output=True,
+        family="deepseek",
+        structured_output=True,
+    ),
+}
+
+# [llm]配置段的默认值
+DEFAULT_LLM_SETTINGS: Dict[str, Any] = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "connect_timeout": 10.0,
+    "timeout": 600.0,
+    "http2": True,
+}
+
+# [llm.cache]配置段的默认值
+DEFAULT_CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": False,
+    "path": ".llm_cache/responses.sqlite",
+    "ttl": 7 * 24 * 3600,
+    "max_entries": 10000,
+}
+
+
+def http2_available() -> bool:
+    """
+    httpx的HTTP/2支持依赖可选的h2包
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ModelClientRegistry:
+    """
+    按服务地址共享HTTP连接池的模型客户端注册表
+    """
+
+    def __init__(self, settings: Any = None):
+        """
+        初始化注册表，HTTP连接池和模型客户端都在首次请求时才创建
+
+        Args:
+            settings: 配置对象，默认使用conf.settings
+        """
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._http_clients: Dict[str, Any] = {}
+        self._model_clients: Dict[Tuple[str, str, str, bool], ChatCompletionClient] = {}
+        self._cache_stores: List[Any] = []
+
+    @property
+    def settings(self) -> Any:
+        """
+        配置对象，首次访问时导入conf.settings
+        """
+        if self._settings is None:
+            from conf import settings
+
+            self._settings = settings
+        return self._settings
+
+    def llm_settings(self) -> Dict[str, Any]:
+        """
+        [llm]配置段，未配置的项使用默认值
+        """
+        configured = self.settings.get("llm") or {}
+        return {key: configured.get(key, default) for key, default in DEFAULT_LLM_SETTINGS.items()}
+
+    def cache_settings(self) -> Dict[str, Any]:
+        """
+        [llm.cache]配置段，未配置的项使用默认值
+        """
+        configured = (self.settings.get("llm") or {}).get("cache") or {}
+        return {key: configured.get(key, default) for key, default in DEFAULT_CACHE_SETTINGS.items()}
+
+    def context_settings(self, team: str) -> Dict[str, Any]:
+        """
+        [llm.context]配置段，[llm.context.teams.<团队名>]中的项覆盖团队级别的配置
+
+        Args:
+            team: 团队名称
+
+        Returns:
+            合并后的配置，未配置的项使用默认值
+        """
+        from .context import DEFAULT_CONTEXT_SETTINGS
+
+        configured = (self.settings.get("llm") or {}).get("context") or {}
+        team_configured = (configured.get("teams") or {}).get(team) or {}
+        options = {}
+        for key, default in DEFAULT_CONTEXT_SETTINGS.items():
+            value = team_configured.get(key, configured.get(key, default))
+            options[key] = dict(value) if isinstance(default, dict) else value
+        return options
+
+    def provider_settings(self, provider: str) -> Tuple[str, str]:
+        """
+        读取服务商的api_key和base_url，[llm]配置段设置了base_url时所有服务商都使用该地址
+
+        Args:
+            provider: 服务商名称，对应配置中的同名配置段
+
+        Returns:
+            (api_key, base_url)
+        """
+        section = self.settings.get(provider) or {}
+        override = (self.settings.get("llm") or {}).get("base_url")
+        if override:
+            # 所有服务商改用同一个地址（如本地的模拟模型服务llm/mock_server.py）
+            return section.get("api_key") or "mock", override
+        if not section.get("base_url"):
+            logger.error(f"未找到服务商 {provider} 的配置（需要[{provider}]配置段中的api_key和base_url）")
+            raise RuntimeError(f"未找到服务商 {provider} 的配置")
+        return section.get("api_key"), section.get("base_url")
+
+    def http_client(self, base_url: str) -> Any:
+        """
+        返回服务地址对应的共享HTTP客户端，不存在时按[llm]配置创建
+
+        Args:
+            base_url: 服务地址
+
+        Returns:
+            httpx.AsyncClient
+        """
+        with self._lock:
+            client = self._http_clients.get(base_url)
+            if client is None:
+                import httpx
+                from openai import DefaultAsyncHttpxClient, Timeout
+
+                options = self.llm_settings()
+                http2 = bool(options["http2"]) and http2_available()
+                client = DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=int(options["max_connections"]),
+                        max_keepalive_connections=int(options["max_keepalive_connections"]),
+                        keepalive_expiry=float(options["keepalive_expiry"]),
+                    ),
+                    timeout=Timeout(float(options["timeout"]), connect=float(options["connect_timeout"])),
+                    http2=http2,
+                )
+                self._http_clients[base_url] = client
+                logger.info(f"已创建HTTP连接池: {base_url}（HTTP/2: {'是' if http2 else '否'}）")
+            return client
+
+    def model_client(self, provider: str, model: str, cache: bool = False, **kwargs: Any) -> ChatCompletionClient:
+        """
+        返回指定服务商模型的客户端，相同参数的请求返回同一个实例
+
+        Args:
+            provider: 服务商名称（deepseek、aliyun、volces）
+            model: 模型名称
+            cache: 是否缓存响应，只在[llm.cache]的enabled为true时生效；
+                只应用于相同输入期望相同输出的调用（发言人选择、temperature=0）
+            **kwargs: 其他OpenAIChatCompletionClient参数，如temperature、extra_body
+
+        Returns:
+            使用共享HTTP连接池的模型客户端
+        """
+        cache_options = self.cache_settings()
+        cache = bool(cache) and bool(cache_options["enabled"])
+        key = (provider, model, repr(sorted(kwargs.items())), cache)
+        client = self._model_clients.get(key)
+        if client is not None:
+            return client
+
+        api_key, base_url = self.provider_settings(provider)
+        kwargs.setdefault("model_info", PROVIDER_MODEL_INFO.get(provider))
+        if kwargs["model_info"] is None:
+            logger.error(f"服务商 {provider} 没有预置的ModelInfo，请通过model_info参数提供")
+            raise RuntimeError(f"服务商 {provider} 没有预置的ModelInfo")
+        client = OpenAIChatCompletionClient(
+            api_key=api_key,
+            model=model,
+            base_url=base_url,
+            http_client=self.http_client(base_url),
+            **kwargs,
+        )
+        if cache:
+            client = self._wrap_cache(client, provider, model, kwargs, cache_options)
+        with self._lock:
+            client = self._model_clients.setdefault(key, client)
+        return client
+
+    def _wrap_cache(
+        self,
+        client: OpenAIChatCompletionClient,
+        provider: str,
+        model: str,
+        create_args: Dict[str, Any],
+        options: Dict[str, Any],
+    ) -> ChatCompletionClient:
+        """
+        用ChatCompletionCache包装客户端，命名空间区分服务商、模型和采样参数
+        """
+        from autogen_ext.models.cache import ChatCompletionCache
+
+        from .cache import SqliteCacheStore, cache_namespace
+
+        store = SqliteCacheStore(
+            options["path"],
+            namespace=cache_namespace(provider, model, create_args),
+            ttl=options["ttl"],
+            max_entries=options["max_entries"],
+        )
+        with self._lock:
+            self._cache_stores.append(store)
+        logger.info(f"已为 {provider}/{model} 启用响应缓存: {options['path']}")
+        return ChatCompletionCache(client, store)
+
+    def cache_stats(self) -> List[Dict[str, Any]]:
+        """
+        各缓存命名空间的命中统计
+        """
+        with self._lock:
+            stores = list(self._cache_stores)
+        return [store.stats() for store in stores]
+
+    async def aclose(self):
+        """
+        关闭所有共享的HTTP连接池，之后再请求客户端会重新创建；启用了响应缓存时输出命中率
+        """
+        for stats in self.cache_stats():
+            if stats["hits"] or stats["misses"]:
+                logger.info(
+                    f"响应缓存 {stats['namespace']}: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+                    f"命中率 {stats['hit_rate']:.1%}"
+                )
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._model_clients.clear()
+            self._cache_stores.clear()
+        for client in http_clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭HTTP连接池失败: {e}")
+
+
+# 进程内共享的注册表
+registry = ModelClientRegistry()
+
+
+def get_model_client(provider: str, model: str, cache: bool = False, **kwargs: Any) -> ChatCompletionClient:
+    """
+    从共享注册表获取模型客户端，参数见ModelClientRegistry.model_client
+    """
+    return registry.model_client(provider, model, cache=cache, **kwargs)
@@ -0,0 +1,211 @@
+"""
+基于规则的发言人选择
+
+SelectorGroupChat每一轮都要调用一次模型来选择下一个发言人，而各团队的选择提示词中
+已经约定了固定的流程标识符（如“###开发完成###”“生成TODO列表”“执行工具”），命中时
+下一个发言人是确定的。RoutingTable把这些约定写成声明式的路由表（正则 → 参与者，
+目标不可用时依次降级），作为selector_func在模型之前执行：最近一条消息命中规则时
+直接返回发言人，省去一次模型调用；未命中时返回None，仍由模型按选择提示词决定。
+
+selector_func直接返回发言人时，SelectorGroupChat不会更新自己记录的上一个发言人，
+因此路由表同时提供candidate_func，按消息历史排除上一个发言人，代替allow_repeated_speaker。
+
+用法:
+    from llm import Route, RoutingTable
+
+    routing = RoutingTable(
+        "develop_team",
+        routes=[
+            Route("生成TODO列表", "SeniorDevelopExport"),
+            Route("执行工具", "ToolExport"),
+        ],
+        participants=[user, tool_export, senior_develop_export],
+        fallback="user",
+        allow_repeated_speaker=False,
+    )
+    team = SelectorGroupChat(..., selector_func=routing.select, candidate_func=routing.candidates)
+    ...
+    routing.log_stats()
+"""
+
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Union
+
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Route:
+    """
+    一条路由规则：最近一条消息匹配pattern时，按顺序选择targets中第一个可用的参与者
+    """
+    pattern: Union[str, Pattern[str]]
+    targets: Union[str, Sequence[str]]
+    sources: Optional[Sequence[str]] = None
+    name: str = ''
+    regex: Pattern[str] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.regex = re.compile(self.pattern) if isinstance(self.pattern, str) else self.pattern
+        self.targets = [self.targets] if isinstance(self.targets, str) else list(self.targets)
+        if not self.targets:
+            raise ValueError(f"路由规则 {self.regex.pattern} 没有目标参与者")
+        if not self.name:
+            self.name = self.regex.pattern
+
+    def matches(self, message: BaseChatMessage) -> bool:
+        """
+        判断消息是否命中规则
+
+        Args:
+            message: 最近一条对话消息
+
+        Returns:
+            来源符合sources（未指定时不限来源）且内容匹配pattern时返回True
+        """
+        if self.sources is not None and message.source not in self.sources:
+            return False
+        return self.regex.search(message.to_text()) is not None
+
+
+class RoutingTable:
+    """
+    SelectorGroupChat的规则路由表，统计规则命中（跳过模型调用）的比例
+    """
+
+    def __init__(
+        self,
+        name: str,
+        routes: Sequence[Route],
+        participants: Sequence[Any],
+        fallback: Optional[str] = None,
+        allow_repeated_speaker: bool = False,
+    ):
+        """
+        创建路由表
+
+        Args:
+            name: 团队名称，用于日志
+            routes: 路由规则，按顺序匹配，命中第一条即停止
+            participants: 团队参与者（智能体或其名称），与SelectorGroupChat的participants一致
+            fallback: 规则命中但所有目标都不可用时选择的参与者（通常是用户），None表示交给模型选择
+            allow_repeated_speaker: 是否允许同一参与者连续发言，与SelectorGroupChat的同名参数含义相同
+        """
+        self.name = name
+        self.routes = list(routes)
+        self.participants = [p if isinstance(p, str) else p.name for p in participants]
+        if fallback is not None and fallback not in self.participants:
+            logger.error(f"路由表 {name} 的降级参与者 {fallback} 不在团队中: {self.participants}")
+            raise RuntimeError(f"降级参与者 {fallback} 不在团队中")
+        self.fallback = fallback
+        self.allow_repeated_speaker = allow_repeated_speaker
+        self._lock = threading.Lock()
+        self.selections = 0
+        self.fallbacks = 0
+        self.route_hits: Dict[str, int] = {route.name: 0 for route in self.routes}
+
+    @staticmethod
+    def _chat_messages(thread: Sequence[Union[BaseAgentEvent, BaseChatMessage]]) -> List[BaseChatMessage]:
+        return [message for message in thread if isinstance(message, BaseChatMessage)]
+
+    def previous_speaker(self, thread: Sequence[Union[BaseAgentEvent, BaseChatMessage]]) -> Optional[str]:
+        """
+        消息历史中的上一个发言人；第一条消息是任务本身，只有任务时返回None
+        """
+        messages = self._chat_messages(thread)
+        if len(messages) < 2:
+            return None
+        return messages[-1].source
+
+    def candidates(self, thread: Sequence[Union[BaseAgentEvent, BaseChatMessage]]) -> List[str]:
+        """
+        可被选择的参与者，用作SelectorGroupChat的candidate_func
+
+        Args:
+            thread: 当前的消息历史
+
+        Returns:
+            参与者名称列表，不允许连续发言时排除上一个发言人
+        """
+        previous = None if self.allow_repeated_speaker else self.previous_speaker(thread)
+        candidates = [name for name in self.participants if name != previous]
+        return candidates or list(self.participants)
+
+    def select(self, thread: Sequence[Union[BaseAgentEvent, BaseChatMessage]]) -> Optional[str]:
+        """
+        按路由规则选择下一个发言人，用作SelectorGroupChat的selector_func
+
+        Args:
+            thread: 当前的消息历史
+
+        Returns:
+            命中规则时返回发言人名称，否则返回None，由模型选择
+        """
+        messages = self._chat_messages(thread)
+        with self._lock:
+            self.selections += 1
+        if not messages:
+            return None
+
+        message = messages[-1]
+        for route in self.routes:
+            if not route.matches(message):
+                continue
+            candidates = self.candidates(thread)
+            speaker = next((target for target in route.targets if target in candidates), None)
+            if speaker is None:
+                if self.fallback is None or self.fallback not in candidates:
+                    logger.debug(f"路由表 {self.name}: 规则 {route.name} 的目标均不可用，交给模型选择")
+                    return None
+                speaker = self.fallback
+                with self._lock:
+                    self.fallbacks += 1
+            with self._lock:
+                self.route_hits[route.name] += 1
+            logger.debug(f"路由表 {self.name}: {message.source} 的消息命中规则 {route.name}，选择 {speaker}")
+            return speaker
+        return None
+
+    def hit_rate(self) -> float:
+        """
+        规则命中（跳过模型调用）的比例
+        """
+        hits = sum(self.route_hits.values())
+        return hits / self.selections if self.selections else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        选择次数、规则命中次数和各规则的命中统计
+        """
+        with self._lock:
+            hits = sum(self.route_hits.values())
+            return {
+                'name': self.name,
+                'selections': self.selections,
+                'rule_hits': hits,
+                'model_selections': self.selections - hits,
+                'fallbacks': self.fallbacks,
+                'hit_rate': hits / self.selections if self.selections else 0.0,
+                'routes': dict(self.route_hits),
+            }
+
+    def log_stats(self):
+        """
+        输出本次运行的规则命中统计
+        """
+        stats = self.stats()
+        if not stats['selections']:
+            return
+        logger.info(
+            f"路由表 {self.name}: 选择发言人 {stats['selections']} 次，规则命中 {stats['rule_hits']} 次"
+            f"（其中降级 {stats['fallbacks']} 次），模型选择 {stats['model_selections']} 次，"
+            f"命中率 {stats['hit_rate']:.1%}"
+        )
+        for route, hits in stats['routes'].items():
+            if hits:
+                logger.info(f"  规则 {route}: {hits} 次")
@@ -3,111 +3,36 @@ app
 
 """
 
-import sys
-import os
 import asyncio
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.ui import Console
-from autogen_core.models import ModelInfo
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.conditions import TextMentionTermination
 
 # from autogen_ext.tools.mcp import McpWorkbench, StdioServerParams
 from autogen_core.model_context import BufferedChatCompletionContext
 
-try:
-    # Add the parent directory to the path so we can import conf
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from conf import settings
-except ImportError:
-    print(
-        "Failed to import settings from conf. Make sure conf is in the parent directory."
-    )
-    raise
+from llm import Route, RoutingTable, create_model_context, get_model_client, registry
 
 
+deepseek_model_client = get_model_client("deepseek", "deepseek-chat")
 
-deepseek_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_reasoner_model_client = get_model_client("deepseek", "deepseek-reasoner")
 
-aliyun_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="qwen3",
-    structured_output=True,
-)
+aliyun_model_client = get_model_client("aliyun", "qwen3-max")
 
-volce_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,
-    json_output=True,
-    family="deepseek",
-    structured_output=True,
-)
-
-deepseek_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
-
-deepseek_reasoner_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-reasoner",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
-
-aliyun_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen3-max",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
+aliyun_thinking_model_client = get_model_client("aliyun", "qwen-plus-2025-07-28")
 
-aliyun_thinking_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen-plus-2025-07-28",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
+aliyun_deepseek_model_client = get_model_client("aliyun", "deepseek-v3.2")
 
-aliyun_deepseek_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="deepseek-v3.2",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
+aliyun_deepseek_thinking_model_client = get_model_client("aliyun", "deepseek-v3.2", extra_body={"enable_thinking": True})
 
-aliyun_deepseek_thinking_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="deepseek-v3.2",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-    extra_body={"enable_thinking": True},
-)
+doubao_model_client = get_model_client("volces", "doubao-seed-1-6-251015")
 
-doubao_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-251015",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+doubao_thinking_model_client = get_model_client("volces", "doubao-seed-1-6-thinking-250715")
 
-doubao_thinking_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-thinking-250715",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+# 发言人选择：相同的对话历史得到相同的选择，重复运行同一任务时使用响应缓存（见settings.toml的[llm.cache]）
+selector_model_client = get_model_client("aliyun", "qwen3-max", cache=True)
 
 
 # 产品经理
@@ -183,6 +108,7 @@ prompt_generator = AssistantAgent(
     name="PromptGenerator",
     description="提示词生成专家",
     model_client=doubao_model_client,
+    model_context=create_model_context("prompt_engneer_team", doubao_model_client),
     system_message=prompt_generator_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -239,6 +165,7 @@ prompt_auditor = AssistantAgent(
     name="PromptAuditor",
     description="提示词评审专家",
     model_client=doubao_thinking_model_client,
+    model_context=create_model_context("prompt_engneer_team", doubao_thinking_model_client),
     system_message=prompt_auditor_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -308,6 +235,7 @@ prompt_optimizer = AssistantAgent(
     name="PromptOptimizer",
     description="提示词优化执行专家",
     model_client=doubao_model_client,
+    model_context=create_model_context("prompt_engneer_team", doubao_model_client),
     system_message=prompt_optimizer_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -383,6 +311,19 @@ UserProxyAgent
 
 model_context = BufferedChatCompletionContext(buffer_size=2)
 
+# 专家输出末尾的流程控制标识符直接决定下一个发言人，未命中时才调用模型选择
+prompt_engneer_team_routing = RoutingTable(
+    "prompt_engneer_team",
+    routes=[
+        Route("###评估完成，需优化###", "PromptOptimizer"),
+        Route("###评估通过###", "user"),
+        Route("###优化完成###", "user"),
+    ],
+    participants=[prompt_generator, prompt_auditor, prompt_optimizer, user],
+    fallback="user",
+    allow_repeated_speaker=False,
+)
+
 # 创建团队
 prompt_engneer_team = SelectorGroupChat(
     participants=[
@@ -391,13 +332,15 @@ prompt_engneer_team = SelectorGroupChat(
         prompt_optimizer,
         user,
     ],
-    model_client=aliyun_model_client,
+    model_client=selector_model_client,
     termination_condition=TextMentionTermination("good job"),
     selector_prompt=selector_prompt,
     max_turns=50,
     allow_repeated_speaker=False,
     max_selector_attempts=2,
     model_context=model_context,
+    selector_func=prompt_engneer_team_routing.select,
+    candidate_func=prompt_engneer_team_routing.candidates,
 )
 
 optimize_task = """
@@ -459,7 +402,12 @@ create_task = """
 
 
 async def main() -> None:
-    await Console(prompt_engneer_team.run_stream(task=create_task))
+    try:
+        await Console(prompt_engneer_team.run_stream(task=create_task))
+    finally:
+        prompt_engneer_team_routing.log_stats()
+        # 关闭共享的HTTP连接池
+        await registry.aclose()
 
 
 if __name__ == "__main__":
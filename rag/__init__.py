@@ -0,0 +1,11 @@
+"""
+rag package initializer.
+
+Shared building blocks for the Rust docs retrieval pipeline.
+"""
+
+from .embedding_cache import EmbeddingCache
+
+__all__ = [
+    "EmbeddingCache",
+]
@@ -0,0 +1,332 @@
+"""
+文本切分策略
+
+所有策略都实现ChunkingStrategy接口，通过CHUNKING_STRATEGIES按名称注册，
+由配置项chunk_strategy选择：
+
+- character: 按句子组合为不超过max_chunk_length个字符的文本块，保留代码块
+- token: 同上，但按Embedding模型分词器的token数计量，上限为模型的最大序列长度
+- section: 先按Markdown标题切分为小节，过长的小节再按字符切分
+- semantic: 先按字符粗切分，再在相邻句子语义相似度低的位置细切分（需要向量化函数）
+- code: 代码块单独成块（带上前一行说明文字），代码块之间的正文按字符切分
+
+策略对象会被发送到解析子进程，因此只保存可序列化的参数；
+需要模型的步骤放在refine中，由主进程传入向量化函数执行。
+"""
+
+import re
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+import numpy as np
+
+from .semantic_chunker import DEFAULT_THRESHOLD, SemanticChunker
+from .tokenization import count_tokens, special_token_count
+
+logger = logging.getLogger(__name__)
+
+_CODE_BLOCK_PATTERN = re.compile(r'```(?:rust)?(.*?)```', re.DOTALL)
+_CODE_PLACEHOLDER_PATTERN = re.compile(r'__CODE_BLOCK_(\d+)__')
+_HEADING_PATTERN = re.compile(r'^#{1,6}\s')
+
+
+def _join_sentences(sentences: Sequence[str]) -> str:
+    """
+    用空格拼接句子，"# "标题独占一行，便于之后识别小节标题
+
+    以问号等结尾的标题会被切成单独的句子，此时其后的句子也要另起一行
+    """
+    parts = []
+    previous_is_heading = False
+    for i, sentence in enumerate(sentences):
+        is_heading = bool(_HEADING_PATTERN.match(sentence))
+        if i:
+            parts.append('\n' if is_heading or previous_is_heading else ' ')
+        parts.append(sentence)
+        previous_is_heading = is_heading and '\n' not in sentence
+    return ''.join(parts)
+
+
+def split_text_with_code(text: str, max_length: int, overlap: int, token_model: Optional[str] = None) -> List[str]:
+    """
+    将长文本切分为多个文本块，保留代码块
+
+    代码块先替换为占位符再按句子切分，长度按占位符计算；每个句子只还原一次代码块，
+    文本块以句子下标区间表示，最后一次性拼接。新文本块开头会带上前一块末尾
+    总长度不超过overlap的句子。
+    指定token_model时max_length和overlap以token计，用该模型的分词器统计还原代码块后的句子
+
+    Args:
+        text: 原始文本
+        max_length: 每个文本块的最大长度
+        overlap: 相邻文本块的重叠长度
+        token_model: 按token计量时使用其分词器的模型名称，为None时按字符计量
+
+    Returns:
+        切分后的文本块列表
+    """
+    if token_model is None and len(text) <= max_length:
+        return [text]
+
+    import nltk
+
+    # 1. 识别并提取代码块
+    code_blocks = []
+
+    def replace_code(match):
+        code_blocks.append(match.group(0))
+        return f'__CODE_BLOCK_{len(code_blocks)-1}__'
+
+    text_with_placeholders = _CODE_BLOCK_PATTERN.sub(replace_code, text)
+
+    # 2. 使用nltk按语义切分句子
+    sentences = nltk.sent_tokenize(text_with_placeholders)
+
+    # 3. 每个句子只还原一次代码块占位符
+    def restore_code(match):
+        return code_blocks[int(match.group(1))]
+
+    if token_model is None:
+        lengths = [len(sentence) + 1 for sentence in sentences]
+    if code_blocks:
+        sentences = [
+            _CODE_PLACEHOLDER_PATTERN.sub(restore_code, sentence) if '__CODE_BLOCK_' in sentence else sentence
+            for sentence in sentences
+        ]
+    if token_model is not None:
+        lengths = count_tokens(token_model, sentences)
+
+    # 4. 将句子组合成符合长度要求的文本块，记录每块的句子下标区间 [start, end)
+    spans = []
+    start = 0
+    current_length = 0
+
+    for i, sentence_length in enumerate(lengths):
+        if current_length + sentence_length <= max_length or i == start:
+            current_length += sentence_length
+            continue
+
+        spans.append((start, i))
+
+        # 开始新块，从前一块末尾向前取不超过overlap的句子作为重叠
+        new_start = i
+        overlap_length = 0
+        while (
+            new_start - 1 > start
+            and overlap_length + lengths[new_start - 1] <= overlap
+            and overlap_length + lengths[new_start - 1] + sentence_length <= max_length
+        ):
+            new_start -= 1
+            overlap_length += lengths[new_start]
+        start = new_start
+        current_length = overlap_length + sentence_length
+
+    if start < len(sentences):
+        spans.append((start, len(sentences)))
+
+    return [_join_sentences(sentences[start:end]) for start, end in spans]
+
+
+class ChunkingStrategy:
+    """
+    切分策略接口
+
+    split在解析子进程中执行，只能依赖可序列化的参数；needs_encoder为True的策略
+    还需要在主进程中调用refine，用向量化函数对split的结果做进一步处理
+    """
+
+    name = ''
+    needs_encoder = False
+
+    def __init__(self, max_length: int, overlap: int):
+        self.max_length = max_length
+        self.overlap = overlap
+
+    @classmethod
+    def from_config(cls, config: Any) -> 'ChunkingStrategy':
+        """
+        从配置对象（Dynaconf或dict）创建策略
+        """
+        return cls(
+            max_length=int(config.get('max_chunk_length', 1024)),
+            overlap=int(config.get('chunk_overlap', 100)),
+        )
+
+    def split(self, text: str) -> List[str]:
+        """
+        将一个文档的文本切分为文本块
+        """
+        raise NotImplementedError
+
+    def refine(self, chunks: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> List[str]:
+        """
+        用向量化函数进一步处理同一文档的文本块，默认原样返回
+        """
+        return chunks
+
+
+# 按名称注册的切分策略
+CHUNKING_STRATEGIES: Dict[str, Type[ChunkingStrategy]] = {}
+
+
+def register_strategy(cls: Type[ChunkingStrategy]) -> Type[ChunkingStrategy]:
+    """
+    注册切分策略的类装饰器，以类的name属性作为策略名称
+    """
+    CHUNKING_STRATEGIES[cls.name] = cls
+    return cls
+
+
+def create_chunker(name: str, config: Any) -> ChunkingStrategy:
+    """
+    按名称创建切分策略
+
+    Args:
+        name: 策略名称，见CHUNKING_STRATEGIES
+        config: 配置对象（Dynaconf或dict）
+
+    Returns:
+        切分策略对象
+    """
+    if name not in CHUNKING_STRATEGIES:
+        raise ValueError(f"未知的切分策略: {name}，可选: {', '.join(CHUNKING_STRATEGIES)}")
+    return CHUNKING_STRATEGIES[name].from_config(config)
+
+
+@register_strategy
+class CharacterStrategy(ChunkingStrategy):
+    """
+    按句子组合为不超过max_length个字符的文本块
+    """
+
+    name = 'character'
+
+    def split(self, text: str) -> List[str]:
+        return split_text_with_code(text, self.max_length, self.overlap)
+
+
+@register_strategy
+class TokenStrategy(ChunkingStrategy):
+    """
+    按Embedding模型的token数组合句子，max_length为模型的最大序列长度（含特殊token）
+    """
+
+    name = 'token'
+
+    def __init__(self, max_length: int, overlap: int, model_name: str):
+        super().__init__(max_length, overlap)
+        self.model_name = model_name
+
+    @classmethod
+    def from_config(cls, config: Any) -> 'TokenStrategy':
+        return cls(
+            max_length=int(config.get('max_chunk_tokens', 256)),
+            overlap=int(config.get('chunk_overlap_tokens', 32)),
+            model_name=config.get('embedding_model', 'all-MiniLM-L6-v2'),
+        )
+
+    def token_budget(self) -> int:
+        """
+        每个文本块可用的token数（扣除模型添加的特殊token）
+        """
+        return self.max_length - special_token_count(self.model_name)
+
+    def split(self, text: str) -> List[str]:
+        return split_text_with_code(text, self.token_budget(), self.overlap, token_model=self.model_name)
+
+
+@register_strategy
+class SectionStrategy(ChunkingStrategy):
+    """
+    按Markdown标题（# 开头的行）切分为小节，过长的小节再按字符切分；
+    代码块中以#开头的行不视为标题
+    """
+
+    name = 'section'
+
+    def split(self, text: str) -> List[str]:
+        sections = []
+        current = []
+        in_code = False
+        for line in text.splitlines():
+            if line.lstrip().startswith('```'):
+                in_code = not in_code
+            elif not in_code and _HEADING_PATTERN.match(line) and current:
+                sections.append('\n'.join(current))
+                current = []
+            current.append(line)
+        if current:
+            sections.append('\n'.join(current))
+
+        chunks = []
+        for section in sections:
+            section = section.strip()
+            if section:
+                chunks.extend(split_text_with_code(section, self.max_length, self.overlap))
+        return chunks
+
+
+@register_strategy
+class SemanticStrategy(ChunkingStrategy):
+    """
+    先按字符粗切分，再在相邻句子语义相似度低于threshold的位置细切分，
+    包含代码块的文本块保持不变
+    """
+
+    name = 'semantic'
+    needs_encoder = True
+
+    def __init__(self, max_length: int, overlap: int, threshold: float = DEFAULT_THRESHOLD):
+        super().__init__(max_length, overlap)
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config: Any) -> 'SemanticStrategy':
+        return cls(
+            max_length=int(config.get('max_chunk_length', 1024)),
+            overlap=int(config.get('chunk_overlap', 100)),
+            threshold=float(config.get('semantic_threshold', DEFAULT_THRESHOLD)),
+        )
+
+    def split(self, text: str) -> List[str]:
+        return split_text_with_code(text, self.max_length, self.overlap)
+
+    def refine(self, chunks: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> List[str]:
+        """
+        同一文档所有文本块的句子只向量化一次，encode_fn需返回归一化向量
+        """
+        import nltk
+
+        groups = [[chunk] if '```' in chunk else nltk.sent_tokenize(chunk) for chunk in chunks]
+        chunker = SemanticChunker(encode_fn, threshold=self.threshold)
+        return [piece for pieces in chunker.split_groups(groups) for piece in pieces]
+
+
+@register_strategy
+class CodeAwareStrategy(ChunkingStrategy):
+    """
+    每个代码块单独成块，并带上代码块前一行说明文字（如"示例 4-1: ..."）作为上下文；
+    代码块之间的正文按字符切分
+    """
+
+    name = 'code'
+
+    # 作为上下文的说明文字的最大长度
+    lead_in_max_length = 200
+
+    def split(self, text: str) -> List[str]:
+        chunks = []
+        position = 0
+        for match in _CODE_BLOCK_PATTERN.finditer(text):
+            prose = text[position:match.start()].strip()
+            if prose:
+                chunks.extend(split_text_with_code(prose, self.max_length, self.overlap))
+            lines = prose.splitlines()
+            lead_in = lines[-1] if lines and len(lines[-1]) <= self.lead_in_max_length else ''
+            chunks.append(f"{lead_in}\n{match.group(0)}" if lead_in else match.group(0))
+            position = match.end()
+
+        prose = text[position:].strip()
+        if prose:
+            chunks.extend(split_text_with_code(prose, self.max_length, self.overlap))
+        return chunks
@@ -0,0 +1,261 @@
+"""
+文本切分策略对比报告
+
+对同一批抽样文档依次运行各切分策略，统计：切分吞吐量（文本块/秒）、文本块大小分布、
+峰值内存（RSS），以及向量化成本（需要编码的token数、被模型截断的块数，
+指定--embed时还包括实际向量化耗时）。
+
+每个策略默认在独立的子进程中运行，峰值内存互不影响。
+
+用法:
+    python -m rag.chunking_benchmark 文档目录 -c config.toml --sample 100 --strategies character token section code
+"""
+
+import os
+import glob
+import time
+import random
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .chunking import CHUNKING_STRATEGIES, create_chunker
+from .embedding import EMBEDDING_BACKENDS, encode_bucketed, load_embedding_model
+from .html_extract import extract_rustdoc_text
+from .tokenization import count_tokens, special_token_count
+
+logger = logging.getLogger(__name__)
+
+
+def load_sample_documents(docs_dir: str, sample_files: int, seed: int = 0) -> List[str]:
+    """
+    从文档目录中随机抽取HTML/Markdown文件，返回每个文件的完整文本
+
+    HTML文件用rustdoc提取器提取，保留标题和代码围栏
+
+    Args:
+        docs_dir: 文档目录路径
+        sample_files: 抽取的文件数
+        seed: 随机种子
+
+    Returns:
+        文档文本列表
+    """
+    files = sorted(
+        glob.glob(os.path.join(docs_dir, '**', '*.html'), recursive=True)
+        + glob.glob(os.path.join(docs_dir, '**', '*.md'), recursive=True)
+    )
+    random.Random(seed).shuffle(files)
+
+    documents = []
+    for file_path in files[:sample_files]:
+        if file_path.endswith('.html'):
+            content = extract_rustdoc_text(file_path)
+        else:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+        text = '\n'.join(line.strip() for line in content.splitlines() if line.strip())
+        if text:
+            documents.append(text)
+    return documents
+
+
+def _peak_rss_mb() -> float:
+    """
+    当前进程的峰值内存（MB），resource模块只在类Unix系统上可用
+    """
+    import sys
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_strategy(
+    name: str,
+    config: Dict[str, Any],
+    documents: Sequence[str],
+    backend: str = 'torch',
+    embed: bool = False,
+) -> Dict[str, Any]:
+    """
+    用一个切分策略切分全部文档并统计指标（可在子进程中调用）
+
+    Args:
+        name: 策略名称
+        config: 配置字典（键为小写的配置项名称）
+        documents: 文档文本列表
+        backend: 加载模型时使用的推理后端
+        embed: 是否实际向量化全部文本块并计时
+
+    Returns:
+        指标字典
+    """
+    import nltk
+
+    nltk.download('punkt', quiet=True)
+    model_name = config.get('embedding_model', 'all-MiniLM-L6-v2')
+    chunker = create_chunker(name, config)
+
+    encode_fn = None
+    if chunker.needs_encoder or embed:
+        model = load_embedding_model(model_name, backend=backend, device='cpu')
+
+        def encode_fn(texts: List[str]) -> np.ndarray:
+            return encode_bucketed(
+                model,
+                texts,
+                token_budget=int(config.get('embed_token_budget', 8192)),
+                max_batch_size=int(config.get('embed_max_batch_size', 128)),
+                normalize_embeddings=True,
+            )
+
+    start = time.perf_counter()
+    chunks = []
+    for text in documents:
+        pieces = chunker.split(text)
+        if chunker.needs_encoder:
+            pieces = chunker.refine(pieces, encode_fn)
+        chunks.extend(pieces)
+    split_seconds = time.perf_counter() - start
+
+    row = {
+        'strategy': name,
+        'chunks': len(chunks),
+        'chunks_per_second': len(chunks) / split_seconds if split_seconds else float('inf'),
+    }
+    lengths = np.array([len(chunk) for chunk in chunks]) if chunks else np.zeros(1)
+    row['chars_p50'], row['chars_p90'] = np.percentile(lengths, [50, 90]).tolist()
+    row['chars_max'] = int(lengths.max())
+
+    # 向量化成本：模型实际编码的token数（超过最大序列长度的部分被截断，不计入）
+    try:
+        max_tokens = int(config.get('max_chunk_tokens', 256))
+        specials = special_token_count(model_name)
+        counts = [count + specials for count in count_tokens(model_name, chunks)]
+        row['embed_tokens'] = sum(min(count, max_tokens) for count in counts)
+        row['truncated'] = sum(1 for count in counts if count > max_tokens)
+    except Exception as e:
+        logger.warning(f"无法加载分词器，跳过token统计: {e}")
+        row['embed_tokens'] = None
+        row['truncated'] = None
+
+    if embed:
+        start = time.perf_counter()
+        encode_fn(chunks)
+        row['embed_seconds'] = time.perf_counter() - start
+
+    row['peak_rss_mb'] = _peak_rss_mb()
+    return row
+
+
+def benchmark_strategies(
+    strategies: Sequence[str],
+    config: Dict[str, Any],
+    documents: Sequence[str],
+    backend: str = 'torch',
+    embed: bool = False,
+    isolate: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    依次运行各切分策略，返回每个策略的指标
+
+    Args:
+        strategies: 策略名称列表
+        config: 配置字典
+        documents: 文档文本列表
+        backend: 加载模型时使用的推理后端
+        embed: 是否实际向量化全部文本块并计时
+        isolate: 是否每个策略使用独立的子进程（峰值内存互不影响）
+
+    Returns:
+        每个策略一行的指标字典列表
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    rows = []
+    for name in strategies:
+        try:
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    row = executor.submit(run_strategy, name, config, documents, backend, embed).result()
+            else:
+                row = run_strategy(name, config, documents, backend, embed)
+        except Exception as e:
+            logger.error(f"切分策略 {name} 运行失败: {e}")
+            row = {'strategy': name, 'error': str(e)}
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    """
+    把指标格式化为文本表格
+    """
+    def number(value: Optional[float], spec: str) -> str:
+        return '-' if value is None else format(value, spec)
+
+    lines = [
+        f"{'策略':<12}{'块数':>8}{'块/秒':>12}{'p50字符':>10}{'p90字符':>10}{'最大字符':>10}"
+        f"{'编码token':>12}{'截断块':>8}{'向量化(s)':>12}{'峰值内存(MB)':>14}"
+    ]
+    for row in rows:
+        if 'error' in row:
+            lines.append(f"{row['strategy']:<12}  失败: {row['error']}")
+            continue
+        lines.append(
+            f"{row['strategy']:<12}{row['chunks']:>8}{row['chunks_per_second']:>12.1f}"
+            f"{row['chars_p50']:>10.0f}{row['chars_p90']:>10.0f}{row['chars_max']:>10}"
+            f"{number(row['embed_tokens'], 'd'):>12}{number(row['truncated'], 'd'):>8}"
+            f"{number(row.get('embed_seconds'), '.2f'):>12}{row['peak_rss_mb']:>14.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description='文本切分策略对比')
+    parser.add_argument('docs_dir', help='用于抽样的文档目录')
+    parser.add_argument('-c', '--config', default='config.toml', help='向量化工具的配置文件路径')
+    parser.add_argument('--strategies', nargs='+', default=list(CHUNKING_STRATEGIES), choices=list(CHUNKING_STRATEGIES),
+                        help='要对比的切分策略')
+    parser.add_argument('--sample', type=int, default=100, help='抽样的文件数')
+    parser.add_argument('--backend', default='torch', choices=EMBEDDING_BACKENDS, help='需要模型时使用的推理后端')
+    parser.add_argument('--embed', action='store_true', help='实际向量化全部文本块并计时')
+    parser.add_argument('--no-isolate', action='store_true', help='在当前进程中运行全部策略（峰值内存为累计值）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    config: Dict[str, Any] = {}
+    if os.path.exists(args.config):
+        from dynaconf import Dynaconf
+
+        settings = Dynaconf(settings_files=[args.config])
+        config = {key.lower(): value for key, value in settings.as_dict().items()}
+    else:
+        logger.warning(f"未找到配置文件 {args.config}，使用默认参数")
+
+    documents = load_sample_documents(args.docs_dir, args.sample)
+    if not documents:
+        logger.error(f"在 {args.docs_dir} 中没有找到可用的样本文档")
+        return 1
+    logger.info(f"样本文档: {len(documents)} 个，共 {sum(len(text) for text in documents)} 个字符")
+
+    rows = benchmark_strategies(
+        args.strategies, config, documents,
+        backend=args.backend, embed=args.embed, isolate=not args.no_isolate,
+    )
+    print(format_report(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Rust文档向量化与检索的共享配置
+
+向量化工具和检索器读取同一个config.toml，默认值和校验规则集中在这里。
+"""
+
+import os
+import logging
+
+from dynaconf import Dynaconf, Validator
+
+from .chunking import CHUNKING_STRATEGIES
+from .embedding import EMBEDDING_BACKENDS
+from .html_extract import HTML_EXTRACTORS
+
+logger = logging.getLogger(__name__)
+
+
+def load_config(config_path: str) -> Dynaconf:
+    """
+    加载Rust文档向量化和检索共用的配置文件，未配置的项使用默认值并做类型校验
+    
+    Args:
+        config_path: 配置文件路径
+        
+    Returns:
+        配置对象
+    """
+    # 检查配置文件是否存在
+    config_file = config_path if os.path.exists(config_path) else None
+    
+    # 创建Dynaconf配置对象
+    config = Dynaconf(
+        settings_files=[config_file] if config_file else None,
+        # 默认配置
+        default_settings={
+            'qdrant_url': 'http://localhost:6333',
+            'embedding_model': 'all-MiniLM-L6-v2',
+            'collection_name': 'rust_docs_embeddings',
+            'vector_size': 384,  # all-MiniLM-L6-v2的向量维度
+            'max_chunk_length': 1024,
+            'chunk_overlap': 100,
+            'min_chunk_size': 50,
+            'batch_size': 100,
+            'parse_workers': 1,
+            'parse_chunksize': 8,
+            'embed_batch_size': 256,
+            'pipeline_queue_size': 4,
+            'manifest_path': 'rust_docs_manifest.json',
+            'embedding_cache_dir': '.embedding_cache',
+            'embedding_cache_max_mb': 1024,
+            'upload_parallelism': 4,
+            'upload_max_retries': 5,
+            'upload_retry_backoff': 0.5,
+            'manifest_flush_interval': 30,
+            'prefer_grpc': False,
+            'embed_token_budget': 8192,
+            'embed_max_batch_size': 128,
+            'embed_workers': 1,
+            'embed_threads_per_worker': 0,
+            'embedding_backend': 'torch',
+            'onnx_quantization': 'avx512_vnni',
+            'embedding_model_dir': '.models',
+            'chunk_strategy': 'character',
+            'max_chunk_tokens': 256,
+            'chunk_overlap_tokens': 32,
+            'semantic_threshold': 0.45,
+            'html_extractor': 'unstructured',
+            'html_extractor_rules': [],
+            'hnsw_m': 16,
+            'hnsw_ef_construct': 100,
+            'quantization': 'none',
+            'quantization_quantile': 0.99,
+            'quantization_always_ram': True,
+            'quantization_rescore': True,
+            'quantization_oversampling': 2.0,
+            'on_disk_vectors': False,
+            'on_disk_payload': False,
+            'bulk_load': False,
+            'hybrid_search': False,
+            'sparse_model': 'Qdrant/bm25',
+            'dense_vector_name': 'dense',
+            'sparse_vector_name': 'sparse',
+            'hybrid_prefetch_limit': 50,
+            'search_top_k': 5,
+            'search_score_threshold': 0.0,
+            'search_hnsw_ef': 128,
+            'query_cache_size': 1024,
+            'retriever_host': '127.0.0.1',
+            'retriever_port': 8765
+        },
+        # 验证配置
+        validators=[
+            Validator('qdrant_url', must_exist=True, is_type_of=str),
+            Validator('embedding_model', must_exist=True, is_type_of=str),
+            Validator('collection_name', must_exist=True, is_type_of=str),
+            Validator('vector_size', must_exist=True, is_type_of=int),
+            Validator('max_chunk_length', must_exist=True, is_type_of=int),
+            Validator('chunk_overlap', must_exist=True, is_type_of=int),
+            Validator('min_chunk_size', must_exist=True, is_type_of=int),
+            Validator('batch_size', must_exist=True, is_type_of=int),
+            Validator('parse_workers', default=1, is_type_of=int, gte=0),
+            Validator('parse_chunksize', default=8, is_type_of=int, gte=1),
+            Validator('embed_batch_size', default=256, is_type_of=int, gte=1),
+            Validator('pipeline_queue_size', default=4, is_type_of=int, gte=1),
+            Validator('manifest_path', default='rust_docs_manifest.json', is_type_of=str),
+            Validator('embedding_cache_dir', default='.embedding_cache', is_type_of=str),
+            Validator('embedding_cache_max_mb', default=1024, is_type_of=int, gte=1),
+            Validator('upload_parallelism', default=4, is_type_of=int, gte=1),
+            Validator('upload_max_retries', default=5, is_type_of=int, gte=0),
+            Validator('upload_retry_backoff', default=0.5, is_type_of=(int, float), gte=0),
+            Validator('manifest_flush_interval', default=30, is_type_of=(int, float), gte=0),
+            Validator('prefer_grpc', default=False, is_type_of=bool),
+            Validator('embed_token_budget', default=8192, is_type_of=int, gte=1),
+            Validator('embed_max_batch_size', default=128, is_type_of=int, gte=1),
+            Validator('embed_workers', default=1, is_type_of=int, gte=0),
+            Validator('embed_threads_per_worker', default=0, is_type_of=int, gte=0),
+            Validator('embedding_backend', default='torch', is_in=EMBEDDING_BACKENDS),
+            Validator('onnx_quantization', default='avx512_vnni', is_type_of=str),
+            Validator('embedding_model_dir', default='.models', is_type_of=str),
+            Validator('chunk_strategy', default='character', is_in=list(CHUNKING_STRATEGIES)),
+            Validator('max_chunk_tokens', default=256, is_type_of=int, gte=8),
+            Validator('chunk_overlap_tokens', default=32, is_type_of=int, gte=0),
+            Validator('semantic_threshold', default=0.45, is_type_of=(int, float), gte=-1, lte=1),
+            Validator('html_extractor', default='unstructured', is_in=list(HTML_EXTRACTORS)),
+            Validator('html_extractor_rules', default=[], is_type_of=list),
+            Validator('hnsw_m', default=16, is_type_of=int, gte=4),
+            Validator('hnsw_ef_construct', default=100, is_type_of=int, gte=4),
+            Validator('quantization', default='none', is_in=['none', 'int8']),
+            Validator('quantization_quantile', default=0.99, is_type_of=(int, float), gt=0, lte=1),
+            Validator('quantization_always_ram', default=True, is_type_of=bool),
+            Validator('quantization_rescore', default=True, is_type_of=bool),
+            Validator('quantization_oversampling', default=2.0, is_type_of=(int, float), gte=1),
+            Validator('on_disk_vectors', default=False, is_type_of=bool),
+            Validator('on_disk_payload', default=False, is_type_of=bool),
+            Validator('bulk_load', default=False, is_type_of=bool),
+            Validator('hybrid_search', default=False, is_type_of=bool),
+            Validator('sparse_model', default='Qdrant/bm25', is_type_of=str),
+            Validator('dense_vector_name', default='dense', is_type_of=str),
+            Validator('sparse_vector_name', default='sparse', is_type_of=str),
+            Validator('hybrid_prefetch_limit', default=50, is_type_of=int, gte=1),
+            Validator('search_top_k', default=5, is_type_of=int, gte=1),
+            Validator('search_score_threshold', default=0.0, is_type_of=(int, float)),
+            Validator('search_hnsw_ef', default=128, is_type_of=int, gte=0),
+            Validator('query_cache_size', default=1024, is_type_of=int, gte=0),
+            Validator('retriever_host', default='127.0.0.1', is_type_of=str),
+            Validator('retriever_port', default=8765, is_type_of=int, gte=1, lte=65535),
+        ]
+    )
+    
+    if config_file:
+        logger.info(f"已加载配置文件: {config_path}")
+    else:
+        logger.warning(f"未找到配置文件 {config_path}，使用默认配置")
+    
+    return config
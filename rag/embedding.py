@@ -0,0 +1,296 @@
+"""
+Embedding推理辅助函数
+
+CPU上一个批次的耗时由批次内最长的文本决定（其余文本都要填充到同样长度），
+因此先按token长度排序分桶，再按token预算决定每个批次的大小，最后恢复原始顺序。
+"""
+
+import os
+import logging
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 控制PyTorch及其底层数学库线程数的环境变量
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def token_lengths(model: Any, texts: Sequence[str]) -> List[int]:
+    """
+    用模型自带的分词器计算每个文本的token数（按模型最大序列长度截断）
+    
+    Args:
+        model: SentenceTransformer模型
+        texts: 文本列表
+        
+    Returns:
+        与texts一一对应的token数列表
+    """
+    max_length = getattr(model, 'max_seq_length', None) or 512
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        # 没有分词器时按每4个字符约1个token粗略估计
+        return [min(max_length, len(text) // 4 + 2) for text in texts]
+    
+    encoded = tokenizer(
+        list(texts),
+        add_special_tokens=True,
+        truncation=True,
+        max_length=max_length,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return [len(ids) for ids in encoded['input_ids']]
+
+
+def plan_token_batches(lengths: Sequence[int], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    """
+    按长度降序排列文本，并切分为填充后token总数不超过预算的批次
+    
+    Args:
+        lengths: 每个文本的token数
+        token_budget: 每个批次允许的 批次大小 × 最长文本token数 上限
+        max_batch_size: 每个批次的最大文本数
+        
+    Returns:
+        批次列表，每个批次是原始下标的列表
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_max = 0
+    
+    for i in order:
+        padded_length = max(current_max, lengths[i], 1)
+        if current and (padded_length * (len(current) + 1) > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            padded_length = max(lengths[i], 1)
+        current.append(i)
+        current_max = padded_length
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_bucketed(
+    model: Any,
+    texts: Sequence[str],
+    token_budget: int = 8192,
+    max_batch_size: int = 128,
+    normalize_embeddings: bool = True,
+) -> np.ndarray:
+    """
+    按长度分桶、按token预算自适应批次大小地向量化文本，结果保持输入顺序
+    
+    Args:
+        model: SentenceTransformer模型
+        texts: 文本列表
+        token_budget: 每个批次的填充后token总数上限
+        max_batch_size: 每个批次的最大文本数
+        normalize_embeddings: 是否对向量做L2归一化
+        
+    Returns:
+        形状为(len(texts), dim)的float32向量矩阵
+    """
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    
+    lengths = token_lengths(model, texts)
+    batches = plan_token_batches(lengths, token_budget, max_batch_size)
+    
+    result = None
+    for batch in batches:
+        embeddings = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        if result is None:
+            result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        result[batch] = embeddings
+    
+    logger.debug(f"{len(texts)} 个文本分为 {len(batches)} 个批次向量化")
+    return result
+
+
+class EmbeddingPool:
+    """
+    多进程Embedding推理池，每个进程加载一份模型副本
+    
+    基于sentence-transformers的多进程池；文本先按token长度排序再分块分发，
+    使每个子进程拿到的批次长度接近，减少填充，结果按原始顺序返回
+    """
+    
+    def __init__(self, model: Any, workers: int, threads_per_worker: int = 0, batch_size: int = 128):
+        """
+        启动推理池
+        
+        Args:
+            model: SentenceTransformer模型
+            workers: 子进程数量
+            threads_per_worker: 每个子进程的PyTorch线程数，0表示按CPU核数平均分配
+            batch_size: 每个子进程单次推理的文本数，同时作为分发的块大小
+        """
+        self.model = model
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        if threads_per_worker <= 0:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+        
+        # 子进程继承环境变量，避免多个模型副本的线程数相互超订
+        saved = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+        for name in _THREAD_ENV_VARS:
+            os.environ[name] = str(threads_per_worker)
+        try:
+            self._pool = model.start_multi_process_pool(target_devices=['cpu'] * self.workers)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        logger.info(f"已启动 {self.workers} 个Embedding推理进程（每个进程 {threads_per_worker} 个线程）")
+    
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = True) -> np.ndarray:
+        """
+        使用推理池向量化文本，结果保持输入顺序
+        
+        Args:
+            texts: 文本列表
+            normalize_embeddings: 是否对向量做L2归一化
+            
+        Returns:
+            形状为(len(texts), dim)的float32向量矩阵
+        """
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        lengths = token_lengths(self.model, texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        embeddings = self.model.encode(
+            [texts[i] for i in order],
+            pool=self._pool,
+            batch_size=self.batch_size,
+            chunk_size=self.batch_size,
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        result = np.empty_like(embeddings, dtype=np.float32)
+        result[order] = embeddings
+        return result
+    
+    def close(self):
+        """
+        停止所有推理进程
+        """
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+# 可选的Embedding推理后端
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8', 'fastembed')
+
+
+class FastEmbedModel:
+    """
+    把fastembed的TextEmbedding包装成与SentenceTransformer相同的encode接口
+    """
+    
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        """
+        Args:
+            model_name: 模型名称，未带组织名时按sentence-transformers/补全
+            threads: ONNX Runtime的线程数，None表示使用默认值
+        """
+        from fastembed import TextEmbedding
+        
+        if '/' not in model_name:
+            model_name = f"sentence-transformers/{model_name}"
+        self.model_name = model_name
+        self._model = TextEmbedding(model_name=model_name, threads=threads)
+        self._dim = None
+        self.tokenizer = None
+        self.max_seq_length = 512
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dim is None:
+            self._dim = int(next(iter(self._model.embed(['dimension probe']))).shape[0])
+        return self._dim
+    
+    def encode(self, sentences: Sequence[str], batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        embeddings = np.asarray(list(self._model.embed(list(sentences), batch_size=batch_size)), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def _load_quantized_onnx_model(model_name: str, device: str, quantization: str, model_dir: str) -> Any:
+    """
+    加载动态量化为int8的ONNX模型，模型仓库中没有对应量化文件时在本地导出一份
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    try:
+        return SentenceTransformer(model_name, device=device, backend='onnx', model_kwargs={'file_name': file_name})
+    except Exception as e:
+        logger.info(f"模型仓库中没有 {file_name}，将在本地导出量化模型: {e}")
+    
+    local_dir = os.path.join(model_dir, model_name.replace('/', '__') + '-onnx')
+    local_file = os.path.join(local_dir, file_name)
+    if not os.path.exists(local_file):
+        model = SentenceTransformer(model_name, device=device, backend='onnx')
+        model.save(local_dir)
+        export_dynamic_quantized_onnx_model(model, quantization, local_dir)
+        logger.info(f"已导出int8量化模型: {local_file}")
+    return SentenceTransformer(local_dir, device=device, backend='onnx', model_kwargs={'file_name': file_name})
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = 'torch',
+    device: str = 'cpu',
+    quantization: str = 'avx512_vnni',
+    model_dir: str = '.models',
+) -> Any:
+    """
+    按后端加载Embedding模型，返回的对象都提供SentenceTransformer风格的encode接口
+    
+    Args:
+        model_name: 模型名称或本地路径
+        backend: torch（PyTorch全精度）、onnx（ONNX Runtime）、onnx-int8（动态量化int8）或fastembed
+        device: 推理设备
+        quantization: onnx-int8使用的量化配置（avx512_vnni、avx512、avx2或arm64）
+        model_dir: 本地导出模型的保存目录
+        
+    Returns:
+        Embedding模型
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"不支持的Embedding后端: {backend}，可选值: {', '.join(EMBEDDING_BACKENDS)}")
+    
+    if backend == 'fastembed':
+        return FastEmbedModel(model_name)
+    if backend == 'onnx-int8':
+        return _load_quantized_onnx_model(model_name, device, quantization, model_dir)
+    
+    from sentence_transformers import SentenceTransformer
+    
+    if backend == 'onnx':
+        return SentenceTransformer(model_name, device=device, backend='onnx')
+    return SentenceTransformer(model_name, device=device)
+
+
+def cache_model_key(model_name: str, backend: str) -> str:
+    """
+    返回Embedding缓存使用的模型标识，不同后端（尤其是量化模型）的向量不能混用
+    """
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
@@ -0,0 +1,204 @@
+"""
+Embedding后端速度与召回对比报告
+
+以torch后端为基准，对每个候选后端统计：模型加载耗时、向量化吞吐量、
+与基准向量的平均余弦相似度，以及把样本当作查询时的近邻召回率recall@k。
+
+用法:
+    python -m rag.embedding_benchmark 文档目录 --sample 200 --backends torch onnx onnx-int8 fastembed
+"""
+
+import os
+import glob
+import time
+import random
+import argparse
+import logging
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .embedding import EMBEDDING_BACKENDS, load_embedding_model
+
+logger = logging.getLogger(__name__)
+
+
+def load_sample_texts(docs_dir: str, sample_files: int, max_chars: int = 1000, seed: int = 0) -> List[str]:
+    """
+    从文档目录中随机抽取HTML/Markdown文件，按段落拼接为不超过max_chars的文本块
+    
+    Args:
+        docs_dir: 文档目录路径
+        sample_files: 抽取的文件数
+        max_chars: 每个文本块的最大字符数
+        seed: 随机种子
+        
+    Returns:
+        文本块列表
+    """
+    import lxml.html
+    
+    files = sorted(
+        glob.glob(os.path.join(docs_dir, '**', '*.html'), recursive=True)
+        + glob.glob(os.path.join(docs_dir, '**', '*.md'), recursive=True)
+    )
+    random.Random(seed).shuffle(files)
+    
+    texts = []
+    for file_path in files[:sample_files]:
+        if file_path.endswith('.html'):
+            root = lxml.html.parse(file_path).getroot()
+            if root is None:
+                continue
+            for element in root.xpath('//script|//style'):
+                element.drop_tree()
+            content = root.text_content()
+        else:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+        
+        current = ''
+        for line in (line.strip() for line in content.splitlines()):
+            if not line:
+                continue
+            if current and len(current) + len(line) + 1 > max_chars:
+                texts.append(current)
+                current = ''
+            current = f"{current} {line}" if current else line[:max_chars]
+        if current:
+            texts.append(current)
+    return texts
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray, queries: int, k: int) -> float:
+    """
+    以前queries个向量为查询，计算候选向量的top-k近邻与基准top-k近邻的平均重合率
+    """
+    queries = min(queries, len(reference))
+    k = min(k, len(reference) - 1)
+    if queries == 0 or k <= 0:
+        return 1.0
+    
+    def top_k(vectors: np.ndarray) -> np.ndarray:
+        scores = vectors[:queries] @ vectors.T
+        scores[np.arange(queries), np.arange(queries)] = -np.inf
+        return np.argpartition(-scores, k, axis=1)[:, :k]
+    
+    expected, actual = top_k(reference), top_k(candidate)
+    overlaps = [len(set(expected[i]) & set(actual[i])) / k for i in range(queries)]
+    return float(np.mean(overlaps))
+
+
+def benchmark_backends(
+    model_name: str,
+    texts: Sequence[str],
+    backends: Sequence[str],
+    batch_size: int = 32,
+    queries: int = 100,
+    k: int = 10,
+    **load_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    依次加载各后端并向量化同一批文本，返回每个后端的指标
+    
+    Args:
+        model_name: 模型名称
+        texts: 样本文本
+        backends: 要对比的后端，第一个作为基准
+        batch_size: 推理批次大小
+        queries: 计算召回率时使用的查询数
+        k: 召回率的k
+        load_kwargs: 传给load_embedding_model的其他参数
+        
+    Returns:
+        每个后端一行的指标字典列表
+    """
+    rows = []
+    reference = None
+    for backend in backends:
+        start = time.perf_counter()
+        try:
+            model = load_embedding_model(model_name, backend=backend, **load_kwargs)
+        except Exception as e:
+            logger.error(f"加载后端 {backend} 失败: {e}")
+            rows.append({'backend': backend, 'error': str(e)})
+            continue
+        load_seconds = time.perf_counter() - start
+        
+        # 预热一次，避免把首个批次的初始化开销计入吞吐量
+        model.encode(list(texts[:batch_size]), batch_size=batch_size, normalize_embeddings=True)
+        start = time.perf_counter()
+        embeddings = np.asarray(
+            model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False),
+            dtype=np.float32,
+        )
+        encode_seconds = time.perf_counter() - start
+        
+        if reference is None:
+            reference = embeddings
+        row = {
+            'backend': backend,
+            'load_seconds': load_seconds,
+            'texts_per_second': len(texts) / encode_seconds if encode_seconds else float('inf'),
+            'mean_cosine': float(np.mean(np.sum(reference * embeddings, axis=1))),
+            f'recall@{k}': recall_at_k(reference, embeddings, queries, k),
+        }
+        rows.append(row)
+        del model
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]], k: int) -> str:
+    """
+    把指标格式化为文本表格，吞吐量相对第一个后端给出加速比
+    """
+    baseline = next((row['texts_per_second'] for row in rows if 'error' not in row), None)
+    lines = [f"{'后端':<12}{'加载(s)':>10}{'文本/秒':>12}{'加速比':>10}{'平均余弦':>12}{f'recall@{k}':>12}"]
+    for row in rows:
+        if 'error' in row:
+            lines.append(f"{row['backend']:<12}  失败: {row['error']}")
+            continue
+        speedup = row['texts_per_second'] / baseline if baseline else 0.0
+        lines.append(
+            f"{row['backend']:<12}{row['load_seconds']:>10.2f}{row['texts_per_second']:>12.1f}"
+            f"{speedup:>9.2f}x{row['mean_cosine']:>12.4f}{row[f'recall@{k}']:>12.3f}"
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description='Embedding后端速度与召回对比')
+    parser.add_argument('docs_dir', help='用于抽样的文档目录')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Embedding模型名称')
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS,
+                        help='要对比的后端，第一个作为基准')
+    parser.add_argument('--sample', type=int, default=200, help='抽样的文件数')
+    parser.add_argument('--batch-size', type=int, default=32, help='推理批次大小')
+    parser.add_argument('--queries', type=int, default=100, help='计算召回率的查询数')
+    parser.add_argument('-k', type=int, default=10, help='召回率的k')
+    parser.add_argument('--quantization', default='avx512_vnni', help='onnx-int8的量化配置')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    texts = load_sample_texts(args.docs_dir, args.sample)
+    if not texts:
+        logger.error(f"在 {args.docs_dir} 中没有找到可用的样本文本")
+        return 1
+    logger.info(f"样本文本: {len(texts)} 个")
+    
+    rows = benchmark_backends(
+        args.model, texts, args.backends,
+        batch_size=args.batch_size, queries=args.queries, k=args.k,
+        quantization=args.quantization,
+    )
+    print(format_report(rows, args.k))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+持久化Embedding缓存
+
+向量保存在按行寻址的float32内存映射文件中，文本哈希到行号的索引保存在SQLite中。
+缓存按 模型名称 + 是否归一化 + 向量维度 划分命名空间，超过容量时按最近最少使用淘汰。
+"""
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    基于内存映射文件的Embedding缓存
+    """
+    
+    # 内存映射文件每次扩容的最小行数
+    GROW_ROWS = 4096
+    
+    def __init__(self, cache_dir: str, model_name: str, dim: int, normalize: bool = True, max_bytes: int = 1 << 30):
+        """
+        打开（或创建）指定模型的缓存
+        
+        Args:
+            cache_dir: 缓存根目录
+            model_name: Embedding模型名称
+            dim: 向量维度
+            normalize: 向量是否经过L2归一化
+            max_bytes: 向量文件的最大字节数，超过后淘汰最久未使用的条目
+        """
+        self.model_name = model_name
+        self.dim = int(dim)
+        self.normalize = bool(normalize)
+        self.capacity = max(1, int(max_bytes) // (self.dim * 4))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        namespace = hashlib.sha256(f"{model_name}\n{int(self.normalize)}\n{self.dim}".encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, namespace)
+        os.makedirs(self.path, exist_ok=True)
+        
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used INTEGER NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._db.executemany(
+            'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+            [('model_name', model_name), ('normalize', str(self.normalize)), ('dim', str(self.dim))],
+        )
+        self._db.commit()
+        
+        self._vectors_path = os.path.join(self.path, 'vectors.f32')
+        self._shrink()
+        
+        row = self._db.execute('SELECT COUNT(*), COALESCE(MAX(slot) + 1, 0), COALESCE(MAX(last_used), 0) FROM entries').fetchone()
+        self._size, self._next_slot, self._clock = row
+        
+        self._rows = 0
+        self._vectors = None
+        self._open_vectors(max(self._next_slot, 1))
+        logger.info(f"已打开Embedding缓存 {self.path}（{self._size} 条，容量 {self.capacity} 条）")
+    
+    @staticmethod
+    def text_key(text: str) -> str:
+        """
+        计算文本的缓存键
+        """
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _shrink(self):
+        """
+        容量调小后，删除行号超出容量的条目并截断向量文件
+        """
+        evicted = self._db.execute('DELETE FROM entries WHERE slot >= ?', (self.capacity,)).rowcount
+        self._db.commit()
+        if evicted:
+            logger.info(f"Embedding缓存容量已调小为 {self.capacity} 条，删除了 {evicted} 条超出容量的记录")
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > self.capacity * self.dim * 4:
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(self.capacity * self.dim * 4)
+    
+    def _open_vectors(self, min_rows: int):
+        """
+        打开向量文件，行数不足min_rows时扩容
+        """
+        current_rows = os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+        rows = current_rows
+        if rows < min_rows:
+            rows = min(self.capacity, max(min_rows, rows * 2, self.GROW_ROWS))
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            with open(self._vectors_path, 'ab') as f:
+                f.truncate(rows * self.dim * 4)
+        if self._vectors is None or rows != self._rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(rows, self.dim))
+            self._rows = rows
+    
+    def get_many(self, texts: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        批量查询缓存
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            (形状为(len(texts), dim)的向量矩阵, 未命中的文本下标列表)，未命中的行为0
+        """
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        keys = [self.text_key(text) for text in texts]
+        
+        with self._lock:
+            slots = {}
+            unique_keys = list(set(keys))
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i+500]
+                placeholders = ','.join('?' * len(part))
+                slots.update(self._db.execute(
+                    f'SELECT key, slot FROM entries WHERE key IN ({placeholders})', part
+                ).fetchall())
+            
+            missing = []
+            for i, key in enumerate(keys):
+                slot = slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                else:
+                    result[i] = self._vectors[slot]
+            
+            if slots:
+                self._clock += 1
+                self._db.executemany(
+                    'UPDATE entries SET last_used = ? WHERE key = ?',
+                    [(self._clock, key) for key in slots],
+                )
+                self._db.commit()
+            
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return result, missing
+    
+    def _allocate_slots(self, count: int) -> List[int]:
+        """
+        分配count个空闲行，容量不足时淘汰最久未使用的条目
+        """
+        slots = []
+        fresh = min(count, self.capacity - self._next_slot)
+        if fresh > 0:
+            slots.extend(range(self._next_slot, self._next_slot + fresh))
+            self._next_slot += fresh
+            self._open_vectors(self._next_slot)
+        
+        evict = count - len(slots)
+        if evict > 0:
+            victims = self._db.execute(
+                'SELECT key, slot FROM entries ORDER BY last_used LIMIT ?', (evict,)
+            ).fetchall()
+            self._db.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key, _ in victims])
+            slots.extend(slot for _, slot in victims)
+            self._size -= len(victims)
+            logger.debug(f"Embedding缓存淘汰了 {len(victims)} 条记录")
+        return slots
+    
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """
+        批量写入缓存，已存在的文本会被跳过
+        
+        Args:
+            texts: 文本列表
+            vectors: 与texts一一对应的向量矩阵
+        """
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            entries.setdefault(self.text_key(text), vector)
+        # 单次写入超过容量时只保留最后的部分
+        items = list(entries.items())[-self.capacity:]
+        
+        with self._lock:
+            keys = [key for key, _ in items]
+            existing = set()
+            for i in range(0, len(keys), 500):
+                part = keys[i:i+500]
+                placeholders = ','.join('?' * len(part))
+                existing.update(row[0] for row in self._db.execute(
+                    f'SELECT key FROM entries WHERE key IN ({placeholders})', part
+                ))
+            items = [(key, vector) for key, vector in items if key not in existing]
+            if not items:
+                return
+            
+            slots = self._allocate_slots(len(items))
+            self._clock += 1
+            for slot, (_, vector) in zip(slots, items):
+                self._vectors[slot] = vector
+            self._vectors.flush()
+            self._db.executemany(
+                'INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)',
+                [(key, slot, self._clock) for slot, (key, _) in zip(slots, items)],
+            )
+            self._db.commit()
+            self._size += len(items)
+    
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        先查缓存，只对未命中的文本调用encode_fn，并把新结果写回缓存
+        
+        Args:
+            texts: 文本列表
+            encode_fn: 实际的向量化函数，接收文本列表并返回向量矩阵
+            
+        Returns:
+            与texts一一对应的float32向量矩阵
+        """
+        result, missing = self.get_many(texts)
+        if missing:
+            # 同一批中重复的文本只向量化一次
+            positions = {}
+            for i in missing:
+                positions.setdefault(texts[i], []).append(i)
+            missing_texts = list(positions)
+            encoded = np.asarray(encode_fn(missing_texts), dtype=np.float32)
+            for text, vector in zip(missing_texts, encoded):
+                result[positions[text]] = vector
+            self.put_many(missing_texts, encoded)
+        return result
+    
+    def hit_rate(self) -> float:
+        """
+        返回本进程内的缓存命中率
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def close(self):
+        """
+        刷新向量文件并关闭索引
+        """
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            self._db.close()
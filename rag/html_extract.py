@@ -0,0 +1,214 @@
+"""
+HTML文本提取器
+
+- unstructured: 通用的partition_html，适用于任意HTML，但对每个元素做类型推断，速度较慢
+- rustdoc: 针对rustdoc和mdBook生成的页面，只遍历一次正文区域（mdBook的<main>、
+  rustdoc的#main-content），跳过导航栏、侧边栏和脚本；标题输出为"# "形式，
+  <pre>代码块输出为带语言标记的```代码围栏，便于切分时保持代码块完整
+
+提取器按名称在HTML_EXTRACTORS中注册，可以按文件路径的glob规则为不同来源选择不同的提取器。
+"""
+
+import re
+import fnmatch
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 按优先级排列的正文区域，取第一个存在的元素
+_CONTENT_XPATHS = (
+    '//*[@id="main-content"]',
+    '//main',
+    '//*[@id="content"]',
+    '//body',
+)
+
+# 整个子树都不需要的元素
+_SKIP_TAGS = {'script', 'style', 'noscript', 'nav', 'aside', 'button', 'form', 'input', 'select', 'template', 'svg', 'head'}
+_SKIP_CLASSES = {
+    'sidebar', 'sidebar-toggle', 'menu-bar', 'nav-chapters', 'mobile-nav-chapters', 'nav-wrapper',
+    'rustdoc-toolbar', 'search-form', 'anchor', 'doc-anchor', 'src', 'srclink', 'copy-path', 'hideme', 'tooltip',
+}
+_SKIP_IDS = {'sidebar', 'menu-bar', 'searchbar-outer', 'search', 'theme-list', 'copy-path', 'settings'}
+
+# 前后需要断行的块级元素
+_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'header', 'footer', 'details', 'summary',
+    'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'thead', 'tbody', 'tr', 'td', 'th',
+    'blockquote', 'figure', 'figcaption', 'br', 'hr',
+}
+_HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+_LANGUAGE_CLASS = re.compile(r'^(?:language|lang)-([\w+#-]+)$')
+# rustdoc在<pre>上直接使用语言名作为class
+_PRE_LANGUAGES = {'rust', 'text', 'console', 'toml', 'sh', 'bash', 'c', 'cpp', 'json'}
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def _should_skip(element) -> bool:
+    if element.tag in _SKIP_TAGS:
+        return True
+    if element.get('id') in _SKIP_IDS:
+        return True
+    classes = element.get('class')
+    return bool(classes) and not _SKIP_CLASSES.isdisjoint(classes.split())
+
+
+def _code_language(pre) -> str:
+    """
+    从<pre>或其中<code>的class推断代码语言（mdBook为language-xxx，rustdoc为pre.rust）
+    """
+    for element in [pre] + pre.findall('code'):
+        for name in (element.get('class') or '').split():
+            match = _LANGUAGE_CLASS.match(name)
+            if match:
+                return match.group(1)
+            if element is pre and name in _PRE_LANGUAGES:
+                return name
+    return ''
+
+
+def iter_blocks(file_path: str) -> Iterator[Tuple[str, int, str]]:
+    """
+    按文档顺序遍历rustdoc/mdBook页面正文中的块
+
+    Args:
+        file_path: HTML文件路径
+
+    Returns:
+        (类型, 标题级别, 文本) 迭代器：类型为heading、code或text；
+        code块的文本为完整的```代码围栏，标题级别只对heading有效
+    """
+    import lxml.html
+
+    # rustdoc和mdBook的输出都是UTF-8，不依赖页面的charset声明
+    root = lxml.html.parse(file_path, parser=lxml.html.HTMLParser(encoding='utf-8')).getroot()
+    if root is None:
+        return
+
+    content = None
+    for xpath in _CONTENT_XPATHS:
+        found = root.xpath(xpath)
+        if found:
+            content = found[0]
+            break
+    if content is None:
+        content = root
+
+    # 先整体移除不需要的子树，drop_tree会保留元素后面的tail文本
+    for element in [el for el in content.iter() if isinstance(el.tag, str) and _should_skip(el)]:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    buffer: List[str] = []
+
+    def flush() -> Iterator[Tuple[str, int, str]]:
+        text = _normalize(''.join(buffer))
+        buffer.clear()
+        if text:
+            yield 'text', 0, text
+
+    def walk(element) -> Iterator[Tuple[str, int, str]]:
+        tag = element.tag
+        if not isinstance(tag, str):
+            return
+        if tag in _HEADING_TAGS:
+            yield from flush()
+            text = _normalize(element.text_content())
+            if text:
+                yield 'heading', _HEADING_TAGS[tag], text
+            return
+        if tag == 'pre':
+            yield from flush()
+            code = element.text_content().strip('\n')
+            if code.strip():
+                yield 'code', 0, f"```{_code_language(element)}\n{code}\n```"
+            return
+
+        block = tag in _BLOCK_TAGS
+        if block:
+            yield from flush()
+        if element.text:
+            buffer.append(element.text)
+        for child in element:
+            yield from walk(child)
+            if child.tail:
+                buffer.append(child.tail)
+        if block:
+            yield from flush()
+
+    yield from walk(content)
+    yield from flush()
+
+
+def extract_rustdoc_text(file_path: str) -> str:
+    """
+    用lxml提取rustdoc/mdBook页面的正文，标题输出为"# "形式，代码块输出为代码围栏
+
+    Args:
+        file_path: HTML文件路径
+
+    Returns:
+        每个块一行（代码块为多行）的纯文本
+    """
+    lines = []
+    for kind, level, text in iter_blocks(file_path):
+        lines.append(f"{'#' * level} {text}" if kind == 'heading' else text)
+    return '\n'.join(lines)
+
+
+def extract_unstructured_text(file_path: str) -> str:
+    """
+    用unstructured的partition_html提取纯文本，解析失败时直接抛出异常
+    """
+    # unstructured导入较慢，只在真正解析时才导入
+    from unstructured.partition.html import partition_html
+    from unstructured.documents.elements import Text
+
+    elements = partition_html(filename=file_path)
+    text = '\n'.join([element.text for element in elements if isinstance(element, Text)])
+    return '\n'.join([line.strip() for line in text.splitlines() if line.strip()])
+
+
+# 按名称注册的HTML提取器
+HTML_EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    'unstructured': extract_unstructured_text,
+    'rustdoc': extract_rustdoc_text,
+}
+
+
+def select_extractor(file_path: str, default: str, rules: Optional[Sequence[Sequence[str]]] = None) -> str:
+    """
+    按glob规则为文件选择提取器，第一个匹配的规则生效，都不匹配时使用default
+
+    Args:
+        file_path: HTML文件路径
+        default: 默认提取器名称
+        rules: [glob模式, 提取器名称] 列表
+
+    Returns:
+        提取器名称
+    """
+    for pattern, extractor in rules or ():
+        if fnmatch.fnmatch(file_path, pattern):
+            return extractor
+    return default
+
+
+def extract_html_text(file_path: str, default: str = 'unstructured', rules: Optional[Sequence[Sequence[str]]] = None) -> str:
+    """
+    用按规则选中的提取器提取HTML文件的纯文本
+
+    Args:
+        file_path: HTML文件路径
+        default: 默认提取器名称
+        rules: [glob模式, 提取器名称] 列表
+
+    Returns:
+        提取的纯文本
+    """
+    return HTML_EXTRACTORS[select_extractor(file_path, default, rules)](file_path)
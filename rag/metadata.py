@@ -0,0 +1,133 @@
+"""
+文本块的结构化元数据
+
+根据文件路径判断文档类型（book/std/reference/api/other）、所属crate和章节，
+根据文本块内容提取所在小节的标题路径、是否包含代码以及代码语言。
+这些字段写入Qdrant的payload并建立索引，用于过滤检索。
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+# 路径中出现这些目录名时对应的文档类型，按路径从前到后第一个匹配的生效
+_BOOK_DIRS = {'book', 'rust-by-example', 'nomicon', 'edition-guide', 'cargo', 'rustc', 'rustdoc', 'embedded-book'}
+_REFERENCE_DIRS = {'reference'}
+_STD_CRATES = {'std', 'core', 'alloc', 'proc_macro', 'test'}
+
+# rustdoc为每个条目生成的页面文件名前缀
+_RUSTDOC_ITEM = re.compile(
+    r'^(?:struct|enum|trait|fn|macro|type|constant|union|primitive|keyword|attr|derive|static|traitalias)\.'
+)
+_BOOK_CHAPTER = re.compile(r'^(ch\d{2})-\d{2}')
+
+_CODE_FENCE = re.compile(r'```([\w+#-]*)\n.*?```', re.DOTALL)
+_HEADING_LINE = re.compile(r'^(#{1,6}) (.+)$', re.MULTILINE)
+
+# 写入payload的元数据字段
+METADATA_FIELDS = ('doc_kind', 'crate', 'chapter', 'section', 'section_path', 'has_code', 'code_languages')
+
+# 需要建立payload索引的字段及其类型
+PAYLOAD_INDEXES: Dict[str, str] = {
+    'file_path': 'keyword',
+    'doc_kind': 'keyword',
+    'crate': 'keyword',
+    'chapter': 'keyword',
+    'section': 'keyword',
+    'section_path': 'keyword',
+    'has_code': 'bool',
+    'code_languages': 'keyword',
+}
+
+
+def path_metadata(file_path: str) -> Dict[str, Optional[str]]:
+    """
+    根据文件路径判断文档类型、crate和章节
+
+    Args:
+        file_path: 文档文件路径
+
+    Returns:
+        包含doc_kind、crate和chapter的字典，无法判断的字段为None
+    """
+    parts = [part.lower() for part in os.path.normpath(file_path).split(os.sep)]
+    file_name = parts[-1]
+    chapter_match = _BOOK_CHAPTER.match(file_name)
+    chapter = chapter_match.group(1) if chapter_match else None
+
+    for part in parts[:-1]:
+        if part in _BOOK_DIRS:
+            return {'doc_kind': 'book', 'crate': None, 'chapter': chapter}
+        if part in _REFERENCE_DIRS:
+            return {'doc_kind': 'reference', 'crate': None, 'chapter': None}
+        if part in _STD_CRATES:
+            return {'doc_kind': 'std', 'crate': part, 'chapter': None}
+
+    if chapter:
+        return {'doc_kind': 'book', 'crate': None, 'chapter': chapter}
+    if _RUSTDOC_ITEM.match(file_name):
+        # cargo doc的输出布局为 target/doc/<crate>/<module>/<item>.html
+        crate = parts[parts.index('doc') + 1] if 'doc' in parts[:-2] else (parts[-2] if len(parts) > 1 else None)
+        return {'doc_kind': 'api', 'crate': crate, 'chapter': None}
+    return {'doc_kind': 'other', 'crate': None, 'chapter': None}
+
+
+def code_languages(text: str) -> List[str]:
+    """
+    返回文本中代码围栏的语言列表（去重，保持出现顺序），未标注语言的代码块记为text
+    """
+    return list(dict.fromkeys(language or 'text' for language in _CODE_FENCE.findall(text)))
+
+
+def section_paths(chunks: Sequence[str]) -> List[List[str]]:
+    """
+    按顺序扫描文本块中的"# "标题行，返回每个文本块所在小节的标题路径
+
+    文本块以标题开头时取该标题所在的路径，否则取文本块开始时的路径；
+    代码围栏中以#开头的行不视为标题
+
+    Args:
+        chunks: 同一文档按顺序排列的文本块
+
+    Returns:
+        与chunks一一对应的标题路径列表（从大标题到小标题）
+    """
+    stack: List[tuple] = []
+    paths = []
+    for chunk in chunks:
+        prose = _CODE_FENCE.sub('', chunk)
+        path = [title for _, title in stack]
+        for i, match in enumerate(_HEADING_LINE.finditer(prose)):
+            level = len(match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, match.group(2).strip()))
+            if i == 0 and not prose[:match.start()].strip():
+                path = [title for _, title in stack]
+        paths.append(path)
+    return paths
+
+
+def chunk_metadata(file_path: str, chunks: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    计算同一文档每个文本块的payload元数据
+
+    Args:
+        file_path: 文档文件路径
+        chunks: 按顺序排列的文本块
+
+    Returns:
+        与chunks一一对应的元数据字典列表
+    """
+    base = path_metadata(file_path)
+    metadata = []
+    for chunk, path in zip(chunks, section_paths(chunks)):
+        languages = code_languages(chunk)
+        metadata.append({
+            **base,
+            'section': path[-1] if path else None,
+            'section_path': path,
+            'has_code': bool(languages),
+            'code_languages': languages,
+        })
+    return metadata
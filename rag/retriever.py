@@ -0,0 +1,508 @@
+"""
+Rust文档检索器
+
+RustDocsRetriever在进程内保持Embedding模型和Qdrant客户端，查询按批次向量化，
+重复的查询直接使用内存中的LRU向量缓存；支持top-k、payload过滤（doc_kind、crate、
+section、has_code等）和相似度阈值。集合启用混合检索（hybrid_search）时，
+稠密向量和BM25/SPLADE稀疏向量两路检索在Qdrant中按倒数排名融合（RRF）。
+除了作为库使用，还提供命令行和本地HTTP接口，便于智能体团队作为低延迟工具调用。
+
+用法:
+    python -m rag.retriever "how does ownership work" -k 5 --filter doc_kind=book --filter has_code=true
+    python -m rag.retriever --serve            # 启动HTTP服务，GET /search?q=...&k=5&filter=doc_kind:book
+    echo "what is a trait" | python -m rag.retriever   # 从标准输入逐行读取查询
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import load_config
+from .embedding import encode_bucketed, load_embedding_model
+from .sparse import SparseEncoder, to_qdrant_sparse
+
+logger = logging.getLogger(__name__)
+
+
+def parse_filter_value(value: str) -> Any:
+    """
+    把命令行或URL中的过滤值转换为payload值：true/false为布尔值，整数为int，逗号分隔为列表
+    """
+    if ',' in value:
+        return [parse_filter_value(item) for item in value.split(',') if item]
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def build_filter(filters: Optional[Dict[str, Any]]):
+    """
+    把 {字段: 值} 转换为Qdrant过滤条件，列表值表示匹配其中任意一个，多个字段之间为且
+
+    Args:
+        filters: 字段到期望值的映射
+
+    Returns:
+        models.Filter，filters为空时返回None
+    """
+    if not filters:
+        return None
+    from qdrant_client import models
+
+    conditions = []
+    for key, value in filters.items():
+        if isinstance(value, (list, tuple)):
+            match = models.MatchAny(any=list(value))
+        else:
+            match = models.MatchValue(value=value)
+        conditions.append(models.FieldCondition(key=key, match=match))
+    return models.Filter(must=conditions)
+
+
+class RustDocsRetriever:
+    """
+    Rust文档检索器，Qdrant客户端和Embedding模型在首次检索时创建并一直保留
+    """
+
+    def __init__(self, config_path: str = 'config.toml', config: Any = None):
+        """
+        初始化检索器
+
+        Args:
+            config_path: 配置文件路径
+            config: 已加载的配置对象，提供时忽略config_path
+        """
+        self.config = config if config is not None else load_config(config_path)
+        self._client = None
+        self._embedding_model = None
+        self._sparse_encoder: Optional[SparseEncoder] = None
+        self._model_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._query_cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._section_warned = False
+
+    @property
+    def client(self):
+        """
+        Qdrant客户端，首次访问时连接
+        """
+        if self._client is None:
+            from qdrant_client import QdrantClient
+
+            self._client = QdrantClient(url=self.config.qdrant_url, prefer_grpc=bool(self.config.prefer_grpc))
+            logger.info(f"已连接到Qdrant服务器: {self.config.qdrant_url}")
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    @property
+    def embedding_model(self):
+        """
+        Embedding模型，首次访问时加载（需与向量化时使用同一个模型）
+        """
+        with self._model_lock:
+            if self._embedding_model is None:
+                model = load_embedding_model(
+                    self.config.embedding_model,
+                    backend=self.config.embedding_backend,
+                    device="cpu",
+                    quantization=self.config.onnx_quantization,
+                    model_dir=self.config.embedding_model_dir,
+                )
+                dim = model.get_sentence_embedding_dimension()
+                if dim != int(self.config.vector_size):
+                    logger.error(f"模型向量维度 {dim} 与配置的vector_size {self.config.vector_size} 不一致")
+                    raise RuntimeError(f"模型向量维度 {dim} 与配置的vector_size {self.config.vector_size} 不一致")
+                self._embedding_model = model
+                logger.info(f"已加载Embedding模型: {self.config.embedding_model}（后端: {self.config.embedding_backend}）")
+            return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, value):
+        self._embedding_model = value
+
+    @property
+    def sparse_encoder(self) -> SparseEncoder:
+        """
+        稀疏向量编码器，首次混合检索时加载（需与向量化时使用同一个稀疏模型）
+        """
+        with self._model_lock:
+            if self._sparse_encoder is None:
+                self._sparse_encoder = SparseEncoder(self.config.sparse_model)
+                logger.info(f"已加载稀疏向量模型: {self.config.sparse_model}")
+            return self._sparse_encoder
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """
+        向量化一批查询，缓存中没有的查询合并为一次批量推理
+
+        Args:
+            queries: 查询文本列表
+
+        Returns:
+            形状为(len(queries), vector_size)的归一化向量矩阵
+        """
+        cache_size = int(self.config.query_cache_size)
+        vectors: Dict[str, np.ndarray] = {}
+        with self._cache_lock:
+            for query in queries:
+                if query in self._query_cache:
+                    self._query_cache.move_to_end(query)
+                    vectors[query] = self._query_cache[query]
+            misses = list(dict.fromkeys(query for query in queries if query not in vectors))
+            self.cache_hits += len(queries) - len(misses)
+            self.cache_misses += len(misses)
+
+        if misses:
+            model = self.embedding_model
+            with self._model_lock:
+                encoded = encode_bucketed(
+                    model,
+                    misses,
+                    token_budget=int(self.config.embed_token_budget),
+                    max_batch_size=int(self.config.embed_max_batch_size),
+                    normalize_embeddings=True,
+                )
+            with self._cache_lock:
+                for query, vector in zip(misses, encoded):
+                    vectors[query] = vector
+                    if cache_size > 0:
+                        self._query_cache[query] = vector
+                        self._query_cache.move_to_end(query)
+                while len(self._query_cache) > cache_size:
+                    self._query_cache.popitem(last=False)
+
+        return np.stack([vectors[query] for query in queries]).astype(np.float32, copy=False)
+
+    def _search_params(self):
+        """
+        检索参数：HNSW候选数，以及集合启用量化时的重新打分设置
+        """
+        from qdrant_client import models
+
+        quantization = None
+        if self.config.quantization != 'none':
+            quantization = models.QuantizationSearchParams(
+                rescore=bool(self.config.quantization_rescore),
+                oversampling=float(self.config.quantization_oversampling),
+            )
+        hnsw_ef = int(self.config.search_hnsw_ef) or None
+        if hnsw_ef is None and quantization is None:
+            return None
+        return models.SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+
+    def _check_section_metadata(self):
+        """
+        HTML文档只有用rustdoc提取器解析时才会保留标题，section/section_path才有值；
+        没有任何来源使用rustdoc时提示按小节过滤可能匹配不到结果（只提示一次）
+        """
+        if self._section_warned:
+            return
+        self._section_warned = True
+        extractors = {self.config.html_extractor}
+        extractors.update(extractor for _, extractor in self.config.html_extractor_rules)
+        if 'rustdoc' not in extractors:
+            logger.warning(
+                f"按section/section_path过滤，但HTML提取器为 {self.config.html_extractor} 且没有使用rustdoc的"
+                f"html_extractor_rules，HTML文档的小节元数据为空，过滤可能匹配不到结果"
+            )
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        hybrid: Optional[bool] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索：查询一次性向量化，并在一次Qdrant请求中完成全部检索
+
+        混合检索时稠密和稀疏两路各取hybrid_prefetch_limit个候选，按RRF融合后取top_k，
+        结果的score为融合分数；相似度阈值只作用于稠密一路
+
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回的结果数，默认使用search_top_k
+            filters: payload过滤条件，如 {'doc_kind': 'book', 'has_code': True}
+            score_threshold: 相似度阈值，默认使用search_score_threshold（0为不过滤）
+            hybrid: 是否混合检索，默认使用hybrid_search；为False时在混合集合上只检索稠密向量
+
+        Returns:
+            与queries一一对应的结果列表，每个结果包含id、score和payload中的字段
+        """
+        if not queries:
+            return []
+        from qdrant_client import models
+
+        top_k = top_k or int(self.config.search_top_k)
+        if score_threshold is None:
+            score_threshold = float(self.config.search_score_threshold) or None
+        if filters and ('section' in filters or 'section_path' in filters):
+            self._check_section_metadata()
+        query_filter = build_filter(filters)
+        params = self._search_params()
+        named = bool(self.config.hybrid_search)
+        hybrid = named if hybrid is None else hybrid and named
+        dense_name = self.config.dense_vector_name if named else None
+
+        vectors = self.embed_queries(queries)
+        if hybrid:
+            prefetch_limit = max(int(self.config.hybrid_prefetch_limit), top_k)
+            sparse_vectors = self.sparse_encoder.encode_queries(queries)
+            requests = [
+                models.QueryRequest(
+                    prefetch=[
+                        models.Prefetch(
+                            query=vector.tolist(),
+                            using=dense_name,
+                            filter=query_filter,
+                            limit=prefetch_limit,
+                            score_threshold=score_threshold,
+                            params=params,
+                        ),
+                        models.Prefetch(
+                            query=to_qdrant_sparse(sparse_vector),
+                            using=self.config.sparse_vector_name,
+                            filter=query_filter,
+                            limit=prefetch_limit,
+                        ),
+                    ],
+                    query=models.FusionQuery(fusion=models.Fusion.RRF),
+                    limit=top_k,
+                    with_payload=True,
+                )
+                for vector, sparse_vector in zip(vectors, sparse_vectors)
+            ]
+        else:
+            requests = [
+                models.QueryRequest(
+                    query=vector.tolist(),
+                    using=dense_name,
+                    filter=query_filter,
+                    limit=top_k,
+                    score_threshold=score_threshold,
+                    params=params,
+                    with_payload=True,
+                )
+                for vector in vectors
+            ]
+        responses = self.client.query_batch_points(collection_name=self.config.collection_name, requests=requests)
+        return [
+            [{'id': point.id, 'score': point.score, **(point.payload or {})} for point in response.points]
+            for response in responses
+        ]
+
+    def search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        hybrid: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        检索单个查询，参数含义同search_batch
+
+        Returns:
+            结果列表，按相似度降序排列
+        """
+        return self.search_batch(
+            [query], top_k=top_k, filters=filters, score_threshold=score_threshold, hybrid=hybrid
+        )[0]
+
+    def cache_hit_rate(self) -> float:
+        """
+        查询向量缓存的命中率
+        """
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else 0.0
+
+    def close(self):
+        """
+        关闭Qdrant客户端
+        """
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def serve(retriever: RustDocsRetriever, host: str, port: int):
+    """
+    启动本地HTTP检索服务（每个请求一个线程，共用同一个检索器）
+
+    GET  /search?q=查询&q=查询2&k=5&threshold=0.3&filter=doc_kind:book&filter=has_code:true
+    POST /search  {"queries": [...], "top_k": 5, "filters": {...}, "score_threshold": 0.3, "hybrid": false}
+    GET  /health
+
+    Args:
+        retriever: 检索器
+        host: 监听地址
+        port: 监听端口
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: Any):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _search(self, queries, top_k, filters, score_threshold, hybrid=None):
+            if not queries:
+                self._send_json(400, {'error': '缺少查询'})
+                return
+            try:
+                results = retriever.search_batch(
+                    queries, top_k=top_k, filters=filters, score_threshold=score_threshold, hybrid=hybrid
+                )
+            except Exception as e:
+                logger.error(f"检索失败: {e}")
+                self._send_json(500, {'error': str(e)})
+                return
+            self._send_json(200, {'results': results})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                self._send_json(200, {'status': 'ok', 'cache_hit_rate': retriever.cache_hit_rate()})
+                return
+            if url.path != '/search':
+                self._send_json(404, {'error': '未知的路径'})
+                return
+            params = parse_qs(url.query)
+            filters = {}
+            for item in params.get('filter', []):
+                key, _, value = item.partition(':')
+                filters[key] = parse_filter_value(value)
+            try:
+                top_k = int(params['k'][0]) if 'k' in params else None
+                threshold = float(params['threshold'][0]) if 'threshold' in params else None
+            except ValueError as e:
+                self._send_json(400, {'error': f'无效的参数: {e}'})
+                return
+            self._search(params.get('q', []), top_k, filters, threshold)
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/search':
+                self._send_json(404, {'error': '未知的路径'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError as e:
+                self._send_json(400, {'error': f'无效的JSON: {e}'})
+                return
+            if not isinstance(body, dict):
+                self._send_json(400, {'error': '请求体必须是JSON对象'})
+                return
+            queries = body.get('queries') or ([body['query']] if 'query' in body else [])
+            self._search(queries, body.get('top_k'), body.get('filters'), body.get('score_threshold'), body.get('hybrid'))
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logger.info(f"检索服务已启动: http://{host}:{port}/search")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def format_results(query: str, results: List[Dict[str, Any]]) -> str:
+    """
+    把检索结果格式化为便于阅读的文本
+    """
+    lines = [f"查询: {query}"]
+    for rank, hit in enumerate(results, 1):
+        location = hit.get('file_path', '')
+        if hit.get('section'):
+            location += f" § {hit['section']}"
+        text = ' '.join(str(hit.get('text', '')).split())
+        lines.append(f"{rank:>2}. [{hit['score']:.4f}] {location}")
+        lines.append(f"    {text[:200]}{'...' if len(text) > 200 else ''}")
+    return '\n'.join(lines)
+
+
+def main():
+    """
+    命令行入口
+    """
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rust文档检索')
+    parser.add_argument('queries', nargs='*', help='查询文本，未提供且未指定--serve时从标准输入逐行读取')
+    parser.add_argument('-c', '--config', default='config.toml', help='配置文件路径')
+    parser.add_argument('-k', '--top-k', type=int, default=None, help='返回的结果数')
+    parser.add_argument('--filter', action='append', default=[], metavar='字段=值',
+                        help='payload过滤条件，可重复；逗号分隔的值表示匹配任意一个，如 doc_kind=book,std')
+    parser.add_argument('--threshold', type=float, default=None, help='相似度阈值')
+    parser.add_argument('--dense-only', action='store_true', help='混合检索集合上只检索稠密向量（用于对比）')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--serve', action='store_true', help='启动本地HTTP检索服务')
+    parser.add_argument('--host', default=None, help='HTTP服务监听地址')
+    parser.add_argument('--port', type=int, default=None, help='HTTP服务端口')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    filters = {}
+    for item in args.filter:
+        key, sep, value = item.partition('=')
+        if not sep:
+            parser.error(f"过滤条件格式应为 字段=值: {item}")
+        filters[key] = parse_filter_value(value)
+
+    retriever = RustDocsRetriever(args.config)
+    try:
+        if args.serve:
+            serve(retriever, args.host or retriever.config.retriever_host, args.port or retriever.config.retriever_port)
+            return 0
+
+        def run(queries: List[str]):
+            results = retriever.search_batch(
+                queries, top_k=args.top_k, filters=filters, score_threshold=args.threshold,
+                hybrid=False if args.dense_only else None,
+            )
+            for query, hits in zip(queries, results):
+                if args.json:
+                    print(json.dumps({'query': query, 'results': hits}, ensure_ascii=False))
+                else:
+                    print(format_results(query, hits))
+
+        if args.queries:
+            run(args.queries)
+        else:
+            # 逐行读取查询，模型和客户端在多次查询之间保持加载
+            for line in sys.stdin:
+                if line.strip():
+                    run([line.strip()])
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        logger.error(f"检索失败: {e}")
+        return 1
+    finally:
+        retriever.close()
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+语义切分：在相邻句子语义相似度较低的位置切开文本
+
+一个文档的全部句子只调用一次encode批量向量化（要求返回L2归一化的向量），
+相邻句子的余弦相似度用一次逐行点积计算，不在Python循环中逐对计算。
+"""
+
+import re
+import logging
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 技术文档的默认切分阈值，相邻句子相似度低于该值时切开
+DEFAULT_THRESHOLD = 0.45
+
+_HEADING_START = re.compile(r'#{1,6} ')
+
+
+def join_sentences(sentences: Sequence[str]) -> str:
+    """
+    把句子拼接为文本块：句子之间用空格连接，以Markdown标题开头的句子另起一行，
+    保证标题仍位于行首，小节元数据（metadata.section_paths）可以识别
+    """
+    text = ''
+    for sentence in sentences:
+        if text:
+            text += '\n' if _HEADING_START.match(sentence) else ' '
+        text += sentence
+    return text.strip()
+
+
+def adjacent_similarities(embeddings: np.ndarray) -> np.ndarray:
+    """
+    计算相邻两行向量的点积（向量已归一化时即余弦相似度）
+
+    Args:
+        embeddings: 形状为(n, dim)的归一化向量矩阵
+
+    Returns:
+        长度为n-1的相似度数组
+    """
+    if len(embeddings) < 2:
+        return np.zeros(0, dtype=np.float32)
+    return np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
+
+
+def semantic_split_points(embeddings: np.ndarray, threshold: float = DEFAULT_THRESHOLD) -> List[int]:
+    """
+    返回语义切分点，即新文本块第一个句子的下标
+
+    Args:
+        embeddings: 形状为(n, dim)的归一化句子向量矩阵
+        threshold: 相邻句子相似度低于该值时切开
+
+    Returns:
+        升序排列的切分点下标列表
+    """
+    return (np.flatnonzero(adjacent_similarities(embeddings) < threshold) + 1).tolist()
+
+
+class SemanticChunker:
+    """
+    按相邻句子的语义相似度切分文本
+
+    encode_fn接收句子列表，返回形状为(len(texts), dim)的L2归一化向量矩阵，
+    可以直接传入带缓存的向量化函数
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], threshold: float = DEFAULT_THRESHOLD):
+        self.encode_fn = encode_fn
+        self.threshold = threshold
+
+    def split_groups(self, groups: Sequence[Sequence[str]]) -> List[List[str]]:
+        """
+        分别切分多组句子（例如同一文档按标题粗切分后的各个块），所有句子只向量化一次
+
+        只有一个句子的组不参与向量化，原样作为一个文本块返回
+
+        Args:
+            groups: 句子列表的列表
+
+        Returns:
+            与groups一一对应的文本块列表
+        """
+        sentences = [sentence for group in groups if len(group) > 1 for sentence in group]
+        embeddings = self.encode_fn(sentences) if sentences else None
+
+        results = []
+        offset = 0
+        for group in groups:
+            if len(group) <= 1:
+                results.append([join_sentences(group)] if group else [])
+                continue
+
+            points = semantic_split_points(embeddings[offset:offset + len(group)], self.threshold)
+            offset += len(group)
+            chunks = []
+            for start, end in zip([0] + points, points + [len(group)]):
+                chunk = join_sentences(group[start:end])
+                if chunk:
+                    chunks.append(chunk)
+            results.append(chunks)
+        return results
+
+    def split_sentences(self, sentences: Sequence[str]) -> List[str]:
+        """
+        将一组句子按语义切分为文本块
+
+        Args:
+            sentences: 句子列表
+
+        Returns:
+            文本块列表
+        """
+        return self.split_groups([sentences])[0]
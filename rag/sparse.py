@@ -0,0 +1,78 @@
+"""
+稀疏向量（BM25/SPLADE）编码
+
+用fastembed的SparseTextEmbedding为文本块生成稀疏向量，与稠密向量一起作为命名向量
+存入同一个集合，检索时两路结果用倒数排名融合（RRF），提高对标识符（Vec::with_capacity、
+E0382等）的精确匹配能力。
+
+BM25类模型只输出词频权重，IDF由Qdrant在集合上按Modifier.IDF计算。
+"""
+
+import logging
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (indices, values) 形式的稀疏向量
+SparseVector = Tuple[np.ndarray, np.ndarray]
+
+
+def uses_idf(model_name: str) -> bool:
+    """
+    判断稀疏模型是否需要Qdrant计算IDF（BM25/BM42），SPLADE类模型的权重已包含IDF
+    """
+    name = model_name.lower()
+    return 'bm25' in name or 'bm42' in name
+
+
+class SparseEncoder:
+    """
+    fastembed稀疏模型的封装，文档和查询分别编码（BM25的查询向量不含词频权重）
+    """
+
+    def __init__(self, model_name: str = 'Qdrant/bm25', threads: Optional[int] = None):
+        """
+        Args:
+            model_name: fastembed支持的稀疏模型名称，如Qdrant/bm25、prithivida/Splade_PP_en_v1
+            threads: ONNX Runtime的线程数，None表示使用默认值
+        """
+        from fastembed import SparseTextEmbedding
+
+        self.model_name = model_name
+        self._model = SparseTextEmbedding(model_name=model_name, threads=threads)
+        self._lock = threading.Lock()
+
+    def encode(self, texts: Sequence[str], batch_size: int = 256) -> List[SparseVector]:
+        """
+        编码文档文本
+
+        Args:
+            texts: 文本列表
+            batch_size: 每次推理的文本数
+
+        Returns:
+            与texts一一对应的稀疏向量列表
+        """
+        with self._lock:
+            embeddings = self._model.embed(list(texts), batch_size=batch_size)
+            return [(embedding.indices, embedding.values) for embedding in embeddings]
+
+    def encode_queries(self, queries: Sequence[str]) -> List[SparseVector]:
+        """
+        编码查询文本
+        """
+        with self._lock:
+            return [(embedding.indices, embedding.values) for embedding in self._model.query_embed(list(queries))]
+
+
+def to_qdrant_sparse(vector: SparseVector):
+    """
+    转换为Qdrant的SparseVector
+    """
+    from qdrant_client import models
+
+    indices, values = vector
+    return models.SparseVector(indices=np.asarray(indices).tolist(), values=np.asarray(values).tolist())
@@ -0,0 +1,86 @@
+"""
+按Embedding模型自己的分词器统计token数
+
+切分文本时需要在解析子进程中反复统计句子的token数，这里只加载轻量的tokenizers分词器
+（不加载模型权重），每个进程缓存一份分词器，并缓存已统计过的句子，批量编码未命中的句子。
+"""
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 每个进程内的分词器缓存（模型名称 -> 分词器）
+_TOKENIZERS: Dict[str, Any] = {}
+
+# 每个进程内的句子token数缓存，超过上限后整体清空
+_TOKEN_COUNTS: Dict[str, Dict[str, int]] = {}
+_TOKEN_COUNT_CACHE_SIZE = 200_000
+
+
+def tokenizer_name(model_name: str) -> str:
+    """
+    将Embedding模型名称映射为Hugging Face Hub上的分词器仓库名
+
+    sentence-transformers的简写名称（如all-MiniLM-L6-v2）补全为sentence-transformers/前缀，
+    其余名称和本地路径原样返回
+    """
+    if '/' in model_name:
+        return model_name
+    return f'sentence-transformers/{model_name}'
+
+
+def load_tokenizer(model_name: str) -> Any:
+    """
+    加载并缓存模型对应的分词器，关闭截断和填充以便得到真实的token数
+
+    Args:
+        model_name: Embedding模型名称或本地路径
+
+    Returns:
+        tokenizers.Tokenizer对象
+    """
+    tokenizer = _TOKENIZERS.get(model_name)
+    if tokenizer is None:
+        import os
+        from tokenizers import Tokenizer
+
+        local_file = os.path.join(model_name, 'tokenizer.json')
+        if os.path.isfile(local_file):
+            tokenizer = Tokenizer.from_file(local_file)
+        else:
+            tokenizer = Tokenizer.from_pretrained(tokenizer_name(model_name))
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        _TOKENIZERS[model_name] = tokenizer
+        logger.debug(f"已加载分词器: {tokenizer_name(model_name)}")
+    return tokenizer
+
+
+def special_token_count(model_name: str) -> int:
+    """
+    返回模型编码时额外添加的特殊token数（如[CLS]和[SEP]）
+    """
+    return len(load_tokenizer(model_name).encode('', add_special_tokens=True).ids)
+
+
+def count_tokens(model_name: str, texts: Sequence[str]) -> List[int]:
+    """
+    批量统计每个文本的token数（不含特殊token），已统计过的文本直接从缓存读取
+
+    Args:
+        model_name: Embedding模型名称或本地路径
+        texts: 文本列表
+
+    Returns:
+        与texts一一对应的token数列表
+    """
+    cache = _TOKEN_COUNTS.setdefault(model_name, {})
+    if len(cache) > _TOKEN_COUNT_CACHE_SIZE:
+        cache.clear()
+    misses = list(dict.fromkeys(text for text in texts if text not in cache))
+    if misses:
+        encodings = load_tokenizer(model_name).encode_batch(misses, add_special_tokens=False)
+        for text, encoding in zip(misses, encodings):
+            cache[text] = len(encoding.ids)
+    return [cache[text] for text in texts]
@@ -0,0 +1,215 @@
+"""
+Qdrant并发批量写入器
+
+使用有界线程池同时发送多个批次，在途批次数达到上限时submit阻塞，从而向上游施加背压；
+每个批次独立按指数退避重试，全部重试失败后在下一次submit或flush时抛出。
+
+批次以列式PointBatch（ID列表 + float32向量矩阵 + payload列表，启用混合检索时
+还有稀疏向量列表）在管道中传递，不为每个数据点创建PointStruct；向量只在发送前按批次整体转换一次。
+qdrant-client的写入接口（REST和gRPC）都不直接接收ndarray，这次tolist转换无法省去，
+每个浮点数仍会在发送前短暂地成为Python对象，只是限定在在途批次内。
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from qdrant_client import models
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PointBatch:
+    """
+    列式存储的一批数据点
+    """
+    ids: List[Any]
+    vectors: np.ndarray
+    payloads: List[Dict[str, Any]]
+    sparse_vectors: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def slice(self, start: int, stop: int) -> 'PointBatch':
+        """
+        返回[start, stop)范围的子批次，向量矩阵为视图而非拷贝
+        """
+        sparse_vectors = self.sparse_vectors[start:stop] if self.sparse_vectors is not None else None
+        return PointBatch(self.ids[start:stop], self.vectors[start:stop], self.payloads[start:stop], sparse_vectors)
+    
+    def to_qdrant(self, vector_name: Optional[str] = None, sparse_vector_name: Optional[str] = None) -> "models.Batch":
+        """
+        转换为Qdrant的列式Batch结构，整批向量只做一次tolist转换（prefer_grpc时同样需要）
+        
+        Args:
+            vector_name: 稠密向量的名称，为None时写入集合的默认（未命名）向量
+            sparse_vector_name: 稀疏向量的名称，批次中有稀疏向量时必须提供
+        """
+        from qdrant_client import models
+        
+        vectors: Any = self.vectors.tolist()
+        if vector_name is not None:
+            vectors = {vector_name: vectors}
+            if self.sparse_vectors is not None:
+                from .sparse import to_qdrant_sparse
+                
+                vectors[sparse_vector_name] = [to_qdrant_sparse(vector) for vector in self.sparse_vectors]
+        return models.Batch.model_construct(
+            ids=self.ids,
+            vectors=vectors,
+            payloads=self.payloads,
+        )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判断写入异常是否值得重试：4xx（429除外）说明请求本身有问题，重试没有意义
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None and 400 <= int(status_code) < 500 and int(status_code) != 429:
+        return False
+    return True
+
+
+class BatchUploader:
+    """
+    并发、可重试的Qdrant批量写入器
+    """
+    
+    def __init__(
+        self,
+        client: Any,
+        collection_name: str,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        on_batch_done: Optional[Callable[[PointBatch], None]] = None,
+        vector_name: Optional[str] = None,
+        sparse_vector_name: Optional[str] = None,
+    ):
+        """
+        初始化写入器
+        
+        Args:
+            client: Qdrant客户端
+            collection_name: 集合名称
+            max_in_flight: 同时在途的最大批次数
+            max_retries: 每个批次的最大重试次数
+            backoff_base: 第一次重试前的等待秒数，之后每次翻倍
+            backoff_max: 单次等待的最大秒数
+            on_batch_done: 批次写入成功后的回调，参数为该批次，在写入线程中调用
+            vector_name: 集合使用命名向量时稠密向量的名称
+            sparse_vector_name: 稀疏向量的名称
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_batch_done = on_batch_done
+        self.vector_name = vector_name
+        self.sparse_vector_name = sparse_vector_name
+        
+        self.batches = 0
+        self.points = 0
+        self.retries = 0
+        
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='qdrant-upload')
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+    
+    def __enter__(self) -> 'BatchUploader':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.close()
+    
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+    
+    def submit(self, points: PointBatch):
+        """
+        提交一个批次，在途批次已满时阻塞等待
+        
+        Args:
+            points: 数据点批次
+        """
+        self._raise_if_failed()
+        self._slots.acquire()
+        try:
+            self._raise_if_failed()
+            future = self._executor.submit(self._send, points)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+    
+    def _send(self, points: PointBatch):
+        """
+        写入一个批次，失败时按指数退避重试
+        """
+        try:
+            batch = points.to_qdrant(self.vector_name, self.sparse_vector_name)
+            attempt = 0
+            while True:
+                try:
+                    self.client.upsert(collection_name=self.collection_name, points=batch, wait=True)
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        logger.error(f"写入批次失败（已重试 {attempt} 次）: {e}")
+                        with self._lock:
+                            if self._error is None:
+                                self._error = e
+                        return
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                    delay *= 1 + random.random() * 0.1
+                    attempt += 1
+                    with self._lock:
+                        self.retries += 1
+                    logger.warning(f"写入批次失败，{delay:.1f} 秒后第 {attempt} 次重试: {e}")
+                    time.sleep(delay)
+            
+            # 尽早释放转换后的向量列表
+            del batch
+            with self._lock:
+                self.batches += 1
+                self.points += len(points)
+            if self.on_batch_done is not None:
+                self.on_batch_done(points)
+        finally:
+            self._slots.release()
+    
+    def flush(self):
+        """
+        等待所有在途批次完成，有批次最终失败时抛出其异常
+        """
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+        self._raise_if_failed()
+    
+    def close(self):
+        """
+        关闭线程池，等待在途批次结束
+        """
+        self._executor.shutdown(wait=True)
@@ -1,15 +1,40 @@
 from unstructured.partition.md import partition_md
 from unstructured.chunking.title import chunk_by_title
-from sentence_transformers import SentenceTransformer, util
-import numpy as np
 import nltk
 
+from rag.embedding import cache_model_key, load_embedding_model
+from rag.embedding_cache import EmbeddingCache
+from rag.semantic_chunker import SemanticChunker
+
 # --------------------------
 # 初始化工具（强制CPU运行）
 # --------------------------
 nltk.download('punkt')
+# Embedding推理后端：torch / onnx / onnx-int8 / fastembed
+EMBEDDING_BACKEND = "torch"
 # 轻量化模型（80MB，CPU推理极快）
-model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+model = load_embedding_model("all-MiniLM-L6-v2", backend=EMBEDDING_BACKEND, device="cpu")
+# 句子向量缓存（与模型名称、后端、是否归一化绑定），重复运行时跳过已计算过的句子
+embedding_cache = EmbeddingCache(
+    ".embedding_cache",
+    cache_model_key("all-MiniLM-L6-v2", EMBEDDING_BACKEND),
+    model.get_sentence_embedding_dimension(),
+    normalize=True,
+)
+# 语义切分器：整篇文档的句子一次批量向量化（归一化后点积即余弦相似度，技术文档阈值：0.45）
+semantic_chunker = SemanticChunker(
+    lambda sentences: embedding_cache.encode(
+        sentences,
+        lambda texts: model.encode(
+            texts,
+            convert_to_tensor=False,
+            normalize_embeddings=True,
+            batch_size=64,
+            show_progress_bar=False,
+        ),
+    ),
+    threshold=0.45,
+)
 
 # --------------------------
 # 1. 解析Markdown文档（核心：保留代码块完整性）
@@ -40,47 +65,17 @@ structured_chunks = chunk_by_title(
 # --------------------------
 # 3. 语义精切分（仅处理文本，代码块直接保留）
 # --------------------------
-final_chunks = []
+# 规则1：代码块直接保留为独立chunk（不拆分）
+# 规则2：纯文本按语义切分（避免跨语义拆分）
+groups = []
 for chunk in structured_chunks:
     chunk_text = chunk.text.strip()
-    
-    # 规则1：代码块直接保留为独立chunk（不拆分）
     if "```" in chunk_text:
-        final_chunks.append(chunk_text)
-        continue
-    
-    # 规则2：纯文本按语义切分（避免跨语义拆分）
-    sentences = nltk.sent_tokenize(chunk_text)
-    if len(sentences) <= 1:
-        final_chunks.append(chunk_text)
-        continue
-    
-    # 计算句子语义嵌入（CPU优化：禁用Tensor，用Numpy）
-    embeddings = model.encode(
-        sentences,
-        convert_to_tensor=False,
-        batch_size=8,  # CPU最优批量大小（8-16）
-        show_progress_bar=False,
-    )
-    
-    # 计算相邻句子的余弦相似度（技术文档阈值：0.45）
-    similarities = []
-    for i in range(len(embeddings)-1):
-        sim = np.dot(embeddings[i], embeddings[i+1]) / (np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[i+1]))
-        similarities.append(sim)
-    
-    # 确定语义切分点（低于阈值则切分）
-    split_points = [i+1 for i, sim in enumerate(similarities) if sim < 0.45]
-    start = 0
-    for point in split_points:
-        final_chunk = " ".join(sentences[start:point]).strip()
-        if final_chunk:  # 过滤空chunk
-            final_chunks.append(final_chunk)
-        start = point
-    # 处理最后一段
-    final_chunk = " ".join(sentences[start:]).strip()
-    if final_chunk:
-        final_chunks.append(final_chunk)
+        groups.append([chunk_text])
+    else:
+        groups.append(nltk.sent_tokenize(chunk_text))
+
+final_chunks = [piece for pieces in semantic_chunker.split_groups(groups) for piece in pieces]
 
 # --------------------------
 # 输出结果（代码块完整，文本按语义切分）
@@ -89,3 +84,5 @@ for i, chunk in enumerate(final_chunks):
     print(f"=== Chunk {i+1} ===")
     print(chunk)
     print("-" * 100)
+
+embedding_cache.close()
@@ -8,16 +8,32 @@ from math import log
 import os
 import glob
 import re
+import json
+import queue
+import hashlib
+import uuid
 import logging
-from typing import List, Dict, Any, Optional, Callable
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
 from tqdm import tqdm
 
-import nltk
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient, models
-from unstructured.partition.html import partition_html
-from unstructured.documents.elements import Text
-from dynaconf import Dynaconf, Validator
+import numpy as np
+from dynaconf import Dynaconf
+
+from rag.embedding import EmbeddingPool, cache_model_key, encode_bucketed, load_embedding_model
+from rag.embedding_cache import EmbeddingCache
+from rag.html_extract import HTML_EXTRACTORS, extract_html_text
+from rag.metadata import METADATA_FIELDS, PAYLOAD_INDEXES, chunk_metadata
+from rag.chunking import CHUNKING_STRATEGIES, ChunkingStrategy, TokenStrategy, create_chunker
+from rag.config import load_config
+from rag.sparse import SparseEncoder, uses_idf
+from rag.tokenization import count_tokens
+from rag.uploader import BatchUploader, PointBatch
 
 # 配置日志
 logging.basicConfig(
@@ -31,6 +47,294 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 流式管道中表示上游阶段已结束的哨兵对象
+_STAGE_DONE = object()
+
+
+def _put_until_stopped(q: queue.Queue, item: Any, stop_event: threading.Event) -> bool:
+    """
+    向有界队列放入元素，队列满时阻塞等待，管道被中止时返回False
+    """
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get_until_stopped(q: queue.Queue, stop_event: threading.Event) -> Any:
+    """
+    从队列取出元素，管道被中止时返回结束哨兵
+    """
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _STAGE_DONE
+
+
+# 数据点ID的UUIDv5命名空间，修改后所有数据点ID都会变化
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'https://github.com/freebsdly/autogen_agents/rust-docs')
+
+
+def normalize_path(file_path: str) -> str:
+    """
+    把文件路径统一为相对当前目录的规范形式，./docs、docs和绝对路径得到相同结果
+
+    清单的键和数据点ID都基于该形式，否则换一种写法指定文档目录会把所有文件当作新文件重复写入
+    """
+    return os.path.relpath(os.path.abspath(file_path))
+
+
+def make_point_id(file_path: str, chunk_index: int, content_hash: str) -> str:
+    """
+    根据文件路径、块序号和块内容哈希生成确定性的数据点ID
+    
+    相同输入总是得到相同ID，因此重复写入是幂等的，不同文件之间也不会冲突
+    
+    Args:
+        file_path: 文本块所属文件路径，按normalize_path规范化后参与计算
+        chunk_index: 文本块在文件中的序号
+        content_hash: 文本块内容的SHA-256摘要
+        
+    Returns:
+        UUID字符串
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{normalize_path(file_path)}\n{chunk_index}\n{content_hash}"))
+
+
+def _text_sha256(text: str) -> str:
+    """
+    计算文本的SHA-256摘要
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _file_sha256(file_path: str) -> str:
+    """
+    计算文件内容的SHA-256摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """
+    增量索引清单，记录每个已入库文件的内容哈希及其对应的数据点ID，文件路径按normalize_path规范化
+    """
+    
+    VERSION = 2
+    
+    def __init__(self, path: str, collection_name: str):
+        """
+        初始化清单，文件存在且属于同一集合时加载已有记录
+        
+        Args:
+            path: 清单文件路径
+            collection_name: 清单对应的Qdrant集合名称
+        """
+        self.path = path
+        self.collection_name = collection_name
+        self.files: Dict[str, Dict[str, Any]] = {}
+        
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('collection') != collection_name:
+                logger.warning(f"清单 {path} 属于集合 {data.get('collection')}，忽略已有记录")
+            else:
+                self.files = {normalize_path(path): entry for path, entry in data.get('files', {}).items()}
+                logger.info(f"已加载增量索引清单: {path}（{len(self.files)} 个文件）")
+    
+    def is_unchanged(self, file_path: str, content_hash: str) -> bool:
+        """
+        判断文件自上次入库后内容是否未变
+        """
+        entry = self.files.get(normalize_path(file_path))
+        return entry is not None and entry.get('hash') == content_hash
+    
+    def point_ids(self, file_path: str) -> List[Any]:
+        """
+        返回文件上次入库时写入的数据点ID
+        """
+        entry = self.files.get(normalize_path(file_path))
+        return list(entry.get('point_ids', [])) if entry else []
+    
+    def update(self, file_path: str, content_hash: str, point_ids: List[Any]):
+        """
+        记录文件的最新哈希及数据点ID
+        """
+        self.files[normalize_path(file_path)] = {'hash': content_hash, 'point_ids': point_ids}
+    
+    def remove(self, file_path: str):
+        """
+        删除文件的记录
+        """
+        self.files.pop(normalize_path(file_path), None)
+    
+    def save(self):
+        """
+        原子地写回清单文件
+        """
+        data = {
+            'version': self.VERSION,
+            'collection': self.collection_name,
+            'files': self.files,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class IngestProgress:
+    """
+    跟踪每个文件的写入进度，文件的全部数据点写入成功后才登记到增量索引清单
+    """
+    
+    def __init__(self, manifest: IndexManifest, hashes: Dict[str, str]):
+        """
+        Args:
+            manifest: 增量索引清单
+            hashes: 待处理文件到内容哈希的映射
+        """
+        self.manifest = manifest
+        self.hashes = hashes
+        self.stored = 0
+        self.deleted = 0
+        self.on_stored: Optional[Callable[[int], Any]] = None
+        self._expected: Dict[str, int] = {}
+        self._stored_ids: Dict[str, List[Any]] = {}
+        self._completed: List[str] = []
+        self._lock = threading.Lock()
+    
+    def _check_complete(self, file_path: str):
+        expected = self._expected.get(file_path)
+        if expected is not None and len(self._stored_ids.get(file_path, [])) >= expected:
+            del self._expected[file_path]
+            self._completed.append(file_path)
+    
+    def file_parsed(self, result: 'ParseResult'):
+        """
+        记录文件解析后应写入的数据点数量
+        """
+        with self._lock:
+            self._expected[result.file_path] = len(result.documents)
+            self._check_complete(result.file_path)
+    
+    def points_stored(self, points: PointBatch):
+        """
+        记录写入成功的数据点（写入线程回调）
+        """
+        with self._lock:
+            for point_id, payload in zip(points.ids, points.payloads):
+                file_path = payload['file_path']
+                self._stored_ids.setdefault(file_path, []).append(point_id)
+                self._check_complete(file_path)
+            self.stored += len(points)
+        if self.on_stored is not None:
+            self.on_stored(len(points))
+    
+    def flush(self, delete_points: Callable[[List[Any]], None]):
+        """
+        删除已完成文件的过期数据点，并把这些文件登记到清单后保存
+        
+        先删除再保存：即使两步之间中断，清单仍保留旧记录，下次运行会重新处理该文件
+        
+        Args:
+            delete_points: 按ID删除数据点的函数
+        """
+        with self._lock:
+            completed, self._completed = self._completed, []
+            new_ids = {file_path: self._stored_ids.pop(file_path, []) for file_path in completed}
+        if not completed:
+            return
+        
+        stale_ids = []
+        for file_path in completed:
+            # 内容未变的文本块ID不变，已被重新写入，不能删除
+            current = set(new_ids[file_path])
+            stale_ids.extend(pid for pid in self.manifest.point_ids(file_path) if pid not in current)
+        if stale_ids:
+            delete_points(stale_ids)
+            self.deleted += len(stale_ids)
+        
+        for file_path in completed:
+            self.manifest.update(file_path, self.hashes[file_path], new_ids[file_path])
+        self.manifest.save()
+
+
+@dataclass
+class ParseResult:
+    """
+    单个HTML文件的解析结果
+    """
+    file_path: str
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    text_length: int = 0
+    error: Optional[str] = None
+
+
+def _parse_html_file(
+    file_path: str,
+    chunker: ChunkingStrategy,
+    min_chunk_size: int,
+    extractor: str = 'unstructured',
+    extractor_rules: Optional[List[List[str]]] = None,
+) -> ParseResult:
+    """
+    解析单个HTML文件并切分为文本块（进程池的工作函数）
+    
+    Args:
+        file_path: HTML文件路径
+        chunker: 切分策略
+        min_chunk_size: 过滤掉过短的文本块
+        extractor: 默认的HTML提取器名称
+        extractor_rules: [glob模式, 提取器名称] 列表，按文件路径选择提取器
+        
+    Returns:
+        解析结果，异常信息记录在error字段中而不是向上抛出
+    """
+    result = ParseResult(file_path=file_path)
+    try:
+        text = extract_html_text(file_path, extractor, extractor_rules)
+        result.text_length = len(text)
+        if not text:
+            return result
+        
+        chunks = chunker.split(text)
+        result.documents = _make_documents(file_path, chunks, min_chunk_size)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _make_documents(file_path: str, chunks: List[str], min_chunk_size: int) -> List[Dict[str, Any]]:
+    """
+    将文本块组装为文档字典（附带文档类型、小节路径、代码语言等元数据），过滤掉过短的文本块
+    """
+    # 小节路径依赖前面文本块中的标题，因此在过滤之前对全部文本块计算
+    metadata = chunk_metadata(file_path, chunks)
+    return [
+        {
+            'file_path': file_path,
+            'chunk_index': i,
+            'total_chunks': len(chunks),
+            'text': chunk,
+            'content_hash': _text_sha256(chunk),
+            **metadata[i]
+        }
+        for i, chunk in enumerate(chunks)
+        if len(chunk) > min_chunk_size
+    ]
+
+
 class RustDocsVectorizer:
     """
     Rust文档向量化器，负责解析HTML文档、切分文本并向量化存储
@@ -44,9 +348,18 @@ class RustDocsVectorizer:
             config_path: 配置文件路径
         """
         self.config = self._load_config(config_path)
-        self.client = None
-        self.model = None
-        self._initialize_tools()
+        self.parse_errors: Dict[str, str] = {}
+        self.skipped_files = 0
+        self.embedding_pool: Optional[EmbeddingPool] = None
+        # 以下组件都在首次使用时才初始化，列出文件、演练等操作不需要加载模型或连接Qdrant
+        self._client = None
+        self._embedding_model = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._embedding_cache_opened = False
+        self._sparse_encoder: Optional[SparseEncoder] = None
+        self._nltk_ready = False
+        # 解析线程（语义切分）和向量化线程共用模型，推理需要串行
+        self._encode_lock = threading.Lock()
         
     def _load_config(self, config_path: str) -> Dynaconf:
         """
@@ -58,84 +371,156 @@ class RustDocsVectorizer:
         Returns:
             配置对象
         """
-        # 检查配置文件是否存在
-        config_file = config_path if os.path.exists(config_path) else None
-        
-        # 创建Dynaconf配置对象
-        config = Dynaconf(
-            settings_files=[config_file] if config_file else None,
-            # 默认配置
-            default_settings={
-                'qdrant_url': 'http://localhost:6333',
-                'embedding_model': 'all-MiniLM-L6-v2',
-                'collection_name': 'rust_docs_embeddings',
-                'vector_size': 384,  # all-MiniLM-L6-v2的向量维度
-                'max_chunk_length': 1024,
-                'chunk_overlap': 100,
-                'min_chunk_size': 50,
-                'batch_size': 100
-            },
-            # 验证配置
-            validators=[
-                Validator('qdrant_url', must_exist=True, is_type_of=str),
-                Validator('embedding_model', must_exist=True, is_type_of=str),
-                Validator('collection_name', must_exist=True, is_type_of=str),
-                Validator('vector_size', must_exist=True, is_type_of=int),
-                Validator('max_chunk_length', must_exist=True, is_type_of=int),
-                Validator('chunk_overlap', must_exist=True, is_type_of=int),
-                Validator('min_chunk_size', must_exist=True, is_type_of=int),
-                Validator('batch_size', must_exist=True, is_type_of=int),
-            ]
-        )
-        
-        if config_file:
-            logger.info(f"已加载配置文件: {config_path}")
-        else:
-            logger.warning(f"未找到配置文件 {config_path}，使用默认配置")
-        
-        return config
+        return load_config(config_path)
     
-    def _initialize_tools(self):
+    def _ensure_nltk(self):
         """
-        初始化工具组件（NLTK、Qdrant客户端、Embedding模型）
+        确保NLTK punkt模块已下载（首次切分文本前调用）
         """
-        # 初始化NLTK
+        if self._nltk_ready:
+            return
+        import nltk
+        
         try:
             nltk.download('punkt', quiet=True)
             logger.info("NLTK punkt模块已下载")
         except Exception as e:
             logger.error(f"NLTK初始化失败: {e}")
             raise
+        self._nltk_ready = True
+    
+    @property
+    def client(self):
+        """
+        Qdrant客户端，首次访问时才连接服务器
+        """
+        if self._client is None:
+            self._client = self._connect_qdrant()
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
+    def _connect_qdrant(self):
+        """
+        创建Qdrant客户端并验证服务器连接
+        """
+        from qdrant_client import QdrantClient
         
-        # 初始化Qdrant客户端
         try:
-            self.client = QdrantClient(url=self.config.qdrant_url)
+            client = QdrantClient(url=self.config.qdrant_url, prefer_grpc=bool(self.config.prefer_grpc))
             
             # 验证Qdrant服务器连接
             try:
-                self.client.get_collections()
+                client.get_collections()
                 logger.info(f"已连接到Qdrant服务器: {self.config.qdrant_url}")
             except Exception as ping_error:
                 logger.error(f"Qdrant服务器连接验证失败: {ping_error}")
-                self.client = None
                 raise RuntimeError(f"无法连接到Qdrant服务器: {ping_error}")
                 
         except Exception as e:
             logger.error(f"Qdrant客户端初始化失败: {e}")
-            self.client = None
             raise
-        
-        # 初始化Embedding模型
+        return client
+    
+    @property
+    def embedding_model(self):
+        """
+        Embedding模型，首次需要向量化时才加载
+        """
+        if self._embedding_model is None:
+            self._embedding_model = self._load_embedding_model()
+        return self._embedding_model
+    
+    @embedding_model.setter
+    def embedding_model(self, value):
+        self._embedding_model = value
+    
+    def _load_embedding_model(self):
+        """
+        加载Embedding模型，并按配置启动多进程推理池
+        """
         try:
-            self.embedding_model = SentenceTransformer(
-                self.config.embedding_model, 
-                device="cpu"
+            model = load_embedding_model(
+                self.config.embedding_model,
+                backend=self.config.embedding_backend,
+                device="cpu",
+                quantization=self.config.onnx_quantization,
+                model_dir=self.config.embedding_model_dir,
             )
-            logger.info(f"已加载Embedding模型: {self.config.embedding_model}")
+            logger.info(f"已加载Embedding模型: {self.config.embedding_model}（后端: {self.config.embedding_backend}）")
         except Exception as e:
             logger.error(f"Embedding模型加载失败: {e}")
-            self.embedding_model = None
             raise
+        
+        # Embedding缓存和Qdrant集合都按配置的vector_size建立，模型维度必须一致
+        dim = model.get_sentence_embedding_dimension()
+        if dim != int(self.config.vector_size):
+            logger.error(f"模型向量维度 {dim} 与配置的vector_size {self.config.vector_size} 不一致")
+            raise RuntimeError(f"模型向量维度 {dim} 与配置的vector_size {self.config.vector_size} 不一致")
+        
+        # 初始化多进程Embedding推理池（embed_workers为1时在当前进程推理）
+        embed_workers = int(self.config.embed_workers)
+        if embed_workers <= 0:
+            embed_workers = os.cpu_count() or 1
+        if embed_workers > 1 and self.config.embedding_backend == 'fastembed':
+            logger.warning("fastembed后端不支持多进程推理池，将在当前进程推理")
+        elif embed_workers > 1:
+            self.embedding_pool = EmbeddingPool(
+                model,
+                embed_workers,
+                threads_per_worker=int(self.config.embed_threads_per_worker),
+                batch_size=int(self.config.embed_max_batch_size),
+            )
+        return model
+    
+    @property
+    def sparse_encoder(self) -> Optional[SparseEncoder]:
+        """
+        稀疏向量编码器，只在启用混合检索（hybrid_search）时首次使用时加载，否则为None
+        """
+        if self._sparse_encoder is None and self.config.hybrid_search:
+            try:
+                self._sparse_encoder = SparseEncoder(self.config.sparse_model)
+                logger.info(f"已加载稀疏向量模型: {self.config.sparse_model}")
+            except Exception as e:
+                logger.error(f"稀疏向量模型加载失败: {e}")
+                raise
+        return self._sparse_encoder
+    
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        """
+        Embedding缓存，首次访问时打开；embedding_cache_dir为空或打开失败时为None
+        
+        向量维度取自配置的vector_size，因此全部命中缓存时不需要加载模型
+        """
+        if not self._embedding_cache_opened:
+            self._embedding_cache_opened = True
+            if self.config.embedding_cache_dir:
+                try:
+                    self._embedding_cache = EmbeddingCache(
+                        self.config.embedding_cache_dir,
+                        cache_model_key(self.config.embedding_model, self.config.embedding_backend),
+                        int(self.config.vector_size),
+                        normalize=True,
+                        max_bytes=int(self.config.embedding_cache_max_mb) * 1024 * 1024,
+                    )
+                except Exception as e:
+                    logger.warning(f"Embedding缓存初始化失败，将不使用缓存: {e}")
+        return self._embedding_cache
+    
+    def close(self):
+        """
+        释放推理进程池和Embedding缓存
+        """
+        if self.embedding_pool is not None:
+            self.embedding_pool.close()
+            self.embedding_pool = None
+        if self._embedding_cache is not None:
+            self._embedding_cache.close()
+            self._embedding_cache = None
     
     def extract_text_from_html(self, file_path: str) -> str:
         """
@@ -148,96 +533,80 @@ class RustDocsVectorizer:
             提取的纯文本
         """
         try:
-            elements = partition_html(filename=file_path)
-            text = '\n'.join([element.text for element in elements if isinstance(element, Text)])
-            text = '\n'.join([line.strip() for line in text.splitlines() if line.strip()])
+            text = extract_html_text(file_path, self.config.html_extractor, self._extractor_rules())
             logger.debug(f"从文件 {file_path} 提取了 {len(text)} 个字符")
             return text
         except Exception as e:
             logger.error(f"解析HTML文件 {file_path} 时出错: {e}")
             return ""
     
+    def _extractor_rules(self) -> List[List[str]]:
+        """
+        返回按文件路径选择HTML提取器的规则，并检查提取器名称
+        """
+        rules = [list(rule) for rule in self.config.html_extractor_rules]
+        for rule in rules:
+            if len(rule) != 2 or rule[1] not in HTML_EXTRACTORS:
+                logger.error(f"无效的HTML提取器规则: {rule}")
+                raise RuntimeError(f"无效的HTML提取器规则: {rule}，格式为[glob模式, 提取器名称]，可选提取器: {', '.join(HTML_EXTRACTORS)}")
+        return rules
+    
+    def create_chunker(self, strategy: Optional[str] = None) -> ChunkingStrategy:
+        """
+        按名称创建切分策略
+        
+        Args:
+            strategy: 策略名称，为None时使用配置的chunk_strategy
+            
+        Returns:
+            切分策略对象
+        """
+        return create_chunker(strategy or self.config.chunk_strategy, self.config)
+    
     def split_text(self, text: str, max_length: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
         """
-        将长文本切分为多个重叠的文本块，保留代码块
+        按配置的切分策略将长文本切分为多个重叠的文本块，保留代码块
         
         Args:
             text: 原始文本
-            max_length: 每个文本块的最大长度
-            overlap: 相邻文本块的重叠长度
+            max_length: 每个文本块的最大长度（token策略下以token计）
+            overlap: 相邻文本块的重叠长度（token策略下以token计）
             
         Returns:
             切分后的文本块列表
         """
-        if max_length is None:
-            max_length = int(self.config.max_chunk_length)
-        
-        if overlap is None:
-            overlap = int(self.config.chunk_overlap)
-        
-        if len(text) <= max_length:
-            return [text]
+        chunker = self.create_chunker()
+        if max_length is not None:
+            chunker.max_length = max_length
         
-        # 1. 识别并提取代码块
-        code_blocks = []
-        code_pattern = re.compile(r'```(?:rust)?(.*?)```', re.DOTALL)
+        if overlap is not None:
+            chunker.overlap = overlap
         
-        def replace_code(match):
-            code_blocks.append(match.group(0))
-            return f'__CODE_BLOCK_{len(code_blocks)-1}__'
-        
-        text_with_placeholders = code_pattern.sub(replace_code, text)
-        
-        # 2. 使用nltk按语义切分句子
-        sentences = nltk.sent_tokenize(text_with_placeholders)
-        
-        # 3. 将句子组合成符合长度要求的文本块
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length + 1 <= max_length:
-                current_chunk.append(sentence)
-                current_length += sentence_length + 1
-            else:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                
-                # 开始新块，考虑重叠
-                current_chunk = [sentence]
-                current_length = sentence_length + 1
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        # 4. 将占位符替换回原始代码块
-        final_chunks = []
-        for chunk in chunks:
-            for i, code_block in enumerate(code_blocks):
-                chunk = chunk.replace(f'__CODE_BLOCK_{i}__', code_block)
-            final_chunks.append(chunk)
-        
-        return final_chunks
+        self._ensure_nltk()
+        chunks = chunker.split(text)
+        if chunker.needs_encoder:
+            chunks = chunker.refine(chunks, self._embed_texts)
+        return chunks
     
-    def process_html_files(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None) -> List[Dict[str, Any]]:
+    def find_html_files(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None) -> List[str]:
         """
-        处理指定目录下的所有HTML文件
+        查找指定目录下的所有HTML文件
         
         Args:
             docs_dir: 文档目录路径
             file_filter: 可选的自定义文件过滤函数，接收文件路径并返回布尔值，返回True的文件将被保留
             
         Returns:
-            处理后的文档块列表
+            排序后的HTML文件路径列表（已按normalize_path规范化）
         """
         if not os.path.exists(docs_dir):
             logger.error(f"文档目录不存在: {docs_dir}")
             return []
         
-        html_files = glob.glob(os.path.join(docs_dir, '**', '*.html'), recursive=True)
+        html_files = sorted(
+            normalize_path(file_path)
+            for file_path in glob.glob(os.path.join(docs_dir, '**', '*.html'), recursive=True)
+        )
         
         # 应用文件过滤器
         if file_filter:
@@ -252,62 +621,378 @@ class RustDocsVectorizer:
         else:
             logger.info(f"找到 {len(html_files)} 个HTML文件")
         
-        documents = []
-        min_chunk_size = int(self.config.min_chunk_size)
-        
-        for file_path in tqdm(html_files, desc="处理HTML文件"):
-            try:
-                text = self.extract_text_from_html(file_path)
-                if text:
-                    chunks = self.split_text(text)
-                    
-                    for i, chunk in enumerate(chunks):
-                        if len(chunk) > min_chunk_size:
-                            documents.append({
-                                'file_path': file_path,
-                                'chunk_index': i,
-                                'total_chunks': len(chunks),
-                                'text': chunk
-                            })
-                    
-                    logger.debug(f"已处理: {file_path} (切分为 {len(chunks)} 个块)")
-                else:
-                    logger.warning(f"文件内容为空: {file_path}")
-            except Exception as e:
-                logger.error(f"处理文件时出错 {file_path}: {e}")
+        return html_files
+    
+    def process_html_files(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None) -> List[Dict[str, Any]]:
+        """
+        处理指定目录下的所有HTML文件
         
+        Args:
+            docs_dir: 文档目录路径
+            file_filter: 可选的自定义文件过滤函数，接收文件路径并返回布尔值，返回True的文件将被保留
+            
+        Returns:
+            处理后的文档块列表
+        """
+        html_files = self.find_html_files(docs_dir, file_filter)
+        documents = list(self.iter_documents(html_files))
         logger.info(f"共处理 {len(documents)} 个文本块")
         return documents
     
-    def create_collection(self):
+    def iter_documents(self, html_files: List[str], on_parsed: Optional[Callable[[ParseResult], None]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个解析HTML文件并按顺序产出文本块，不在内存中保留全部文档
+        
+        Args:
+            html_files: HTML文件路径列表
+            on_parsed: 可选回调，在产出某个解析成功文件的文本块之前调用
+            
+        Returns:
+            文本块字典迭代器
+        """
+        self.parse_errors = {}
+        chunker = self.create_chunker()
+        
+        for result in tqdm(self.iter_parse_results(html_files, chunker), total=len(html_files), desc="处理HTML文件"):
+            if result.error:
+                self.parse_errors[result.file_path] = result.error
+                logger.error(f"处理文件时出错 {result.file_path}: {result.error}")
+                continue
+            
+            # 需要模型的切分步骤（如语义切分）在主进程中完成
+            if chunker.needs_encoder and result.documents:
+                chunks = chunker.refine([doc['text'] for doc in result.documents], self._embed_texts)
+                result.documents = _make_documents(result.file_path, chunks, int(self.config.min_chunk_size))
+            
+            if on_parsed is not None:
+                on_parsed(result)
+            if result.text_length == 0:
+                logger.warning(f"文件内容为空: {result.file_path}")
+            else:
+                logger.debug(f"已处理: {result.file_path} (保留 {len(result.documents)} 个块)")
+                yield from result.documents
+        
+        if self.parse_errors:
+            logger.warning(f"共有 {len(self.parse_errors)} 个文件解析失败")
+    
+    def iter_parse_results(self, html_files: List[str], chunker: Optional[ChunkingStrategy] = None) -> Iterator[ParseResult]:
+        """
+        解析HTML文件并按输入顺序逐个返回结果
+        
+        parse_workers大于1时使用进程池并行解析，结果顺序与html_files保持一致
+        
+        Args:
+            html_files: HTML文件路径列表
+            chunker: 切分策略，为None时使用配置的chunk_strategy
+            
+        Returns:
+            解析结果迭代器
+        """
+        self._ensure_nltk()
+        parse_file = partial(
+            _parse_html_file,
+            chunker=chunker or self.create_chunker(),
+            min_chunk_size=int(self.config.min_chunk_size),
+            extractor=self.config.html_extractor,
+            extractor_rules=self._extractor_rules(),
+        )
+        
+        workers = int(self.config.parse_workers)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(html_files))
+        
+        if workers <= 1:
+            for file_path in html_files:
+                yield parse_file(file_path)
+            return
+        
+        logger.info(f"使用 {workers} 个进程并行解析HTML文件")
+        # 主进程此时已有写入线程池和日志线程，fork可能继承被持有的锁而死锁，改用spawn启动子进程
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            yield from executor.map(parse_file, html_files, chunksize=int(self.config.parse_chunksize))
+        finally:
+            # 下游提前退出时取消尚未开始的解析任务
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def truncation_report(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None) -> Dict[str, Dict[str, Any]]:
         """
-        创建Qdrant集合（如果不存在）
+        统计各切分策略下超过模型最大序列长度而被截断的文本块
+        
+        只解析和分词，不加载模型也不连接Qdrant，因此跳过需要模型的策略
+        
+        Args:
+            docs_dir: 文档目录路径
+            file_filter: 可选的自定义文件过滤函数
+            
+        Returns:
+            策略名称到统计结果（文本块数、被截断的块数、被丢弃的token数、平均token数）的映射
         """
-        # 检查Qdrant客户端是否已初始化
-        if self.client is None:
-            logger.error("Qdrant客户端未初始化")
-            raise RuntimeError("Qdrant客户端未初始化，请检查Qdrant服务器连接")
+        html_files = self.find_html_files(docs_dir, file_filter)
+        token_model = self.config.embedding_model
+        max_tokens = TokenStrategy.from_config(self.config).token_budget()
+        
+        report = {}
+        for name, strategy in CHUNKING_STRATEGIES.items():
+            if strategy.needs_encoder:
+                continue
+            texts = [
+                doc['text']
+                for result in self.iter_parse_results(html_files, strategy.from_config(self.config))
+                for doc in result.documents
+            ]
+            counts = count_tokens(token_model, texts)
+            report[name] = {
+                'chunks': len(counts),
+                'truncated': sum(1 for count in counts if count > max_tokens),
+                'dropped_tokens': sum(max(0, count - max_tokens) for count in counts),
+                'mean_tokens': sum(counts) / len(counts) if counts else 0.0,
+            }
+        return report
+    
+    def create_collection(self, bulk_load: bool = False) -> bool:
+        """
+        创建Qdrant集合（如果不存在），并为元数据字段建立payload索引
+        
+        新建集合时使用配置中的集合参数：HNSW的m和ef_construct、int8标量量化、
+        向量和payload是否存放在磁盘上；已存在的集合保持原有参数不变。
+        启用混合检索时稠密向量和稀疏向量分别以dense_vector_name、sparse_vector_name
+        作为命名向量存入同一个集合
+        
+        Args:
+            bulk_load: 新建集合时是否先关闭HNSW索引（m=0），写入完成后需调用_rebuild_index
+            
+        Returns:
+            是否新建了集合
+        """
+        from qdrant_client import models
         
         collection_name = self.config.collection_name
         vector_size = int(self.config.vector_size)
         
         try:
             collections = self.client.get_collections().collections
-            if not any(col.name == collection_name for col in collections):
+            created = not any(col.name == collection_name for col in collections)
+            if created:
+                vectors_config = models.VectorParams(
+                    size=vector_size,
+                    distance=models.Distance.COSINE,
+                    on_disk=bool(self.config.on_disk_vectors)
+                )
+                sparse_vectors_config = None
+                if self.config.hybrid_search:
+                    vectors_config = {self.config.dense_vector_name: vectors_config}
+                    sparse_vectors_config = {
+                        self.config.sparse_vector_name: models.SparseVectorParams(
+                            index=models.SparseIndexParams(on_disk=bool(self.config.on_disk_vectors)),
+                            modifier=models.Modifier.IDF if uses_idf(self.config.sparse_model) else None,
+                        )
+                    }
                 self.client.create_collection(
                     collection_name=collection_name,
-                    vectors_config=models.VectorParams(
-                        size=vector_size,
-                        distance=models.Distance.COSINE
-                    )
+                    vectors_config=vectors_config,
+                    sparse_vectors_config=sparse_vectors_config,
+                    hnsw_config=models.HnswConfigDiff(
+                        m=0 if bulk_load else int(self.config.hnsw_m),
+                        ef_construct=int(self.config.hnsw_ef_construct)
+                    ),
+                    quantization_config=self._quantization_config(),
+                    on_disk_payload=bool(self.config.on_disk_payload)
+                )
+                logger.info(
+                    f"已创建集合: {collection_name}（hnsw_m={self.config.hnsw_m}，量化: {self.config.quantization}，"
+                    f"向量存放在{'磁盘' if self.config.on_disk_vectors else '内存'}）"
                 )
-                logger.info(f"已创建集合: {collection_name}")
+                if self.config.hybrid_search:
+                    logger.info(f"混合检索：稀疏向量模型 {self.config.sparse_model}")
+                if bulk_load:
+                    logger.info("批量导入模式：写入期间不建立HNSW索引")
             else:
                 logger.info(f"集合已存在: {collection_name}")
+                if self.config.hybrid_search:
+                    self._check_hybrid_collection()
+            self._create_payload_indexes()
+            return created
         except Exception as e:
             logger.error(f"创建集合失败: {e}")
             raise
     
+    def _check_hybrid_collection(self):
+        """
+        检查已存在的集合是否包含混合检索需要的命名向量，不能向单向量集合写入稀疏向量
+        """
+        params = self.client.get_collection(self.config.collection_name).config.params
+        vectors = params.vectors if isinstance(params.vectors, dict) else {}
+        sparse_vectors = params.sparse_vectors or {}
+        if self.config.dense_vector_name not in vectors or self.config.sparse_vector_name not in sparse_vectors:
+            message = (
+                f"集合 {self.config.collection_name} 不包含命名向量 {self.config.dense_vector_name}/"
+                f"{self.config.sparse_vector_name}，启用hybrid_search需要删除集合或使用新的collection_name重新导入"
+            )
+            logger.error(message)
+            raise RuntimeError(message)
+    
+    def _quantization_config(self):
+        """
+        按配置返回集合的量化参数，quantization为none时不量化
+        """
+        from qdrant_client import models
+        
+        if self.config.quantization == 'int8':
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=float(self.config.quantization_quantile),
+                    always_ram=bool(self.config.quantization_always_ram),
+                )
+            )
+        return None
+    
+    def _rebuild_index(self):
+        """
+        批量导入结束后恢复配置的HNSW参数，由Qdrant在后台一次性建立索引
+        """
+        from qdrant_client import models
+        
+        try:
+            self.client.update_collection(
+                collection_name=self.config.collection_name,
+                hnsw_config=models.HnswConfigDiff(
+                    m=int(self.config.hnsw_m),
+                    ef_construct=int(self.config.hnsw_ef_construct)
+                ),
+            )
+            logger.info(f"已恢复HNSW参数（m={self.config.hnsw_m}），Qdrant将在后台建立索引")
+        except Exception as e:
+            logger.error(f"恢复HNSW参数失败，请手动将集合 {self.config.collection_name} 的hnsw_config.m设置为 {self.config.hnsw_m}: {e}")
+            raise
+    
+    def _create_payload_indexes(self):
+        """
+        为过滤检索用到的元数据字段建立payload索引，已存在的索引跳过
+        """
+        from qdrant_client import models
+        
+        collection_name = self.config.collection_name
+        existing = self.client.get_collection(collection_name).payload_schema or {}
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            if field_name in existing:
+                continue
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=models.PayloadSchemaType(schema),
+            )
+            logger.info(f"已为字段 {field_name} 建立 {schema} 类型的payload索引")
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        将一批文本向量化，已缓存的文本直接从Embedding缓存读取
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            形状为(len(texts), vector_size)的归一化向量矩阵
+        """
+        if self.embedding_cache is None:
+            return self._encode_texts(texts)
+        return self.embedding_cache.encode(texts, self._encode_texts)
+    
+    def _embed_sparse(self, texts: List[str]) -> Optional[List[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        为一批文本生成稀疏向量，未启用混合检索时返回None
+        """
+        if self.sparse_encoder is None:
+            return None
+        return self.sparse_encoder.encode(texts, batch_size=int(self.config.embed_max_batch_size))
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        调用Embedding模型向量化文本，按token长度分桶并根据token预算自适应批次大小；
+        启用推理池时分发到多个模型副本
+        """
+        with self._encode_lock:
+            model = self.embedding_model
+            if self.embedding_pool is not None:
+                return self.embedding_pool.encode(texts, normalize_embeddings=True)
+            return encode_bucketed(
+                model,
+                texts,
+                token_budget=int(self.config.embed_token_budget),
+                max_batch_size=int(self.config.embed_max_batch_size),
+                normalize_embeddings=True,
+            )
+    
+    def _build_points(
+        self,
+        documents: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        sparse_vectors: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None,
+    ) -> PointBatch:
+        """
+        将文本块和对应向量组装为列式数据点批次，向量矩阵保持为float32数组
+        
+        Args:
+            documents: 文本块列表
+            embeddings: 与documents一一对应的向量矩阵
+            sparse_vectors: 与documents一一对应的稀疏向量，未启用混合检索时为None
+            
+        Returns:
+            数据点批次
+        """
+        ids = []
+        payloads = []
+        for doc in documents:
+            content_hash = doc.get('content_hash') or _text_sha256(doc['text'])
+            ids.append(make_point_id(doc['file_path'], doc['chunk_index'], content_hash))
+            payload = {
+                "text": doc['text'],
+                "file_path": doc['file_path'],
+                "chunk_index": doc['chunk_index'],
+                "total_chunks": doc['total_chunks'],
+                "content_hash": content_hash
+            }
+            for key in METADATA_FIELDS:
+                if key in doc:
+                    payload[key] = doc[key]
+            payloads.append(payload)
+        return PointBatch(ids, np.asarray(embeddings, dtype=np.float32), payloads, sparse_vectors)
+    
+    def _create_uploader(self, on_batch_done: Optional[Callable[[PointBatch], None]] = None) -> BatchUploader:
+        """
+        按配置创建并发批量写入器
+        
+        Args:
+            on_batch_done: 批次写入成功后的回调
+            
+        Returns:
+            批量写入器
+        """
+        return BatchUploader(
+            self.client,
+            self.config.collection_name,
+            max_in_flight=int(self.config.upload_parallelism),
+            max_retries=int(self.config.upload_max_retries),
+            backoff_base=float(self.config.upload_retry_backoff),
+            on_batch_done=on_batch_done,
+            vector_name=self.config.dense_vector_name if self.config.hybrid_search else None,
+            sparse_vector_name=self.config.sparse_vector_name if self.config.hybrid_search else None,
+        )
+    
+    def _submit_points(self, uploader: BatchUploader, points: PointBatch):
+        """
+        按batch_size切分数据点并提交给写入器，切分得到的向量矩阵是视图，不产生拷贝
+        
+        Args:
+            uploader: 批量写入器
+            points: 数据点批次
+        """
+        batch_size = int(self.config.batch_size)
+        for i in range(0, len(points), batch_size):
+            uploader.submit(points.slice(i, i + batch_size))
+    
     def vectorize_and_store(self, documents: List[Dict[str, Any]]):
         """
         将文档向量化并存储到Qdrant数据库
@@ -319,63 +1004,279 @@ class RustDocsVectorizer:
             logger.error("没有要处理的文档")
             return
         
-        # 检查Qdrant客户端是否已初始化
-        if self.client is None:
-            logger.error("Qdrant客户端未初始化")
-            raise RuntimeError("Qdrant客户端未初始化，请检查Qdrant服务器连接")
-        
-        # 检查Embedding模型是否已初始化
-        if self.embedding_model is None:
-            logger.error("Embedding模型未初始化")
-            raise RuntimeError("Embedding模型未初始化，请检查模型加载是否成功")
-            
         # 创建集合
         self.create_collection()
         
-        # 提取文本
-        texts = [doc['text'] for doc in documents]
-        logger.info(f"开始向量化 {len(texts)} 个文本块")
+        embed_batch_size = int(self.config.embed_batch_size)
+        logger.info(f"开始向量化并插入 {len(documents)} 个文本块，向量化批次大小: {embed_batch_size}")
         
-        # 向量化
-        try:
-            embeddings = self.embedding_model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
-            logger.info(f"向量化完成，生成 {embeddings.shape[0]} 个向量")
-        except Exception as e:
-            logger.error(f"向量化失败: {e}")
-            raise
+        with self._create_uploader() as uploader:
+            for start in tqdm(range(0, len(documents), embed_batch_size), desc="向量化并插入"):
+                batch = documents[start:start+embed_batch_size]
+                texts = [doc['text'] for doc in batch]
+                try:
+                    embeddings = self._embed_texts(texts)
+                    sparse_vectors = self._embed_sparse(texts)
+                except Exception as e:
+                    logger.error(f"向量化失败: {e}")
+                    raise
+                self._submit_points(uploader, self._build_points(batch, embeddings, sparse_vectors))
         
-        # 准备数据点
-        points = []
-        for i, doc in enumerate(documents):
-            point = models.PointStruct(
-                id=i,
-                vector=embeddings[i].tolist(),
-                payload={
-                    "text": doc['text'],
-                    "file_path": doc['file_path'],
-                    "chunk_index": doc['chunk_index'],
-                    "total_chunks": doc['total_chunks']
-                }
-            )
-            points.append(point)
+        logger.info(f"向量已成功存入Qdrant集合 {self.config.collection_name}")
+        logger.info(f"共存入 {len(documents)} 个文档向量")
+    
+    def plan_incremental(self, docs_dir: str, html_files: List[str], manifest: IndexManifest, skip_unchanged: bool = True) -> Tuple[List[str], Dict[str, str], List[str]]:
+        """
+        对比清单与当前文件，确定需要处理的文件和需要删除的文件
+        
+        Args:
+            docs_dir: 文档目录路径，只有该目录下的清单记录会被判定为已删除
+            html_files: 当前的HTML文件列表
+            manifest: 增量索引清单
+            skip_unchanged: 是否跳过内容未变化的文件
+            
+        Returns:
+            (需要处理的文件列表, 文件到内容哈希的映射, 已从磁盘删除的文件列表)
+        """
+        to_process = []
+        hashes = {}
+        for file_path in html_files:
+            content_hash = _file_sha256(file_path)
+            if skip_unchanged and manifest.is_unchanged(file_path, content_hash):
+                continue
+            hashes[file_path] = content_hash
+            to_process.append(file_path)
+        
+        current = {normalize_path(file_path) for file_path in html_files}
+        root = normalize_path(docs_dir)
+        prefix = '' if root == os.curdir else os.path.join(root, '')
+        removed = [
+            file_path for file_path in manifest.files
+            if file_path.startswith(prefix) and file_path not in current
+        ]
+        return to_process, hashes, removed
+    
+    def plan_run(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None, incremental: bool = True) -> Tuple[IndexManifest, List[str], Dict[str, str], List[str]]:
+        """
+        根据增量索引清单确定本次运行的工作量，不连接Qdrant也不加载模型
+        
+        Args:
+            docs_dir: 文档目录路径
+            file_filter: 可选的自定义文件过滤函数
+            incremental: 是否根据增量索引清单跳过未变化的文件
+            
+        Returns:
+            (增量索引清单, 需要处理的文件列表, 文件到内容哈希的映射, 已从磁盘删除的文件列表)
+        """
+        manifest = IndexManifest(self.config.manifest_path, self.config.collection_name)
+        html_files = self.find_html_files(docs_dir, file_filter)
+        to_process, hashes, removed = self.plan_incremental(docs_dir, html_files, manifest, skip_unchanged=incremental)
+        self.skipped_files = len(html_files) - len(to_process)
+        logger.info(f"需要处理 {len(to_process)} 个文件，跳过 {self.skipped_files} 个未变化的文件，{len(removed)} 个文件已删除")
+        return manifest, to_process, hashes, removed
+    
+    def _delete_points(self, point_ids: List[Any]):
+        """
+        按ID删除Qdrant中的数据点
+        
+        Args:
+            point_ids: 数据点ID列表
+        """
+        from qdrant_client import models
         
-        # 批量插入
         collection_name = self.config.collection_name
         batch_size = int(self.config.batch_size)
+        for i in range(0, len(point_ids), batch_size):
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=point_ids[i:i+batch_size]),
+            )
+    
+    def run_pipeline(self, docs_dir: str, file_filter: Optional[Callable[[str], bool]] = None, incremental: bool = True) -> int:
+        """
+        以流式管道方式完成解析、切分、向量化和写入
+        
+        解析、向量化、写入分别在独立线程中运行，阶段之间通过有界队列连接，
+        内存占用只与队列长度有关，与文档总量无关；每个批次向量化后立即写入Qdrant。
+        增量模式下只处理内容哈希发生变化的文件，并删除已变化或已删除文件的旧数据点
+        
+        Args:
+            docs_dir: 文档目录路径
+            file_filter: 可选的自定义文件过滤函数
+            incremental: 是否根据增量索引清单跳过未变化的文件
+            
+        Returns:
+            写入Qdrant的数据点数量
+        """
+        manifest, html_files, hashes, removed = self.plan_run(docs_dir, file_filter, incremental)
+        if not html_files and not removed:
+            return 0
         
-        logger.info(f"开始批量插入向量，批次大小: {batch_size}")
+        # 批量导入模式只用于首次导入：新建集合时先关闭HNSW索引，全部写入后再一次性建立
+        bulk_load = self.create_collection(bulk_load=bool(self.config.bulk_load)) and bool(self.config.bulk_load)
+        try:
+            return self._ingest(manifest, html_files, hashes, removed)
+        finally:
+            if bulk_load:
+                self._rebuild_index()
+    
+    def _ingest(self, manifest: IndexManifest, html_files: List[str], hashes: Dict[str, str], removed: List[str]) -> int:
+        """
+        运行解析、向量化、写入三个阶段，并在完成后更新增量索引清单
         
-        for i in tqdm(range(0, len(points), batch_size), desc="插入向量"):
-            batch = points[i:i+batch_size]
+        Args:
+            manifest: 增量索引清单
+            html_files: 需要处理的文件列表
+            hashes: 文件到内容哈希的映射
+            removed: 已从磁盘删除的文件列表
+            
+        Returns:
+            写入Qdrant的数据点数量
+        """
+        embed_batch_size = int(self.config.embed_batch_size)
+        queue_size = int(self.config.pipeline_queue_size)
+        batch_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        point_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        errors: List[BaseException] = []
+        progress = IngestProgress(manifest, hashes)
+        
+        def parse_stage():
+            try:
+                batch = []
+                for doc in self.iter_documents(html_files, on_parsed=progress.file_parsed):
+                    batch.append(doc)
+                    if len(batch) >= embed_batch_size:
+                        if not _put_until_stopped(batch_queue, batch, stop_event):
+                            return
+                        batch = []
+                if batch:
+                    _put_until_stopped(batch_queue, batch, stop_event)
+            except BaseException as e:
+                errors.append(e)
+                stop_event.set()
+            finally:
+                _put_until_stopped(batch_queue, _STAGE_DONE, stop_event)
+        
+        def embed_stage():
+            try:
+                while True:
+                    batch = _get_until_stopped(batch_queue, stop_event)
+                    if batch is _STAGE_DONE:
+                        break
+                    texts = [doc['text'] for doc in batch]
+                    embeddings = self._embed_texts(texts)
+                    points = self._build_points(batch, embeddings, self._embed_sparse(texts))
+                    if not _put_until_stopped(point_queue, points, stop_event):
+                        return
+            except BaseException as e:
+                logger.error(f"向量化失败: {e}")
+                errors.append(e)
+                stop_event.set()
+            finally:
+                _put_until_stopped(point_queue, _STAGE_DONE, stop_event)
+        
+        workers = [
+            threading.Thread(target=parse_stage, name="parse-stage", daemon=True),
+            threading.Thread(target=embed_stage, name="embed-stage", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        
+        # 写入阶段：当前线程把批次交给并发写入器，在途批次已满时阻塞，从而对上游形成背压
+        flush_interval = float(self.config.manifest_flush_interval)
+        last_flush = time.monotonic()
+        try:
+            with tqdm(desc="插入向量", unit="点") as progress_bar:
+                progress.on_stored = progress_bar.update
+                with self._create_uploader(on_batch_done=progress.points_stored) as uploader:
+                    while True:
+                        points = _get_until_stopped(point_queue, stop_event)
+                        if points is _STAGE_DONE:
+                            break
+                        self._submit_points(uploader, points)
+                        # 定期把已完整写入的文件登记到清单，中断后重新运行可从这里继续
+                        if time.monotonic() - last_flush >= flush_interval:
+                            progress.flush(self._delete_points)
+                            last_flush = time.monotonic()
+        except BaseException as e:
+            errors.append(e)
+            raise
+        finally:
+            if errors:
+                stop_event.set()
+            for worker in workers:
+                worker.join()
+            # 即使中途失败，也保存已完整写入的文件
             try:
-                self.client.upsert(collection_name=collection_name, points=batch)
-                logger.debug(f"已插入批次 {i//batch_size + 1}，共 {len(batch)} 个向量")
+                progress.flush(self._delete_points)
             except Exception as e:
-                logger.error(f"插入批次 {i//batch_size + 1} 失败: {e}")
-                raise
+                if not errors:
+                    raise
+                logger.error(f"保存增量索引清单失败: {e}")
+        
+        if errors:
+            raise errors[0]
+        
+        stale_ids = []
+        for file_path in removed:
+            stale_ids.extend(manifest.point_ids(file_path))
+        if stale_ids:
+            self._delete_points(stale_ids)
+        for file_path in removed:
+            manifest.remove(file_path)
+        manifest.save()
+        if progress.deleted or stale_ids:
+            logger.info(f"已删除 {progress.deleted + len(stale_ids)} 个过期数据点")
+        stored = progress.stored
+        
+        if self._embedding_cache is not None:
+            logger.info(f"Embedding缓存命中率: {self._embedding_cache.hit_rate():.1%}")
+        logger.info(f"共存入 {stored} 个文档向量到Qdrant集合 {self.config.collection_name}")
+        return stored
+
+
+# 启动时按需导入的重型依赖，用于--profile-imports报告
+HEAVY_IMPORTS = [
+    'nltk',
+    'qdrant_client',
+    'unstructured.partition.html',
+    'lxml.html',
+    'torch',
+    'sentence_transformers',
+    'fastembed',
+]
+
+
+def profile_imports(module_names: List[str] = HEAVY_IMPORTS) -> List[Tuple[str, float, Optional[str]]]:
+    """
+    逐个导入模块并记录耗时，用于定位CLI启动慢的依赖
+    
+    模块按顺序导入，已被前面模块间接导入的依赖不会重复计时；
+    需要更细粒度的报告时可以使用 python -X importtime
+    
+    Args:
+        module_names: 要导入的模块名列表
         
-        logger.info(f"向量已成功存入Qdrant集合 {collection_name}")
-        logger.info(f"共存入 {len(points)} 个文档向量")
+    Returns:
+        (模块名, 导入耗时秒数, 导入失败时的错误信息) 列表
+    """
+    import importlib
+    import sys
+    
+    report = []
+    for name in module_names:
+        if name in sys.modules:
+            report.append((name, 0.0, None))
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            error = None
+        except Exception as e:
+            error = str(e)
+        report.append((name, time.perf_counter() - start, error))
+    return report
 
 
 def main():
@@ -401,18 +1302,50 @@ def main():
     parser = argparse.ArgumentParser(description='Rust文档向量化工具')
     parser.add_argument('docs_dir', help='Rust文档目录路径')
     parser.add_argument('-c', '--config', default='config.toml', help='配置文件路径')
+    parser.add_argument('--full', action='store_true', help='忽略增量索引清单，重新处理全部文件')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要处理和删除的文件，不加载模型也不连接Qdrant')
+    parser.add_argument('--profile-imports', action='store_true', help='输出重型依赖的导入耗时后退出')
+    parser.add_argument('--truncation-report', action='store_true', help='统计各切分策略下会被模型截断的文本块后退出')
     
     args = parser.parse_args()
     
+    if args.profile_imports:
+        total = 0.0
+        for name, seconds, error in profile_imports():
+            total += seconds
+            status = f"导入失败: {error}" if error else ""
+            print(f"{name:<32} {seconds:8.3f}s {status}")
+        print(f"{'合计':<30} {total:8.3f}s")
+        return 0
+    
+    vectorizer = None
     try:
         vectorizer = RustDocsVectorizer(args.config)
-        documents = vectorizer.process_html_files(args.docs_dir, file_filter=filter_chapter_files)
+        if args.truncation_report:
+            report = vectorizer.truncation_report(args.docs_dir, file_filter=filter_chapter_files)
+            max_tokens = vectorizer.config.max_chunk_tokens
+            for name, stats in report.items():
+                print(
+                    f"{name:<10} 文本块 {stats['chunks']}，超过 {max_tokens} token被截断 {stats['truncated']} 个，"
+                    f"丢弃 {stats['dropped_tokens']} 个token，平均 {stats['mean_tokens']:.1f} token/块"
+                )
+            return 0
         
-        if not documents:
+        if args.dry_run:
+            _, to_process, _, removed = vectorizer.plan_run(args.docs_dir, file_filter=filter_chapter_files, incremental=not args.full)
+            for file_path in to_process:
+                print(f"处理 {file_path}")
+            for file_path in removed:
+                print(f"删除 {file_path}")
+            print(f"需要处理 {len(to_process)} 个文件，跳过 {vectorizer.skipped_files} 个未变化的文件，{len(removed)} 个文件已删除")
+            return 0
+        
+        stored = vectorizer.run_pipeline(args.docs_dir, file_filter=filter_chapter_files, incremental=not args.full)
+        
+        if not stored and not vectorizer.skipped_files:
             logger.error("没有找到有效的HTML文件或提取的文本为空")
             return 1
         
-        vectorizer.vectorize_and_store(documents)
         logger.info("文档向量化任务完成")
         return 0
         
@@ -422,6 +1355,9 @@ def main():
     except Exception as e:
         logger.error(f"任务执行失败: {e}")
         return 1
+    finally:
+        if vectorizer is not None:
+            vectorizer.close()
 
 
 if __name__ == "__main__":
@@ -3,29 +3,17 @@ app
 
 """
 
-import sys
-import os
 import asyncio
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.ui import Console
-from autogen_core.models import ModelInfo
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.conditions import TextMentionTermination
 
 # from autogen_ext.tools.mcp import McpWorkbench, StdioServerParams
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 from autogen_ext.agents.file_surfer import FileSurfer
 
-try:
-    # Add the parent directory to the path so we can import conf
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from conf import settings
-except ImportError:
-    print(
-        "Failed to import settings from conf. Make sure conf is in the parent directory."
-    )
-    raise
+from llm import create_model_context, get_model_client, registry
 
 
 # For this example, we use a fake weather tool for demonstration purposes.
@@ -33,53 +21,15 @@ async def get_weather(city: str) -> str:
     """Get the weather for a given city."""
     return f"The weather in {city} is 73 degrees and Sunny."
 
-    # 根据DeepSeek模型的实际能力调整ModelInfo参数
 
+deepseek_model_client = get_model_client("deepseek", "deepseek-chat")
 
-deepseek_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="deepseek",
-    structured_output=True,
-)
-
-aliyun_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="qwen3",
-    structured_output=True,
-)
-
-volce_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,
-    json_output=True,
-    family="deepseek",
-    structured_output=True,
-)
+aliyun_model_client = get_model_client("aliyun", "qwen3-max")
 
-deepseek_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
+doubao_model_client = get_model_client("volces", "doubao-seed-1-6-thinking-250715")
 
-aliyun_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen3-max",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
-
-doubao_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-thinking-250715",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+# 发言人选择：相同的对话历史得到相同的选择，重复运行同一任务时使用响应缓存（见settings.toml的[llm.cache]）
+selector_model_client = get_model_client("deepseek", "deepseek-chat", cache=True)
 
 # 产品经理
 product_owner_prompt = """
@@ -247,6 +197,7 @@ graph TD
 product_owner = AssistantAgent(
     name="ProductOwner",
     model_client=deepseek_model_client,
+    model_context=create_model_context("ba_team", deepseek_model_client),
     system_message=product_owner_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -351,6 +302,7 @@ technical_expert_prompt = """
 technical_expert = AssistantAgent(
     name="TechnicalFeasibilityReviewExpert",
     model_client=deepseek_model_client,
+    model_context=create_model_context("ba_team", deepseek_model_client),
     system_message=technical_expert_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -429,6 +381,7 @@ PRD待完善章节：“PRD-采购流程优化模块-核心KPI”；
 data_analyst = AssistantAgent(
     name="DataAnalyst",
     model_client=deepseek_model_client,
+    model_context=create_model_context("ba_team", deepseek_model_client),
     system_message=data_analyst_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -524,7 +477,8 @@ selector_prompt = """
 # 创建团队
 ba_team = SelectorGroupChat(
     participants=[product_owner, data_analyst, user, web_surfer, file_surfer],
-    model_client=deepseek_model_client,
+    model_client=selector_model_client,
+    model_context=create_model_context("ba_team", selector_model_client),
     termination_condition=TextMentionTermination("good job"),
     selector_prompt=selector_prompt,
     max_turns=50,
@@ -533,7 +487,11 @@ ba_team = SelectorGroupChat(
 
 
 async def main() -> None:
-    await Console(ba_team.run_stream(task="包装RPA系统，为多用户提供自服务的任务调度和结果查看功能"))
+    try:
+        await Console(ba_team.run_stream(task="包装RPA系统，为多用户提供自服务的任务调度和结果查看功能"))
+    finally:
+        # 关闭共享的HTTP连接池
+        await registry.aclose()
 
 
 if __name__ == "__main__":
@@ -3,14 +3,10 @@ app
 
 """
 
-import sys
-import os
 import asyncio
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.ui import Console
-from autogen_core.models import ModelInfo
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.conditions import TextMentionTermination
 
 # from autogen_ext.tools.mcp import McpWorkbench, StdioServerParams
@@ -20,91 +16,25 @@ from autogen_core.code_executor import CodeBlock
 from autogen_core import CancellationToken
 
 
-try:
-    # Add the parent directory to the path so we can import conf
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-    from conf import settings
-except ImportError:
-    print(
-        "Failed to import settings from conf. Make sure conf is in the parent directory."
-    )
-    raise
+from llm import Route, RoutingTable, create_model_context, get_model_client, registry
 
 
-# 根据DeepSeek模型的实际能力调整ModelInfo参数
-deepseek_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_chat_model_client = get_model_client("deepseek", "deepseek-chat")
 
-aliyun_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,  # DeepSeek支持函数调用
-    json_output=True,  # DeepSeek支持JSON输出
-    family="qwen3",
-    structured_output=True,
-)
+deepseek_code_model_client = get_model_client("deepseek", "deepseek-chat", temperature=0.0, cache=True)
 
-volce_model_info = ModelInfo(
-    vision=False,
-    function_calling=True,
-    json_output=True,
-    family="deepseek",
-    structured_output=True,
-)
+deepseek_reasoner_model_client = get_model_client("deepseek", "deepseek-reasoner")
 
-deepseek_chat_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
+aliyun_model_client = get_model_client("aliyun", "qwen3-max")
 
-deepseek_code_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-chat",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-    temperature=0.0,
-)
+doubao_model_client = get_model_client("volces", "doubao-seed-1-6-251015")
 
-deepseek_reasoner_model_client = OpenAIChatCompletionClient(
-    api_key=settings.deepseek.api_key,
-    model="deepseek-reasoner",
-    base_url=settings.deepseek.base_url,
-    model_info=deepseek_model_info,
-)
+doubao_thinking_model_client = get_model_client("volces", "doubao-seed-1-6-thinking-250715")
 
-aliyun_model_client = OpenAIChatCompletionClient(
-    api_key=settings.aliyun.api_key,
-    model="qwen3-max",
-    base_url=settings.aliyun.base_url,
-    model_info=aliyun_model_info,
-)
+doubao_code_model_client = get_model_client("volces", "doubao-seed-code-preview-251028")
 
-doubao_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-251015",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
-
-doubao_thinking_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-1-6-thinking-250715",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
-
-doubao_code_model_client = OpenAIChatCompletionClient(
-    api_key=settings.volces.api_key,
-    model="doubao-seed-code-preview-251028",
-    base_url=settings.volces.base_url,
-    model_info=volce_model_info,
-)
+# 发言人选择：相同的对话历史得到相同的选择，重复运行同一任务时使用响应缓存（见settings.toml的[llm.cache]）
+selector_model_client = get_model_client("deepseek", "deepseek-chat", cache=True)
 
 
 user = UserProxyAgent(
@@ -154,6 +84,7 @@ web_developer = AssistantAgent(
     name="WebDeveloper",
     description="Web开发专家，负责基于用户需求，生成符合要求的前端原型代码。",
     model_client=doubao_code_model_client,
+    model_context=create_model_context("develop_team", doubao_code_model_client),
     system_message=web_developer_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -229,6 +160,7 @@ tool_export = AssistantAgent(
     name="ToolExport",
     description="Web开发工程化工具链专家",
     model_client=doubao_code_model_client,
+    model_context=create_model_context("develop_team", doubao_code_model_client),
     system_message=web_developer_prompt,
     reflect_on_tool_use=True,
     model_client_stream=True,
@@ -296,14 +228,33 @@ selector_prompt = """
 web开发工程师 或 UserProxyAgent
 """
 
+# 流程标识符直接决定下一个发言人，未命中时才调用模型选择。
+# 团队中负责开发的是ToolExport：Spec确认后和测试失败时交给它（见选择提示词的少样本示例2）；
+# 团队中没有测试工程师，开发完成后按降级规则交给用户
+develop_team_routing = RoutingTable(
+    "develop_team",
+    routes=[
+        Route("###Spec确认###", tool_export.name),
+        Route("###开发完成###", "user"),
+        Route("###测试通过###", "user"),
+        Route("###测试失败###", tool_export.name),
+    ],
+    participants=[tool_export, user],
+    fallback="user",
+    allow_repeated_speaker=False,
+)
+
 # 创建团队
 develop_team = SelectorGroupChat(
     participants=[tool_export, user],
-    model_client=deepseek_chat_model_client,
+    model_client=selector_model_client,
+    model_context=create_model_context("develop_team", selector_model_client),
     termination_condition=TextMentionTermination("good job"),
     selector_prompt=selector_prompt,
     max_turns=50,
     allow_repeated_speaker=False,
+    selector_func=develop_team_routing.select,
+    candidate_func=develop_team_routing.candidates,
 )
 
 work_dir = "/home/qinhuajun/Autogen_projects"
@@ -322,7 +273,12 @@ async def run_cmd(cmd: str):
 
 
 async def main() -> None:
-    await Console(develop_team.run_stream(task="生成vite+react项目"))
+    try:
+        await Console(develop_team.run_stream(task="生成vite+react项目"))
+    finally:
+        develop_team_routing.log_stats()
+        # 关闭共享的HTTP连接池
+        await registry.aclose()
 
 
 if __name__ == "__main__":